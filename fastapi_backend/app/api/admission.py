@@ -0,0 +1,61 @@
+"""
+ASGI middleware putting the expensive endpoints behind the admission controller.
+
+The middleware wraps the whole response, so a streamed chat holds its admission
+slot until the last event is sent. Rejected requests are answered with 429 or 503,
+a JSON detail and a Retry-After header before the handler runs.
+"""
+from typing import Optional
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.admission import AdmissionController, AdmissionRejected, admission_controller, ADMISSION_CLIENT_HEADER
+
+# (method, path) of the admitted endpoints and their lane
+ROUTE_LANES = {
+    ("POST", "/chat"): "interactive",
+    ("POST", "/chat-pdf"): "interactive",
+    ("POST", "/chat-url"): "interactive",
+    ("POST", "/error-decoder"): "interactive",
+    ("POST", "/upload-pdf"): "upload",
+}
+
+router = APIRouter()
+
+
+def client_key(scope) -> str:
+    """The client's ADMISSION_CLIENT_HEADER value, or its address"""
+    header = ADMISSION_CLIENT_HEADER.lower().encode("latin-1")
+    for name, value in scope.get("headers", []):
+        if name == header and value:
+            return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionMiddleware:
+    """Admits requests to the endpoints in ROUTE_LANES through the admission controller"""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        lane = ROUTE_LANES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if lane is None or not self.controller.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            async with self.controller.admit(client_key(scope), lane):
+                await self.app(scope, receive, send)
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": e.detail}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+
+
+@router.get("/admission/stats")
+async def admission_stats():
+    """Requests in flight and queued, rejections per lane and recent queue waits"""
+    return admission_controller.stats()
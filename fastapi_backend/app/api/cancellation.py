@@ -0,0 +1,49 @@
+"""
+Ties the lifetime of request work to the client connection.
+
+Streaming responses are cancelled by the server when the client goes away, but a
+plain request keeps running until the handler returns. cancel_on_disconnect runs
+the handler's work next to a watcher for the ASGI http.disconnect message and
+cancels the work, LLM requests in flight included, as soon as the client is gone.
+"""
+import asyncio
+import logging
+from typing import Awaitable, TypeVar
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection before the response was ready"""
+
+
+async def wait_for_disconnect(request: Request):
+    """Return once the client has disconnected"""
+    while True:
+        # The request body has already been read, so the next message is the disconnect
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    Await `work` and return its result, cancelling it and raising ClientDisconnected
+    if the client disconnects first
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.create_task(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        logger.info("Client disconnected, cancelling request")
+        task.cancel()
+        raise ClientDisconnected()
+    finally:
+        for pending in (task, watcher):
+            if not pending.done():
+                pending.cancel()
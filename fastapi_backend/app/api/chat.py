@@ -2,7 +2,12 @@ from fastapi import APIRouter, HTTPException, Depends
 from app.models.schemas import ChatRequest, ChatResponse
 from app.services.storage import storage
 from app.services.ai_service import ai_service
+from app.services.context_window import context_window
+from app.api.streaming import sse_chat_stream, streaming_response
 import uuid
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -12,26 +17,41 @@ async def chat(request: ChatRequest):
         conversation_id = request.conversation_id or str(uuid.uuid4())
         conversation_id = storage.create_conversation(conversation_id)
         
-        conversation_history = storage.get_conversation(conversation_id) or []
+        # Only the most recent messages can fit the context budget, so read just the tail
+        conversation_history = storage.get_conversation(conversation_id, limit=context_window.max_messages) or []
+        conversation_history = await context_window.build(conversation_id, conversation_history, request.model)
 
         storage.add_message(conversation_id, "user", request.message)
 
-
-        # Get updated history if your service expects full context
-        # updated_history = storage.get_conversation(conversation_id)
-
         dict_history = [
             {"role": msg.role, "content": msg.content}
             for msg in conversation_history
         ]
 
+        if request.stream:
+            tokens = ai_service.stream_chat_completion(
+                message=request.message,
+                conversation_history=dict_history,
+                model=request.model
+            )
+
+            def on_complete(content: str) -> ChatResponse:
+                ai_message = storage.add_message(conversation_id, "assistant", content)
+                return ChatResponse(
+                    id=ai_message.id,
+                    content=ai_message.content,
+                    conversation_id=conversation_id
+                )
+
+            return streaming_response(sse_chat_stream(tokens, on_complete))
+
         response = await ai_service.chat_completion(
             message=request.message,
             conversation_history=dict_history,
             model=request.model
         )
 
-        print(f"[DEBUG] AI response: {response}")
+        logger.debug(f"AI response: {response}")
 
         ai_message = storage.add_message(conversation_id, "assistant", response.get("content", ""))
 
@@ -42,5 +62,5 @@ async def chat(request: ChatRequest):
         )
     
     except Exception as e:
-        print(f"[ERROR] Chat endpoint failed: {e}")
+        logger.error(f"Chat endpoint failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,15 +1,21 @@
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from app.models.schemas import ChatPDFRequest, ChatResponse, FileUploadResponse
-from app.services.storage import storage
-from app.logic.document_loaders import DocumentLoader
-from app.logic.conversation_retrieval import create_db, create_chain, process_chat
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request, Response
+from app.models.schemas import ChatPDFRequest, ChatResponse, FileUploadResponse, IngestionJobStatus
+from app.services.storage import storage, UploadTooLargeError
+from app.services.ingestion import ingestion_manager, INGESTION_MAX_BACKLOG
+from app.services.index_store import index_store
+from app.services.context_window import context_window
+from app.services.stage_timings import stage_timings
+from app.logic.query_rewrite import query_rewriter
+from app.logic.conversation_retrieval import create_chain, process_chat, stream_chat, RETRIEVAL_CHAT_MODEL
+from app.api.streaming import sse_chat_stream, streaming_response
+from app.api.cancellation import ClientDisconnected, cancel_on_disconnect
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Optional
 import uuid
 
 router = APIRouter()
-chains: Dict[str, any] = {}
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -20,8 +26,15 @@ async def upload_pdf(file: UploadFile = File(...), conversation_id: Optional[str
     try:
         if not file.filename.endswith('.pdf'):
             raise HTTPException(status_code=400, detail="File must be a PDF")
-
-        file_id = storage.save_file(file.file, file.filename, file.content_type)
+        if INGESTION_MAX_BACKLOG and ingestion_manager.backlog() >= INGESTION_MAX_BACKLOG:
+            # Don't queue more embedding work than the workers and the embedding rate limit can get through
+            raise HTTPException(status_code=503, detail="Too many documents are being processed, try again later",
+                                headers={"Retry-After": "30"})
+
+        try:
+            file_id = await asyncio.to_thread(storage.save_file, file.file, file.filename, file.content_type)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
         file_meta = storage.get_file(file_id)
 
         if file_meta:
@@ -30,50 +43,92 @@ async def upload_pdf(file: UploadFile = File(...), conversation_id: Optional[str
             logger.info(f"Creating new conversation: {conversation_id}")
             storage.create_conversation(conversation_id)
 
-            loader = DocumentLoader(chunk_size=1000, chunk_overlap=100)
-            logger.info("Loading PDF content...")
-            docs = loader.load_pdf(file_meta.path)
-            logger.info("PDF loaded successfully. Creating vectorstore...")
-            vectorstore = create_db(docs)
-            chains[conversation_id] = create_chain(vectorstore)
-            logger.info("Chain created for conversation.")
+            # Loading and embedding run in the background, poll the job for progress
+            job = ingestion_manager.submit(file_id, file_meta.path, conversation_id, content_hash=file_meta.sha256)
+            logger.info(f"Ingestion job {job.job_id}: {job.status}")
+
+            if job.status == "ready":
+                message = f"File {file.filename} was already processed, reusing its index"
+            else:
+                message = f"File {file.filename} uploaded and queued for processing"
 
             return FileUploadResponse(
                 file_id=file_id,
                 conversation_id=conversation_id,
-                message=f"File {file.filename} uploaded and processed successfully"
+                message=message,
+                job_id=job.job_id,
+                status=job.status
             )
 
         raise HTTPException(status_code=500, detail="File processing failed")
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Upload PDF failed", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/upload-pdf/{job_id}", response_model=IngestionJobStatus)
+async def upload_status(job_id: str):
+    """Report page, chunk and embedding progress of an ingestion job, whichever worker runs it"""
+    job = await asyncio.to_thread(ingestion_manager.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 @router.post("/chat-pdf", response_model=ChatResponse)
-async def chat_pdf(request: ChatPDFRequest):
+async def chat_pdf(request: ChatPDFRequest, http_request: Request):
     try:
         if not request.conversation_id:
             raise HTTPException(status_code=400, detail="Conversation ID is required")
 
         conversation_id = request.conversation_id
 
-        if conversation_id not in chains:
+        # The index may have been built by another worker, so look it up in the shared store
+        vectorstore = await asyncio.to_thread(index_store.load_for_conversation, conversation_id)
+        if vectorstore is None:
+            link = index_store.get_conversation_link(conversation_id)
+            if link and link.get("status") == "failed":
+                raise HTTPException(status_code=409, detail=f"Document processing failed: {link.get('error')}")
+            if link:
+                raise HTTPException(status_code=409, detail=f"Document is still being processed (job {link.get('job_id')}: {link.get('status')})")
             raise HTTPException(status_code=404, detail="Conversation not found or document not processed")
+        keyword_index = await asyncio.to_thread(index_store.load_keyword_index_for_conversation, conversation_id)
 
         storage.create_conversation(conversation_id)  # idempotent in your case
-        conversation_history = storage.get_conversation(conversation_id) or []
-        logger.info(f"History for {conversation_id}: {conversation_history}")
+        conversation_history = storage.get_conversation(conversation_id, limit=context_window.max_messages) or []
+        conversation_history = await context_window.build(conversation_id, conversation_history, RETRIEVAL_CHAT_MODEL)
 
         storage.add_message(conversation_id, "user", request.message)
         logger.info(f"Processing message: {request.message}")
 
-        chain = chains[conversation_id]
-        if not chain:
-            raise HTTPException(status_code=500, detail="Conversation chain is missing.")
+        chain = create_chain(vectorstore, keyword_index)
+
+        if request.stream:
+            tokens = stream_chat(chain, request.message, conversation_history)
 
-        response = process_chat(chain, request.message, conversation_history)
+            def on_complete(content: str) -> ChatResponse:
+                ai_message = storage.add_message(conversation_id, "assistant", content)
+                return ChatResponse(
+                    id=ai_message.id,
+                    content=ai_message.content,
+                    conversation_id=conversation_id
+                )
+
+            return streaming_response(sse_chat_stream(tokens, on_complete))
+
+        try:
+            # The chain runs on the event loop; it is cancelled if the client goes away
+            response = await cancel_on_disconnect(
+                http_request, process_chat(chain, request.message, conversation_history)
+            )
+        except TimeoutError:
+            raise HTTPException(status_code=504, detail="Timed out generating a response")
+        except ClientDisconnected:
+            # Nobody is left to read a response, so don't store an answer either
+            return Response(status_code=499)
         ai_message = storage.add_message(conversation_id, "assistant", response)
 
         return ChatResponse(
@@ -82,8 +137,16 @@ async def chat_pdf(request: ChatPDFRequest):
             conversation_id=conversation_id
         )
 
+    except HTTPException:
+        raise
     except KeyError:
         raise HTTPException(status_code=404, detail="Conversation not found")
     except Exception as e:
         logger.error("Chat PDF processing failed", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/chat-pdf/stats")
+async def chat_pdf_stats():
+    """Query rewrite counters and recent per-stage latencies of the chat-with-PDF chain"""
+    return {"query_rewrite": query_rewriter.stats(), "stages": stage_timings.summary()}
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException
 from app.models.schemas import ChatURLRequest, ChatResponse
 from app.services.storage import storage
 from app.services.ai_service import ai_service
+from app.api.streaming import sse_chat_stream, streaming_response
 import uuid
 
 router = APIRouter()
@@ -20,6 +21,24 @@ async def chat_url(request: ChatURLRequest):
         # Add user message to conversation
         storage.add_message(conversation_id, "user", f"URL: {request.url}\nQuestion: {request.message}")
         
+        if request.stream:
+            tokens = ai_service.stream_analyze_url(
+                url=str(request.url),
+                query=request.message,
+                crawl_subpages=request.crawl_subpages,
+                model=request.model
+            )
+
+            def on_complete(content: str) -> ChatResponse:
+                ai_message = storage.add_message(conversation_id, "assistant", content)
+                return ChatResponse(
+                    id=ai_message.id,
+                    content=ai_message.content,
+                    conversation_id=conversation_id
+                )
+
+            return streaming_response(sse_chat_stream(tokens, on_complete))
+        
         # Get response from AI service
         response = await ai_service.analyze_url(
             url=str(request.url),
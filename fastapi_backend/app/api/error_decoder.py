@@ -1,19 +1,31 @@
 from fastapi import APIRouter, HTTPException
 from app.models.schemas import ErrorDecoderRequest, ChatResponse
 from app.services.ai_service import ai_service
+from app.services.response_cache import error_decoder_cache, ERROR_CACHE_ENABLED
 import uuid
 
 router = APIRouter()
 
+ERROR_DECODER_MODEL = "gpt-4o"
+
 @router.post("/error-decoder", response_model=ChatResponse)
 async def error_decoder(request: ErrorDecoderRequest):
     """Handle error decoding requests"""
     try:
-        # Get response from AI service
-        response = await ai_service.decode_error(
-            error_message=request.error_message,
-            language=request.language
-        )
+        async def decode():
+            return await ai_service.decode_error(
+                error_message=request.error_message,
+                language=request.language,
+                model=ERROR_DECODER_MODEL
+            )
+
+        # Get response from AI service, or from the cache for a trace seen before
+        if ERROR_CACHE_ENABLED:
+            response = await error_decoder_cache.get_or_compute(
+                request.error_message, request.language, ERROR_DECODER_MODEL, decode
+            )
+        else:
+            response = await decode()
         
         # Generate a unique ID for the response
         response_id = str(uuid.uuid4())
@@ -25,4 +37,9 @@ async def error_decoder(request: ErrorDecoderRequest):
         )
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/error-decoder/cache-stats")
+async def error_decoder_cache_stats():
+    """Hit/miss counters of the error decoder response cache"""
+    return error_decoder_cache.stats()
@@ -0,0 +1,52 @@
+"""
+GET /metrics in the Prometheus text format, and the ASGI middleware counting and
+timing HTTP requests by route template and status.
+
+Requests are labelled with the route's path template ("/upload-pdf/{job_id}"
+rather than every id), so the number of label sets stays bounded. The duration
+covers the whole response, streamed bodies included.
+"""
+import time
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.metrics import metrics, http_requests, http_request_duration, trace_span
+
+router = APIRouter()
+
+
+class HTTPMetricsMiddleware:
+    """Records http_requests_total and http_request_duration_seconds for every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        try:
+            with trace_span(f"HTTP {method}", path=scope["path"]):
+                await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            # Unmatched paths share one label instead of one per path
+            path = getattr(route, "path", None) or "unmatched"
+            http_requests.inc(method=method, route=path, status=str(status))
+            http_request_duration.observe(time.perf_counter() - start, method=method, route=path)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Counters, gauges and latency histograms in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,58 @@
+"""
+Helpers for streaming chat responses to the client as Server-Sent Events.
+
+Events sent:
+    token  - {"content": "<text delta>"} for every chunk received from the model
+    done   - the final ChatResponse once the assembled message has been stored
+    error  - {"detail": "<message>"} if generation fails mid-stream
+"""
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Callable
+from fastapi.responses import StreamingResponse
+from app.models.schemas import ChatResponse
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def sse_chat_stream(tokens: AsyncIterator[str],
+                          on_complete: Callable[[str], ChatResponse]) -> AsyncIterator[str]:
+    """
+    Forward tokens as SSE events and call on_complete with the assembled message
+    once the stream ends. If the client disconnects, the server cancels this
+    generator, which closes `tokens` and with it the upstream provider request.
+    """
+    parts = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield sse_event("token", {"content": token})
+
+        response = on_complete("".join(parts))
+        yield sse_event("done", response.model_dump())
+    except asyncio.CancelledError:
+        logger.info("Client disconnected, upstream stream cancelled")
+        raise
+    except Exception as e:
+        logger.error("Streaming response failed", exc_info=True)
+        yield sse_event("error", {"detail": str(e)})
+    finally:
+        # Propagate the close to the provider stream right away instead of at garbage collection
+        aclose = getattr(tokens, "aclose", None)
+        if aclose:
+            await aclose()
+
+
+def streaming_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Wrap an SSE event generator in a response with caching and proxy buffering disabled"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
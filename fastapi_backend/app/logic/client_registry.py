@@ -0,0 +1,74 @@
+"""
+Long-lived LLM and embedding clients shared by every retrieval chain.
+
+Creating a GoogleGenerativeAIEmbeddings object sets up new HTTP clients (SSL context
+included) and their connection pools. The registry creates each client once per
+process, on first use, so every conversation and upload reuses the same pooled
+connections; only the vectorstore differs between chains. Chat models are thin
+adapters over the LLM gateway, which owns the provider clients and credentials.
+"""
+import os
+import threading
+from typing import Dict
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from app.logic.embedding_pipeline import RateLimitedEmbeddings, embedding_rate_limiter, embedding_query_rate_limiter
+from app.logic.gateway_chat_model import GatewayChatModel
+from app.logic.local_embeddings import HashingEmbeddings
+
+# "google" uses Gemini embeddings, "hashing" a local model that needs no API key
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "google")
+GOOGLE_EMBEDDING_MODEL = "models/embedding-001"
+# Gemini API endpoint for embeddings, e.g. a proxy or a local fake server (default: Google's)
+GOOGLE_EMBEDDING_API_ENDPOINT = os.getenv("GOOGLE_EMBEDDING_API_ENDPOINT", "")
+EMBEDDING_MODEL = HashingEmbeddings().model_name if EMBEDDING_PROVIDER == "hashing" else GOOGLE_EMBEDDING_MODEL
+
+
+def create_google_embeddings() -> GoogleGenerativeAIEmbeddings:
+    """Gemini embeddings, over REST to GOOGLE_EMBEDDING_API_ENDPOINT when it is set"""
+    if GOOGLE_EMBEDDING_API_ENDPOINT:
+        return GoogleGenerativeAIEmbeddings(
+            model=GOOGLE_EMBEDDING_MODEL,
+            client_options={"api_endpoint": GOOGLE_EMBEDDING_API_ENDPOINT},
+            transport="rest"
+        )
+    return GoogleGenerativeAIEmbeddings(model=GOOGLE_EMBEDDING_MODEL)
+
+
+class ClientRegistry:
+    """Creates LLM and embedding clients on first use and hands out the same instances afterwards"""
+
+    def __init__(self):
+        self._chat_models: Dict[str, GatewayChatModel] = {}
+        self._embeddings: Embeddings = None
+        self._lock = threading.Lock()
+        self.clients_created = 0
+
+    def chat_model(self, model: str) -> GatewayChatModel:
+        """Shared chat model sending its calls through the LLM gateway"""
+        chat_model = self._chat_models.get(model)
+        if chat_model is None:
+            with self._lock:
+                chat_model = self._chat_models.get(model)
+                if chat_model is None:
+                    chat_model = GatewayChatModel(model=model)
+                    self._chat_models[model] = chat_model
+                    self.clients_created += 1
+        return chat_model
+
+    def embeddings(self) -> Embeddings:
+        """Shared embedding model for EMBEDDING_PROVIDER, without the embedding cache"""
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    if EMBEDDING_PROVIDER == "hashing":
+                        self._embeddings = HashingEmbeddings()
+                    else:
+                        self._embeddings = RateLimitedEmbeddings(
+                            create_google_embeddings(), embedding_rate_limiter, embedding_query_rate_limiter
+                        )
+                    self.clients_created += 1
+        return self._embeddings
+
+# Initialize global client registry
+client_registry = ClientRegistry()
@@ -1,16 +1,23 @@
 import os
+import time
+import asyncio
 import logging
+from functools import lru_cache
 from dotenv import load_dotenv
 from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import Runnable, RunnableLambda
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains.history_aware_retriever import create_history_aware_retriever
 
 from app.utils import convert_to_langchain_messages
 from app.logic.document_loaders import DocumentLoader
+from app.logic.embedding_cache import CachedEmbeddings, embedding_cache
+from app.logic.embedding_pipeline import EmbeddingPipeline
+from app.logic.client_registry import client_registry, EMBEDDING_PROVIDER, EMBEDDING_MODEL
+from app.logic.hybrid_retrieval import create_retriever
+from app.logic.query_rewrite import query_rewriter
+from app.services.metrics import span, record_stage
 
 # Configure logging
 logging.basicConfig(
@@ -19,11 +26,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load environment variables
+# Load environment variables (GOOGLE_API_KEY for the Gemini embeddings)
 load_dotenv()
-os.environ['GROQ_API_KEY'] = os.getenv("GROQ_API_KEY")
-os.environ['OPENAI_API_KEY'] = os.getenv("OPENAI_API_KEY")
-os.environ['GOOGLE_API_KEY'] = os.getenv("GOOGLE_API_KEY")
 
 # Prompt template
 SYSTEM_PROMPT = """
@@ -34,61 +38,145 @@ Always refer to the user as "Boss."
 Context: {context}
 """
 
-def create_db(docs):
-    """Create a FAISS vectorstore from given documents."""
+# Answering prompt
+RESPONSE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
+    MessagesPlaceholder(variable_name="chat_history"),
+    ("user", "{input}")
+])
+
+# Prompt rewriting a follow-up question into a search query
+RETRIEVER_PROMPT = ChatPromptTemplate.from_messages([
+    MessagesPlaceholder(variable_name="chat_history"),
+    ("user", "{input}"),
+    ("user", "Given the above conversation, generate a search query to retrieve relevant context.")
+])
+
+# Model answering questions about documents, served through the LLM gateway
+RETRIEVAL_CHAT_MODEL = "llama-3.1-8b-instant"
+# Longest a chat turn may take, rewrite, retrieval and answer included (0 disables the limit)
+CHAT_CHAIN_TIMEOUT_SECONDS = float(os.getenv("CHAT_CHAIN_TIMEOUT_SECONDS", 120))
+
+def create_embeddings():
+    """
+    Embedding model used to build and query the vectorstores, backed by the embedding cache.
+    The underlying client is shared; only the cache hit/miss counters are per instance.
+    """
+    return CachedEmbeddings(client_registry.embeddings(), EMBEDDING_MODEL, embedding_cache)
+
+def create_db(docs, on_progress=None, embeddings=None):
+    """
+    Create a FAISS vectorstore from given documents.
+    Chunks are embedded in concurrent batches and on_progress(embedded_count) is called
+    as each batch is added. Only chunks missing from the embedding cache are sent to
+    the embedding model.
+    """
   
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    vectorstore = FAISS.from_documents(docs, embeddings)
+    embeddings = embeddings or create_embeddings()
+    with span("create_db"):
+        vectorstore = EmbeddingPipeline(embeddings).build(docs, on_progress=on_progress)
+
+    if vectorstore is None:
+        raise ValueError("No text could be extracted from the document")
     logger.info("Vectorstore created successfully.")
+    if isinstance(embeddings, CachedEmbeddings):
+        logger.info(
+            f"Embedding cache: {embeddings.hits} hits, {embeddings.misses} misses "
+            f"({embeddings.hit_rate:.0%} hit rate)"
+        )
     return vectorstore
 
-def create_chain(vectorstore):
-    """Build a conversation-aware retrieval and response chain."""
-  
-    llm = ChatGroq(model="llama-3.1-8b-instant")
-
-    # Create the answering prompt
-    response_prompt = ChatPromptTemplate.from_messages([
-        ("system", SYSTEM_PROMPT),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("user", "{input}")
-    ])
-    response_chain = create_stuff_documents_chain(llm=llm, prompt=response_prompt)
-
-    # Create the retriever prompt
-    retriever_prompt = ChatPromptTemplate.from_messages([
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("user", "{input}"),
-        ("user", "Given the above conversation, generate a search query to retrieve relevant context.")
-    ])
-
-    retriever = vectorstore.as_retriever()
-    history_aware_retriever = create_history_aware_retriever(
-        llm=llm,
-        retriever=retriever,
-        prompt=retriever_prompt
-    )
-
-    full_chain = create_retrieval_chain(history_aware_retriever, response_chain)
-
-    return full_chain
-
-def process_chat(chain, question: str, chat_history: list):
-    """Send message and history to the chain and return the assistant's response."""
+@lru_cache(maxsize=None)
+def get_compiled_chain(model: str = RETRIEVAL_CHAT_MODEL) -> Runnable:
+    """
+    Conversation-aware retrieval and response chain for a model, built once and
+    shared by all conversations. The retriever to search is read from the
+    "retriever" input key, so nothing in the chain is tied to one document.
+    Query rewrites and answers are sent through the LLM gateway.
+    """
+    llm = client_registry.chat_model(model)
+    response_chain = create_stuff_documents_chain(llm=llm, prompt=RESPONSE_PROMPT)
+    history_aware_retriever = query_rewriter.as_retriever(llm=llm, prompt=RETRIEVER_PROMPT)
+    return create_retrieval_chain(history_aware_retriever, response_chain)
+
+def create_chain(vectorstore, keyword_index=None):
+    """
+    Build a conversation-aware retrieval and response chain.
+    Context is retrieved by fusing keyword (BM25) and vector search when the
+    vectorstore's keyword index is given, and by vector search alone otherwise.
+    Follow-up questions are rewritten into standalone search queries first;
+    self-contained ones skip that LLM call (see query_rewrite).
+    Only the retriever is created here; the LLM client, prompts and chain are shared.
+    """
+    retriever = create_retriever(vectorstore, keyword_index)
+    return RunnableLambda(lambda inputs: {**inputs, "retriever": retriever}) | get_compiled_chain()
+
+async def process_chat(chain, question: str, chat_history: list, timeout: float = CHAT_CHAIN_TIMEOUT_SECONDS):
+    """
+    Send message and history to the chain and return the assistant's response.
+    Raises TimeoutError if the chain takes longer than `timeout` seconds. Cancelling
+    the caller cancels the chain, including any LLM request in flight.
+    """
     logger.info(f"Processing new message: '{question}'")
     try:
         formatted_history = convert_to_langchain_messages(chat_history)
-    
-        
-        result = chain.invoke({
-            "chat_history": formatted_history,
-            "input": question
-        })
+
+        with span("chain"):
+            result = await asyncio.wait_for(chain.ainvoke({
+                "chat_history": formatted_history,
+                "input": question
+            }), timeout or None)
 
         answer = result.get("answer", "No response generated.")
         logger.info("Response successfully generated.")
         return answer
 
+    except TimeoutError:
+        logger.warning(f"Chain took longer than {timeout}s, giving up")
+        raise
     except Exception as e:
         logger.error("Error during chain invocation", exc_info=True)
         return "There was an error processing your request. Please try again."
+
+async def stream_chat(chain, question: str, chat_history: list, timeout: float = CHAT_CHAIN_TIMEOUT_SECONDS):
+    """
+    Stream the assistant's answer token by token from the chain.
+    Raises TimeoutError if the whole answer takes longer than `timeout` seconds.
+    """
+    logger.info(f"Streaming response for message: '{question}'")
+    chunks = None
+    try:
+        formatted_history = convert_to_langchain_messages(chat_history)
+
+        start = time.perf_counter()
+        deadline = start + timeout if timeout else None
+        first_token = True
+        chunks = chain.astream({
+            "chat_history": formatted_history,
+            "input": question
+        })
+        while True:
+            remaining = deadline - time.perf_counter() if deadline else None
+            try:
+                chunk = await asyncio.wait_for(anext(chunks), remaining)
+            except StopAsyncIteration:
+                break
+            answer = chunk.get("answer")
+            if answer:
+                if first_token:
+                    record_stage("first_token", time.perf_counter() - start)
+                    first_token = False
+                yield answer
+        record_stage("chain", time.perf_counter() - start)
+
+        logger.info("Response successfully streamed.")
+
+    except TimeoutError:
+        logger.warning(f"Streaming chain took longer than {timeout}s, giving up")
+        raise TimeoutError("Timed out generating a response") from None
+    except Exception as e:
+        logger.error("Error during chain streaming", exc_info=True)
+        yield "There was an error processing your request. Please try again."
+    finally:
+        if chunks is not None:
+            await chunks.aclose()
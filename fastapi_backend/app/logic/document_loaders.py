@@ -2,8 +2,11 @@
 import os
 os.environ['USER_AGENT'] = 'myagent'
 
-from langchain_community.document_loaders import WebBaseLoader, PyPDFLoader
+from langchain_community.document_loaders import WebBaseLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from app.logic.pdf_extraction import read_page_info, iter_page_texts, PDF_EXTRACTION_WORKERS
+from app.services.metrics import span, traced
 
 class DocumentLoader:
     def __init__(self, chunk_size=400, chunk_overlap=20):
@@ -16,18 +19,48 @@ class DocumentLoader:
     def web_base_loader(self, url):
         # Load documents from the web
         loader = WebBaseLoader(url)
-        docs = loader.load()
+        with span("document.load_web"):
+            docs = loader.load()
 
         # Split the loaded documents into chunks
-        split_docs = self.splitter.split_documents(docs)
-        return split_docs
+        return self.split_documents(docs)
 
-    def load_pdf(self, file_path):
-        # Load PDF documents
-        loader = PyPDFLoader(file_path)
-        docs = loader.load()
+    @traced("document.split")
+    def split_documents(self, docs):
+        # Split already loaded documents, e.g. crawled web pages, into chunks
+        return self.splitter.split_documents(docs)
 
-        # Split the loaded PDF documents into chunks
-        split_docs = self.splitter.split_documents(docs)
-        return split_docs
+    def load_pdf(self, file_path, on_page=None):
+        # Load and split a whole PDF, reporting each page to on_page if given
+        return list(self.iter_pdf_chunks(file_path, on_page=on_page))
 
+    def iter_pdf_chunks(self, file_path, on_page=None, workers=None, isolated=False):
+        # Split the PDF page by page, yielding chunks as soon as each page is read
+        for page in self.iter_pdf_pages(file_path, workers=workers, isolated=isolated):
+            if on_page:
+                on_page(page)
+            with span("document.split"):
+                chunks = self.splitter.split_documents([page])
+            yield from chunks
+
+    def iter_pdf_pages(self, file_path, workers=None, isolated=False):
+        # Yield PDF pages in order with the metadata PyPDFLoader emits. With workers > 1
+        # the text of large documents is extracted on that many processes, and with
+        # isolated the text of every document is extracted on worker processes.
+        with span("document.load"):
+            total_pages, page_labels = read_page_info(file_path)
+        texts = iter_page_texts(file_path, total_pages, workers or PDF_EXTRACTION_WORKERS, isolated=isolated)
+
+        for page_number in range(total_pages):
+            # Time each page's extraction, not what the caller does between pages
+            with span("document.load_page"):
+                text = next(texts)
+            yield Document(
+                page_content=text.strip(),
+                metadata={
+                    "source": file_path,
+                    "total_pages": total_pages,
+                    "page": page_number,
+                    "page_label": page_labels[page_number]
+                }
+            )
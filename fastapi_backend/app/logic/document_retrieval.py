@@ -0,0 +1,110 @@
+"""
+Retrieval of document content for analyze_document.
+
+A document is parsed (PDFs page by page with DocumentLoader, anything else as UTF-8
+text), split and embedded into a vector index once, and every query then only puts
+the DOCUMENT_CONTEXT_CHUNKS chunks most relevant to it into the prompt, instead of
+the first characters of the file. Chunks are found by hybrid keyword and vector
+search, so exact terms such as clause numbers are matched too.
+
+Indexes use the same content-hash keys and chunk settings as PDF ingestion, so a
+document uploaded through /upload-pdf is never indexed a second time.
+"""
+import os
+import asyncio
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from app.logic.document_loaders import DocumentLoader
+from app.logic.conversation_retrieval import create_db
+from app.logic.hybrid_retrieval import create_retriever
+from app.services.index_store import index_store
+from app.services.ingestion import CHUNK_SIZE, CHUNK_OVERLAP, file_sha256, index_key
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Chunks of document content sent to the model with each query
+DOCUMENT_CONTEXT_CHUNKS = int(os.getenv("DOCUMENT_CONTEXT_CHUNKS", 6))
+MAX_REMEMBERED_HASHES = 10000
+
+document_loader = DocumentLoader(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def is_pdf(file_path: str) -> bool:
+    # Uploads are stored under their hash without an extension, so check the header
+    with open(file_path, "rb") as f:
+        return f.read(5) == b"%PDF-"
+
+
+def iter_document_chunks(file_path: str) -> Iterator[Document]:
+    """Parse and split a document into chunks"""
+    if is_pdf(file_path):
+        yield from document_loader.iter_pdf_chunks(file_path)
+        return
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    yield from document_loader.split_documents([Document(page_content=text, metadata={"source": file_path})])
+
+
+def format_context(chunks: List[Document]) -> str:
+    """Join chunks into prompt text, labelling PDF chunks with their page"""
+    parts = []
+    for chunk in chunks:
+        page_label = chunk.metadata.get("page_label")
+        parts.append(f"[Page {page_label}]\n{chunk.page_content}" if page_label else chunk.page_content)
+    return "\n\n".join(parts)
+
+
+class DocumentRetriever:
+    """Builds, caches and queries the vector indexes of documents on disk"""
+
+    def __init__(self, k: int = DOCUMENT_CONTEXT_CHUNKS):
+        self.k = k
+        # (path, size, mtime) -> content hash, so unchanged files are not hashed on every query
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        # Concurrent queries about the same document share one index build
+        self._single_flight = SingleFlight()
+        self.indexes_built = 0
+
+    async def retrieve(self, file_path: str, query: str) -> str:
+        """Return the parts of the document relevant to the query"""
+        key = await asyncio.to_thread(self._index_key, file_path)
+        vectorstore = await self._single_flight.do(key, lambda: self.get_index(file_path, key))
+        if vectorstore is None:
+            return ""
+        keyword_index = await asyncio.to_thread(index_store.load_keyword_index, key)
+        chunks = await create_retriever(vectorstore, keyword_index, k=self.k).ainvoke(query)
+        return format_context(chunks)
+
+    async def get_index(self, file_path: str, key: str) -> Optional[FAISS]:
+        """Load the document's index, building it if the content was never indexed"""
+        vectorstore = await asyncio.to_thread(index_store.load, key)
+        if vectorstore is not None:
+            return vectorstore
+
+        try:
+            # Parsing and embedding block, run them on a worker thread
+            vectorstore = await asyncio.to_thread(create_db, iter_document_chunks(file_path))
+        except ValueError:
+            logger.warning(f"No text could be extracted from {file_path}")
+            return None
+        await asyncio.to_thread(index_store.save, key, vectorstore)
+        self.indexes_built += 1
+        logger.info(f"Indexed {file_path} as {key}")
+        return vectorstore
+
+    def _index_key(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        file_key = (file_path, stat.st_size, stat.st_mtime_ns)
+        content_hash = self._hashes.get(file_key)
+        if content_hash is None:
+            content_hash = file_sha256(file_path)
+            if len(self._hashes) >= MAX_REMEMBERED_HASHES:
+                self._hashes.clear()
+            self._hashes[file_key] = content_hash
+        return index_key(content_hash)
+
+# Initialize global document retriever
+document_retriever = DocumentRetriever()
@@ -0,0 +1,141 @@
+"""
+Persistent, content-addressed cache for document embeddings.
+
+Vectors are stored in SQLite keyed by (embedding model, hash of the normalized chunk
+text), so re-uploading a document, or a document sharing boilerplate pages with an
+earlier one, only sends the chunks that were never embedded before to the provider.
+"""
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from typing import Dict, List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3")
+
+# SQLite limits the number of bound parameters per statement
+LOOKUP_BATCH_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """Normalize chunk text so insignificant whitespace/unicode differences share an entry"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite backed store of embedding vectors with hit/miss counters"""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Look up vectors for the given text hashes, returning only the ones found"""
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+                batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                for hash_, blob in rows:
+                    found[hash_] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        """Store vectors keyed by text hash"""
+        rows = [(model, hash_, np.asarray(vector, dtype=np.float32).tobytes()) for hash_, vector in vectors.items()]
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)", rows)
+            self.conn.commit()
+
+    def record(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters since startup"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so document embeddings are served from the cache and
+    only the misses are sent, in one batch per call, to the underlying model.
+    Query embeddings are passed through since providers embed queries differently.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: "EmbeddingCache"):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        # Batches are embedded from several threads at once
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model_name, list(set(hashes)))
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing = {}
+        for hash_, text in zip(hashes, texts):
+            if hash_ not in vectors and hash_ not in missing:
+                missing[hash_] = text
+
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), embedded))
+            self.cache.put_many(self.model_name, new_vectors)
+            vectors.update(new_vectors)
+
+        misses = len(missing)
+        hits = len(texts) - misses
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        self.cache.record(hits, misses)
+        return [vectors[hash_] for hash_ in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+# Initialize global embedding cache
+embedding_cache = EmbeddingCache()
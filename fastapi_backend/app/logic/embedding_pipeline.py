@@ -0,0 +1,188 @@
+"""
+Batched, concurrent embedding of document chunks into a FAISS index.
+
+Chunks are split into batches that are embedded on a thread pool, several at a time.
+Calls to the embedding provider go through a token-bucket rate limiter; question
+embeddings (embed_query) have their own bucket, so a large upload using up the
+ingestion budget does not hold up the questions being asked meanwhile. Rate limits,
+timeouts and server errors are retried with exponential backoff, so a burst of 429s
+slows an upload down instead of failing it; other errors fail the call at once. Vectors are added to the index as soon as each batch finishes.
+"""
+import os
+import time
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from typing import Callable, Iterable, List, Optional
+import httpx
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from app.services.metrics import span, embedding_texts
+from app.services.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 100))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+# Provider calls per second allowed across all uploads in this process (0 disables the limit)
+EMBEDDING_REQUESTS_PER_SECOND = float(os.getenv("EMBEDDING_REQUESTS_PER_SECOND", 10))
+EMBEDDING_BURST = int(os.getenv("EMBEDDING_BURST", 10))
+# Separate budget for embedding questions, on top of the one above (0 disables the limit)
+EMBEDDING_QUERY_REQUESTS_PER_SECOND = float(os.getenv("EMBEDDING_QUERY_REQUESTS_PER_SECOND", 5))
+EMBEDDING_QUERY_BURST = int(os.getenv("EMBEDDING_QUERY_BURST", 10))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 5))
+EMBEDDING_RETRY_BACKOFF = float(os.getenv("EMBEDDING_RETRY_BACKOFF", 1.0))
+
+# Rate limits, timeouts and server errors; other failures (bad key, invalid input) won't succeed on retry
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (TimeoutError, ConnectionError, httpx.TransportError)
+try:
+    import requests
+    RETRYABLE_ERRORS += (requests.ConnectionError, requests.Timeout)
+except ImportError:
+    pass
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether a failed embedding call may succeed when sent again. Client libraries wrap
+    the HTTP error (e.g. GoogleGenerativeAIError around a google.api_core 429), so the
+    chain of causes is checked too.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, RETRYABLE_ERRORS):
+            return True
+        for status in (getattr(error, "status_code", None), getattr(error, "code", None),
+                       getattr(getattr(error, "response", None), "status_code", None)):
+            if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+                return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Applies shared rate limits and retries with exponential backoff to an embedding
+    model. Documents are limited by rate_limiter and queries by query_rate_limiter.
+    """
+
+    def __init__(self,
+                 embeddings: Embeddings,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 query_rate_limiter: Optional[TokenBucket] = None,
+                 max_retries: int = EMBEDDING_MAX_RETRIES,
+                 backoff: float = EMBEDDING_RETRY_BACKOFF):
+        self.embeddings = embeddings
+        self.rate_limiter = rate_limiter
+        self.query_rate_limiter = query_rate_limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.retries = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._call(self.embeddings.embed_documents, texts, self.rate_limiter)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call(self.embeddings.embed_query, text, self.query_rate_limiter)
+
+    def _call(self, func: Callable, arg, rate_limiter: Optional[TokenBucket]):
+        attempt = 0
+        while True:
+            if rate_limiter:
+                rate_limiter.acquire()
+            try:
+                return func(arg)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                # Full jitter keeps concurrent batches from retrying in lockstep
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Embedding call failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+
+class EmbeddingPipeline:
+    """Embeds documents in concurrent batches and adds them to a FAISS index as they finish"""
+
+    def __init__(self,
+                 embeddings: Embeddings,
+                 batch_size: int = EMBEDDING_BATCH_SIZE,
+                 concurrency: int = EMBEDDING_CONCURRENCY):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+    def build(self,
+              docs: Iterable[Document],
+              on_progress: Optional[Callable[[int], None]] = None) -> Optional[FAISS]:
+        """
+        Embed all documents and return the index, or None if there were none.
+        `docs` may be a generator; at most 2 * concurrency batches are held in memory.
+        on_progress(embedded_count) is called after each batch is added.
+        """
+        batches = self._batches(docs)
+        vectorstore = None
+        embedded = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embedding") as executor:
+            pending = {}
+
+            def fill():
+                while len(pending) < self.concurrency * 2:
+                    batch = next(batches, None)
+                    if batch is None:
+                        return
+                    future = executor.submit(self._embed, [doc.page_content for doc in batch])
+                    pending[future] = batch
+
+            fill()
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch = pending.pop(future)
+                        vectors = future.result()
+                        with span("vectorstore.add"):
+                            vectorstore = self._add(vectorstore, batch, vectors)
+                        embedded += len(batch)
+                        if on_progress:
+                            on_progress(embedded)
+                    fill()
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        return vectorstore
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        with span("embedding.batch"):
+            vectors = self.embeddings.embed_documents(texts)
+        embedding_texts.inc(len(texts))
+        return vectors
+
+    def _batches(self, docs: Iterable[Document]):
+        iterator = iter(docs)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _add(self, vectorstore: Optional[FAISS], batch: List[Document], vectors: List[List[float]]) -> FAISS:
+        text_embeddings = [(doc.page_content, vector) for doc, vector in zip(batch, vectors)]
+        metadatas = [doc.metadata for doc in batch]
+        if vectorstore is None:
+            return FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas)
+        vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+        return vectorstore
+
+# Shared by every upload in the process so the provider limit holds globally
+embedding_rate_limiter = TokenBucket(EMBEDDING_REQUESTS_PER_SECOND, EMBEDDING_BURST)
+embedding_query_rate_limiter = TokenBucket(EMBEDDING_QUERY_REQUESTS_PER_SECOND, EMBEDDING_QUERY_BURST)
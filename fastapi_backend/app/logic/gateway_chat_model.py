@@ -0,0 +1,95 @@
+"""
+LangChain chat model backed by the LLM gateway.
+
+The retrieval chains are built from LangChain runnables, but their query rewrite and
+answer calls should get the same treatment as every other LLM request: provider
+connection pools, rate limits, retries, failover, single-flight and the llm_* metrics.
+GatewayChatModel turns the prompt's messages into an LLMRequest and sends it through
+llm_gateway.complete, or llm_gateway.stream when the chain is streamed.
+"""
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from app.models.schemas import LLMRequest
+from app.services.llm_gateway import llm_gateway
+
+# LangChain message types -> gateway roles
+ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+class GatewayError(Exception):
+    """Raised when the gateway answers a request with an error"""
+
+
+def message_text(message: BaseMessage) -> str:
+    """Text of a message whose content is a string or a list of content blocks"""
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in message.content if isinstance(block, str) or block.get("type") == "text"
+    )
+
+
+def to_gateway_messages(messages: List[BaseMessage]) -> List[Dict[str, str]]:
+    """Role and text content of LangChain messages, as LLMRequest expects them"""
+    return [{"role": ROLES.get(message.type, "user"), "content": message_text(message)} for message in messages]
+
+
+class GatewayChatModel(BaseChatModel):
+    """Chat model sending every call through llm_gateway"""
+
+    model: str
+    temperature: float = 0.7
+    max_tokens: int = 1000
+    operation: str = "chat"
+
+    @property
+    def _llm_type(self) -> str:
+        return "llm-gateway"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "temperature": self.temperature, "max_tokens": self.max_tokens}
+
+    def _request(self, messages: List[BaseMessage]) -> LLMRequest:
+        return LLMRequest(
+            model=self.model,
+            messages=to_gateway_messages(messages),
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            operation=self.operation
+        )
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        # The gateway's pooled clients belong to the application's event loop
+        raise NotImplementedError("GatewayChatModel is async only, use ainvoke or astream")
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        response = await llm_gateway.complete(self._request(messages))
+        if response.error:
+            raise GatewayError(response.error)
+        message = AIMessage(content=response.content, response_metadata={"model_name": response.model})
+        if response.tokens_used:
+            message.usage_metadata = {
+                "input_tokens": response.tokens_used.prompt,
+                "output_tokens": response.tokens_used.completion,
+                "total_tokens": response.tokens_used.total
+            }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        # Closing this generator (e.g. on a client disconnect) closes the upstream stream
+        async with aclosing(llm_gateway.stream(self._request(messages))) as deltas:
+            async for delta in deltas:
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=delta))
+                if run_manager:
+                    await run_manager.on_llm_new_token(delta, chunk=chunk)
+                yield chunk
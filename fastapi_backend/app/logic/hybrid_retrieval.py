@@ -0,0 +1,240 @@
+"""
+Hybrid keyword and vector retrieval over FAISS indexes.
+
+Dense embeddings are good at paraphrases but miss exact identifiers such as clause
+numbers, SKUs and error codes. KeywordIndex is a BM25 inverted index over the same
+chunks, built when the vectorstore is saved and stored next to it, with rows aligned
+to the FAISS index. A query is run against both, the two rankings are merged with
+reciprocal rank fusion and, optionally, the fused candidates are reordered by a cheap
+lexical reranker before the top RETRIEVAL_K chunks are returned.
+"""
+import os
+import re
+import math
+import pickle
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import faiss
+import numpy as np
+from pydantic import ConfigDict
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+# "hybrid" fuses keyword and vector search, "vector" uses the embeddings only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Chunks put into the prompt per question
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 4))
+# Candidates taken from each ranking before fusion
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", 20))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", 60))
+# "lexical" reorders fused candidates by query term coverage, "none" keeps the fused order
+RETRIEVAL_RERANKER = os.getenv("RETRIEVAL_RERANKER", "lexical")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+KEYWORD_INDEX_FILE = "keywords.pkl"
+
+# Words, keeping identifiers such as 87.12, SKU-1042 or option_5_2 together
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-/:]\w+)*", re.UNICODE)
+TOKEN_SEPARATORS = re.compile(r"[.\-/:_]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a text; compound identifiers also yield their parts"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        parts = TOKEN_SEPARATORS.split(token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+
+class KeywordIndex:
+    """BM25 inverted index whose rows are the rows of a FAISS index"""
+
+    def __init__(self, vocabulary: Dict[str, int], indptr: np.ndarray, rows: np.ndarray,
+                 weights: np.ndarray, idf: np.ndarray, size: int):
+        # Postings of term t are rows[indptr[t]:indptr[t + 1]] with their BM25 weights
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.rows = rows
+        self.weights = weights
+        self.idf = idf
+        self.size = size
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = BM25_K1, b: float = BM25_B) -> "KeywordIndex":
+        """Index texts; the i-th text becomes row i"""
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                postings[term].append((row, count))
+
+        size = len(lengths)
+        average_length = (sum(lengths) / size) if size else 0.0
+        lengths = np.asarray(lengths, dtype=np.float32)
+        vocabulary, indptr, idf = {}, [0], []
+        row_parts, weight_parts = [], []
+        for term, term_postings in postings.items():
+            vocabulary[term] = len(vocabulary)
+            term_rows = np.fromiter((row for row, _ in term_postings), dtype=np.int32, count=len(term_postings))
+            counts = np.fromiter((count for _, count in term_postings), dtype=np.float32, count=len(term_postings))
+            term_idf = math.log(1 + (size - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            # Everything in the BM25 score except the query is known now, so store the final weights
+            norm = k1 * (1 - b + b * lengths[term_rows] / average_length)
+            row_parts.append(term_rows)
+            weight_parts.append(term_idf * counts * (k1 + 1) / (counts + norm))
+            idf.append(term_idf)
+            indptr.append(indptr[-1] + len(term_postings))
+
+        return cls(
+            vocabulary=vocabulary,
+            indptr=np.asarray(indptr, dtype=np.int64),
+            rows=np.concatenate(row_parts) if row_parts else np.zeros(0, dtype=np.int32),
+            weights=np.concatenate(weight_parts) if weight_parts else np.zeros(0, dtype=np.float32),
+            idf=np.asarray(idf, dtype=np.float32),
+            size=size
+        )
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore: FAISS) -> "KeywordIndex":
+        """Index the chunks of a vectorstore in FAISS row order"""
+        ids = vectorstore.index_to_docstore_id
+        return cls.build(vectorstore.docstore.search(ids[row]).page_content for row in range(len(ids)))
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to k (row, score) pairs, best first"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            scores[self.rows[start:end]] += self.weights[start:end]
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(row), float(scores[row])) for row in matched]
+
+    def term_idf(self, term: str) -> float:
+        """IDF of a term; unseen terms get the IDF of a term found in no chunk"""
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            return math.log(1 + (self.size + 0.5) / 0.5)
+        return float(self.idf[term_id])
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.weights.nbytes + self.indptr.nbytes + self.idf.nbytes
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump({
+                "vocabulary": self.vocabulary, "indptr": self.indptr, "rows": self.rows,
+                "weights": self.weights, "idf": self.idf, "size": self.size
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "KeywordIndex":
+        with open(path, "rb") as f:
+            return cls(**pickle.load(f))
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], rrf_k: int = RETRIEVAL_RRF_K) -> List[Tuple[int, float]]:
+    """Merge rankings of rows into one: every ranking adds 1 / (rrf_k + rank) to a row's score"""
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] += 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def rerank_lexical(query: str, candidates: List[Tuple[Document, float]],
+                   keyword_index: KeywordIndex) -> List[Tuple[Document, float]]:
+    """
+    Reorder fused candidates by the IDF-weighted share of query terms each chunk
+    contains, using the fused score to break ties. Cheap enough to run on every query.
+    """
+    query_terms = set(tokenize(query))
+    if not query_terms or not candidates:
+        return candidates
+    term_weights = {term: keyword_index.term_idf(term) for term in query_terms}
+    total_weight = sum(term_weights.values())
+    best_fused = candidates[0][1] or 1.0
+
+    def score(candidate: Tuple[Document, float]) -> float:
+        chunk_terms = set(tokenize(candidate[0].page_content))
+        coverage = sum(weight for term, weight in term_weights.items() if term in chunk_terms) / total_weight
+        return coverage + 0.5 * candidate[1] / best_fused
+
+    return sorted(candidates, key=score, reverse=True)
+
+
+def vector_search(vectorstore: FAISS, query: str, k: int) -> List[int]:
+    """Rows of the k chunks nearest to the query, best first"""
+    if vectorstore.index.ntotal == 0:
+        return []
+    vector = np.array([vectorstore._embed_query(query)], dtype=np.float32)
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(vector)
+    _, rows = vectorstore.index.search(vector, min(k, vectorstore.index.ntotal))
+    return [int(row) for row in rows[0] if row != -1]
+
+
+def hybrid_search(vectorstore: FAISS,
+                  keyword_index: Optional[KeywordIndex],
+                  query: str,
+                  k: int = RETRIEVAL_K,
+                  fetch_k: int = RETRIEVAL_FETCH_K,
+                  reranker: str = RETRIEVAL_RERANKER) -> List[Document]:
+    """
+    Return the k chunks most relevant to the query. Without a keyword index this is
+    a plain vector search.
+    """
+    vector_rows = vector_search(vectorstore, query, max(k, fetch_k) if keyword_index else k)
+    if keyword_index is None:
+        fused = [(row, 0.0) for row in vector_rows]
+    else:
+        keyword_rows = [row for row, _ in keyword_index.search(query, fetch_k)]
+        fused = reciprocal_rank_fusion([vector_rows, keyword_rows])
+
+    candidates = [
+        (vectorstore.docstore.search(vectorstore.index_to_docstore_id[row]), score)
+        for row, score in fused
+    ]
+    if keyword_index is not None and reranker == "lexical":
+        candidates = rerank_lexical(query, candidates, keyword_index)
+    return [document for document, _ in candidates[:k]]
+
+
+class HybridRetriever(BaseRetriever):
+    """LangChain retriever running hybrid_search over a FAISS index and its keyword index"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: FAISS
+    keyword_index: Optional[KeywordIndex] = None
+    k: int = RETRIEVAL_K
+    fetch_k: int = RETRIEVAL_FETCH_K
+    reranker: str = RETRIEVAL_RERANKER
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return hybrid_search(self.vectorstore, self.keyword_index, query, self.k, self.fetch_k, self.reranker)
+
+
+def create_retriever(vectorstore: FAISS, keyword_index: Optional[KeywordIndex] = None, k: int = RETRIEVAL_K) -> HybridRetriever:
+    """Retriever for a vectorstore, using keyword search too unless RETRIEVAL_MODE is "vector" """
+    if RETRIEVAL_MODE == "vector":
+        keyword_index = None
+    return HybridRetriever(vectorstore=vectorstore, keyword_index=keyword_index, k=k)
@@ -0,0 +1,48 @@
+"""
+Local embedding model that needs no network access.
+
+HashingEmbeddings maps word unigrams and bigrams into a fixed number of dimensions
+with a stable hash (the "hashing trick") and L2-normalizes the result. Quality is far
+below a trained model, but it is deterministic, fast on CPU and good enough for
+offline benchmarks and development without API keys.
+"""
+import re
+import hashlib
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature hashing embeddings over word unigrams and bigrams"""
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    @property
+    def model_name(self) -> str:
+        return f"hashing-{self.dimensions}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            # The lowest bit picks the sign so colliding features tend to cancel out
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dimensions] += sign
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
@@ -0,0 +1,106 @@
+"""
+PDF text extraction over page ranges, optionally spread across CPU cores.
+
+The page range is cut into blocks of PDF_PAGE_RANGE_SIZE pages. Each block is read
+with its own PdfReader, either in-process or in a worker process, and the blocks are
+merged back in page order. Callers running next to the event loop, such as
+background ingestion, pass isolated=True: pypdf then always runs in worker
+processes, even with a single worker, instead of holding the API process's GIL. A fresh reader per block also keeps memory flat, since
+pypdf caches every object it parses.
+
+This module only depends on pypdf so worker processes start quickly.
+"""
+import os
+import gc
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+from pypdf import PdfReader
+
+PDF_PAGE_RANGE_SIZE = int(os.getenv("PDF_PAGE_RANGE_SIZE", 128))
+# Worker processes used for extraction, 1 extracts in-process unless the caller asks for isolation
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", 1))
+# Smaller documents are not worth the inter-process overhead
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 200))
+
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def read_page_info(file_path: str) -> Tuple[int, List[str]]:
+    """Return the page count and page labels of a PDF"""
+    with open(file_path, "rb") as f:
+        reader = PdfReader(f)
+        # Computing a single label walks the whole label tree, so build them all once
+        return len(reader.pages), reader.page_labels
+
+
+def extract_page_texts(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) with a dedicated reader"""
+    with open(file_path, "rb") as f:
+        reader = PdfReader(f)
+        texts = [reader.pages[page_number].extract_text() for page_number in range(start, stop)]
+    # The reader holds reference cycles, free it before the next block is read
+    del reader
+    gc.collect()
+    return texts
+
+
+def iter_page_texts(file_path: str,
+                    total_pages: int,
+                    workers: int = PDF_EXTRACTION_WORKERS,
+                    range_size: int = PDF_PAGE_RANGE_SIZE,
+                    isolated: bool = False) -> Iterator[str]:
+    """
+    Yield the text of every page in order, extracting blocks on `workers` processes.
+    With isolated, extraction never runs in the calling process.
+    """
+    ranges = [(start, min(start + range_size, total_pages)) for start in range(0, total_pages, range_size)]
+
+    parallel = workers > 1 and total_pages >= PDF_PARALLEL_MIN_PAGES
+    if not parallel and not isolated:
+        for start, stop in ranges:
+            yield from extract_page_texts(file_path, start, stop)
+        return
+
+    workers = max(workers, 1)
+    pool = get_pool(workers)
+    # Keep a bounded window of blocks in flight so finished text does not pile up in memory
+    pending = deque()
+    remaining = iter(ranges)
+    try:
+        for start, stop in remaining:
+            pending.append(pool.submit(extract_page_texts, file_path, start, stop))
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            texts = pending.popleft().result()
+            next_range = next(remaining, None)
+            if next_range:
+                pending.append(pool.submit(extract_page_texts, file_path, *next_range))
+            yield from texts
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """Shared process pool for a given number of workers, created on first use"""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # spawn avoids forking a process that is already running threads
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pools[workers] = pool
+        return pool
+
+
+def shutdown_pools():
+    """Stop all extraction worker processes"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(cancel_futures=True)
+        _pools.clear()
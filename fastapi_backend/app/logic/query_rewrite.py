@@ -0,0 +1,184 @@
+"""
+Query rewrite stage of the chat-with-PDF chain.
+
+A follow-up question such as "and what about the second one?" needs the
+conversation to be turned into a standalone search query before retrieval, which
+costs a full LLM round-trip. QueryRewriter only pays for it when it is needed:
+
+- with fewer than QUERY_REWRITE_MIN_HISTORY_MESSAGES messages of history, or when
+  the question looks self-contained (long enough and without references to earlier
+  turns), the question is used as the search query directly;
+- rewrites are cached per (model, history hash, question), so retried or repeated
+  questions don't call the LLM again;
+- with QUERY_REWRITE_SPECULATIVE, retrieval for the raw question runs while the
+  rewrite is generated. Its results are used if the rewrite comes back unchanged,
+  fails or takes longer than QUERY_REWRITE_TIMEOUT_SECONDS.
+
+Durations of the rewrite and retrieval stages are recorded as metrics spans.
+"""
+import os
+import re
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable, RunnableLambda
+from app.services.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# "auto" rewrites only follow-up questions, "always" every question with history, "never" none
+QUERY_REWRITE_MODE = os.getenv("QUERY_REWRITE_MODE", "auto")
+QUERY_REWRITE_MIN_HISTORY_MESSAGES = int(os.getenv("QUERY_REWRITE_MIN_HISTORY_MESSAGES", 2))
+# Questions with fewer words are treated as follow-ups ("why?", "and the second one?")
+QUERY_REWRITE_MIN_QUESTION_WORDS = int(os.getenv("QUERY_REWRITE_MIN_QUESTION_WORDS", 5))
+QUERY_REWRITE_CACHE_SIZE = int(os.getenv("QUERY_REWRITE_CACHE_SIZE", 1000))
+QUERY_REWRITE_SPECULATIVE = os.getenv("QUERY_REWRITE_SPECULATIVE", "false").lower() == "true"
+# Give up on a rewrite after this long and search for the raw question (0 waits indefinitely)
+QUERY_REWRITE_TIMEOUT_SECONDS = float(os.getenv("QUERY_REWRITE_TIMEOUT_SECONDS", 0))
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+# Words that point back at earlier turns of the conversation
+REFERENCE_WORDS = {
+    "it", "its", "it's", "this", "that", "these", "those", "they", "them", "their", "he", "she",
+    "him", "her", "his", "one", "ones", "above", "previous", "earlier", "same", "former", "latter",
+    "else", "more", "again", "also", "another", "other"
+}
+
+
+def history_hash(chat_history: List[Any]) -> str:
+    """Hash of the messages (type and content) of a LangChain chat history"""
+    digest = hashlib.sha256()
+    for message in chat_history:
+        for part in (message.type, str(message.content)):
+            encoded = part.encode("utf-8")
+            digest.update(len(encoded).to_bytes(8, "little"))
+            digest.update(encoded)
+    return digest.hexdigest()
+
+
+class QueryRewriter:
+    """Decides when a question needs rewriting and caches the rewrites"""
+
+    def __init__(self,
+                 mode: str = QUERY_REWRITE_MODE,
+                 min_history_messages: int = QUERY_REWRITE_MIN_HISTORY_MESSAGES,
+                 cache_size: int = QUERY_REWRITE_CACHE_SIZE,
+                 speculative: bool = QUERY_REWRITE_SPECULATIVE,
+                 timeout: float = QUERY_REWRITE_TIMEOUT_SECONDS):
+        self.mode = mode
+        self.min_history_messages = min_history_messages
+        self.cache_size = cache_size
+        self.speculative = speculative
+        self.timeout = timeout
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rewrites = 0
+        self.bypassed = 0
+        self.cache_hits = 0
+        self.speculative_hits = 0
+        self.fallbacks = 0
+
+    def needs_rewrite(self, question: str, chat_history: List[Any]) -> bool:
+        """Whether the question depends on the conversation and has to be rewritten"""
+        if self.mode == "never" or len(chat_history) < self.min_history_messages:
+            return False
+        if self.mode == "always":
+            return True
+        words = WORD_PATTERN.findall(question.lower())
+        return len(words) < QUERY_REWRITE_MIN_QUESTION_WORDS or any(word in REFERENCE_WORDS for word in words)
+
+    def as_retriever(self, llm, prompt, retriever: Optional[BaseRetriever] = None) -> Runnable:
+        """
+        Drop-in replacement for create_history_aware_retriever: takes the chain input
+        ({"input", "chat_history"}) and returns the retrieved documents. Without a
+        retriever, the one in the input's "retriever" key is searched.
+        It is async only, like the gateway-backed chat model it calls: a synchronous
+        invoke raises instead of counting every rewrite as a fallback.
+        """
+        rewrite_chain = prompt | llm | StrOutputParser()
+        model = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+
+        async def aretrieve(inputs: Dict[str, Any]) -> List[Document]:
+            return await self.aretrieve(inputs, rewrite_chain, retriever or inputs["retriever"], model)
+
+        return RunnableLambda(aretrieve, name="chat_retriever_chain")
+
+    async def aretrieve(self, inputs: Dict[str, Any], rewrite_chain: Runnable, retriever: BaseRetriever, model: str) -> List[Document]:
+        question, chat_history = inputs["input"], inputs.get("chat_history") or []
+        if not self.needs_rewrite(question, chat_history):
+            self.bypassed += 1
+            return await self._aretrieve(retriever, question)
+
+        key = self._cache_key(model, question, chat_history)
+        query = self._cache_get(key)
+        if query is not None:
+            return await self._aretrieve(retriever, query)
+
+        speculative = asyncio.create_task(self._aretrieve(retriever, question)) if self.speculative else None
+        try:
+            query = await self._arewrite(inputs, rewrite_chain)
+            if query is None:
+                self.fallbacks += 1
+                return await (speculative or self._aretrieve(retriever, question))
+            self._cache_put(key, query)
+            if speculative and query.lower() == question.strip().lower():
+                self.speculative_hits += 1
+                return await speculative
+            return await self._aretrieve(retriever, query)
+        finally:
+            if speculative and not speculative.done():
+                speculative.cancel()
+
+    async def _arewrite(self, inputs: Dict[str, Any], rewrite_chain: Runnable) -> Optional[str]:
+        """The rewritten query, or None if the rewrite failed or timed out"""
+        try:
+            with span("query_rewrite"):
+                query = await asyncio.wait_for(rewrite_chain.ainvoke(inputs), self.timeout or None)
+            return query.strip() or inputs["input"]
+        except asyncio.TimeoutError:
+            logger.warning(f"Query rewrite took longer than {self.timeout}s, searching for the question as asked")
+        except Exception:
+            logger.warning("Query rewrite failed, searching for the question as asked", exc_info=True)
+        return None
+
+    async def _aretrieve(self, retriever: BaseRetriever, query: str) -> List[Document]:
+        with span("retrieval"):
+            return await retriever.ainvoke(query)
+
+    def _cache_key(self, model: str, question: str, chat_history: List[Any]) -> str:
+        return f"{model}:{history_hash(chat_history)}:{question.strip()}"
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            query = self._cache.get(key)
+            if query is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+            return query
+
+    def _cache_put(self, key: str, query: str):
+        with self._lock:
+            self.rewrites += 1
+            self._cache[key] = query
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "rewrites": self.rewrites,
+            "bypassed": self.bypassed,
+            "cache_hits": self.cache_hits,
+            "speculative_hits": self.speculative_hits,
+            "fallbacks": self.fallbacks,
+            "cached_rewrites": len(self._cache)
+        }
+
+# Initialize global query rewriter
+query_rewriter = QueryRewriter()
@@ -0,0 +1,125 @@
+"""
+Retrieval of URL content for the chat-with-URL feature.
+
+The page (and, if requested, its subpages) is crawled, split into chunks with
+DocumentLoader and embedded into a vector index, and only the URL_CONTEXT_CHUNKS
+chunks most relevant to the question are put into the prompt.
+
+Indexes are saved in the shared index store under a key built from the crawled URLs
+and a hash of their content, so follow-up questions, in the same or any other
+conversation, reuse the index instead of embedding the site again. Within
+URL_CONTENT_TTL_SECONDS of a crawl the site is not fetched again at all; after that
+it is re-crawled (mostly 304s thanks to the HTTP cache) and the index is only
+rebuilt if the content changed.
+"""
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from app.logic.document_loaders import DocumentLoader
+from app.logic.conversation_retrieval import create_db, EMBEDDING_MODEL
+from app.logic.web_crawler import web_crawler
+from app.services.index_store import index_store
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+URL_CHUNK_SIZE = int(os.getenv("URL_CHUNK_SIZE", 1000))
+URL_CHUNK_OVERLAP = int(os.getenv("URL_CHUNK_OVERLAP", 100))
+# Chunks of page content sent to the model with each question
+URL_CONTEXT_CHUNKS = int(os.getenv("URL_CONTEXT_CHUNKS", 6))
+# A crawled site is considered fresh for this long and not fetched again
+URL_CONTENT_TTL_SECONDS = float(os.getenv("URL_CONTENT_TTL_SECONDS", 300))
+URL_RECENT_CRAWLS = 10000
+
+url_loader = DocumentLoader(chunk_size=URL_CHUNK_SIZE, chunk_overlap=URL_CHUNK_OVERLAP)
+
+
+def url_index_key(pages: List[Document]) -> str:
+    """Index store key for crawled pages: their URLs and text plus everything that shapes the index"""
+    digest = hashlib.sha256(f"url:{EMBEDDING_MODEL}:{URL_CHUNK_SIZE}:{URL_CHUNK_OVERLAP}".encode())
+    for page in pages:
+        for part in (page.metadata.get("source", ""), page.page_content):
+            encoded = part.encode("utf-8")
+            # Length prefixes keep ("ab", "c") and ("a", "bc") apart
+            digest.update(len(encoded).to_bytes(8, "little"))
+            digest.update(encoded)
+    return digest.hexdigest()
+
+
+def build_index(pages: List[Document]) -> Tuple[FAISS, int]:
+    """Split crawled pages into chunks and embed them, returning the index and its chunk count"""
+    chunks = url_loader.split_documents(pages)
+    return create_db(chunks), len(chunks)
+
+
+def format_context(chunks: List[Document]) -> str:
+    """Join chunks into prompt text, each labelled with the page it came from"""
+    return "\n\n".join(f"[{chunk.metadata.get('source')}]\n{chunk.page_content}" for chunk in chunks)
+
+
+class UrlRetriever:
+    """Builds, caches and queries the vector indexes of crawled sites"""
+
+    def __init__(self, k: int = URL_CONTEXT_CHUNKS, ttl_seconds: float = URL_CONTENT_TTL_SECONDS):
+        self.k = k
+        self.ttl_seconds = ttl_seconds
+        # (url, crawl_subpages) -> (crawl time, index key)
+        self._recent: "OrderedDict[Tuple[str, bool], Tuple[float, str]]" = OrderedDict()
+        # Concurrent questions about the same site share one crawl and index build
+        self._single_flight = SingleFlight()
+        self.crawls = 0
+        self.indexes_built = 0
+
+    async def retrieve(self, url: str, query: str, crawl_subpages: bool = False) -> str:
+        """Return the parts of the URL's content relevant to the query"""
+        vectorstore = await self._single_flight.do(
+            f"{crawl_subpages}:{url}", lambda: self.get_index(url, crawl_subpages)
+        )
+        if vectorstore is None:
+            return ""
+        chunks = await asyncio.to_thread(vectorstore.similarity_search, query, k=self.k)
+        return format_context(chunks)
+
+    async def get_index(self, url: str, crawl_subpages: bool = False) -> Optional[FAISS]:
+        """Get the index of a site, crawling and embedding it only when needed"""
+        crawl_key = (url, crawl_subpages)
+        recent = self._recent.get(crawl_key)
+        if recent and time.monotonic() - recent[0] < self.ttl_seconds:
+            vectorstore = await asyncio.to_thread(index_store.load, recent[1])
+            if vectorstore is not None:
+                return vectorstore
+
+        self.crawls += 1
+        pages = [page for page in await web_crawler.crawl(url, crawl_subpages) if page.page_content]
+        if not pages:
+            return None
+
+        key = url_index_key(pages)
+        self._remember(crawl_key, key)
+        vectorstore = await asyncio.to_thread(index_store.load, key)
+        if vectorstore is not None:
+            logger.info(f"Content of {url} is unchanged, reusing index {key}")
+            return vectorstore
+
+        # Splitting is CPU-bound and embedding may call a remote provider, both block,
+        # so run them together on a worker thread
+        vectorstore, chunk_count = await asyncio.to_thread(build_index, pages)
+        await asyncio.to_thread(index_store.save, key, vectorstore)
+        self.indexes_built += 1
+        logger.info(f"Indexed {chunk_count} chunks from {len(pages)} pages of {url}")
+        return vectorstore
+
+    def _remember(self, crawl_key: Tuple[str, bool], index_key: str):
+        self._recent[crawl_key] = (time.monotonic(), index_key)
+        self._recent.move_to_end(crawl_key)
+        if len(self._recent) > URL_RECENT_CRAWLS:
+            self._recent.popitem(last=False)
+
+# Initialize global URL retriever
+url_retriever = UrlRetriever()
@@ -0,0 +1,303 @@
+"""
+Asynchronous web crawler for URL analysis.
+
+Pages are fetched with one pooled httpx client. Responses carrying an ETag or
+Last-Modified header are kept in an on-disk cache and revalidated with conditional
+requests, so a page that has not changed costs a 304 instead of a full download.
+With crawl_subpages, links on the same origin are followed breadth first, bounded by
+depth, page count and the number of concurrent requests.
+
+The URLs come from users, so every request (each redirect hop included, redirects are
+followed one at a time) first resolves its host and refuses loopback, private,
+link-local and reserved addresses. CRAWL_ALLOW_PRIVATE_HOSTS lifts that for
+development and the benchmarks, which crawl a site on localhost.
+"""
+import os
+import json
+import asyncio
+import hashlib
+import socket
+import logging
+import tempfile
+import ipaddress
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urldefrag, urlsplit
+import httpx
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", 2))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", 20))
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 5))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", 15))
+CRAWL_MAX_PAGE_BYTES = int(os.getenv("CRAWL_MAX_PAGE_BYTES", 5 * 1024 * 1024))
+CRAWL_CACHE_DIR = os.getenv("CRAWL_CACHE_DIR", "cache/http")
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "ai-assistant-crawler/1.0")
+CRAWL_MAX_REDIRECTS = int(os.getenv("CRAWL_MAX_REDIRECTS", 5))
+CRAWL_ALLOW_PRIVATE_HOSTS = os.getenv("CRAWL_ALLOW_PRIVATE_HOSTS", "false").lower() == "true"
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+# Links to these are never HTML, skip them without a request
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico", ".css", ".js",
+    ".zip", ".gz", ".tar", ".mp3", ".mp4", ".avi", ".mov", ".woff", ".woff2", ".ttf"
+)
+
+
+class CrawlError(Exception):
+    """Raised when the requested URL itself cannot be fetched"""
+
+
+class BlockedURLError(CrawlError):
+    """Raised for URLs that are not http(s) or whose host resolves to a non-public address"""
+
+
+def is_public_address(address: str) -> bool:
+    """Whether an IP address is globally routable (IPv4-mapped IPv6 addresses are checked as IPv4)"""
+    ip = ipaddress.ip_address(address)
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return not (ip.is_loopback or ip.is_private or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified or not ip.is_global)
+
+
+class HTTPCache:
+    """On-disk cache of response bodies and their validators, keyed by URL"""
+
+    def __init__(self, directory: str = CRAWL_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, url: str) -> Optional[Tuple[Dict[str, str], bytes]]:
+        """Return (metadata, body) for a cached URL"""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, meta: Dict[str, str], body: bytes):
+        meta_path, body_path = self._paths(url)
+        # Body first, so metadata never points at a body that is not there yet
+        for path, data in ((body_path, body), (meta_path, json.dumps(meta).encode("utf-8"))):
+            # A unique temporary file per write, so concurrent writers of one URL never share it
+            with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as f:
+                f.write(data)
+            try:
+                os.replace(f.name, path)
+            except OSError:
+                os.unlink(f.name)
+                raise
+
+    def _paths(self, url: str) -> Tuple[str, str]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json"), os.path.join(self.directory, f"{key}.body")
+
+
+class WebCrawler:
+    """Fetches a page and, optionally, its same-origin subpages as documents"""
+
+    def __init__(self,
+                 cache: Optional[HTTPCache] = None,
+                 concurrency: int = CRAWL_CONCURRENCY,
+                 timeout: float = CRAWL_TIMEOUT,
+                 max_page_bytes: int = CRAWL_MAX_PAGE_BYTES,
+                 max_redirects: int = CRAWL_MAX_REDIRECTS,
+                 allow_private_hosts: bool = CRAWL_ALLOW_PRIVATE_HOSTS):
+        self.cache = cache or HTTPCache()
+        self.max_page_bytes = max_page_bytes
+        self.max_redirects = max_redirects
+        self.allow_private_hosts = allow_private_hosts
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # Redirects are followed by _send, which checks the host of every hop
+        self.client = httpx.AsyncClient(
+            follow_redirects=False,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency),
+            headers={"User-Agent": CRAWL_USER_AGENT}
+        )
+        self.requests = 0
+        self.not_modified = 0
+
+    async def crawl(self,
+                    url: str,
+                    crawl_subpages: bool = False,
+                    max_depth: int = CRAWL_MAX_DEPTH,
+                    max_pages: int = CRAWL_MAX_PAGES) -> List[Document]:
+        """
+        Return one document per fetched page, in breadth-first order. Without
+        crawl_subpages only `url` itself is fetched. Raises CrawlError if `url` fails
+        (BlockedURLError if its host is not a public address).
+        """
+        max_depth = max_depth if crawl_subpages else 0
+        url = urldefrag(url)[0]
+        seen = {url}
+        frontier = [url]
+        origin = None
+        documents = []
+
+        for depth in range(max_depth + 1):
+            frontier = frontier[:max_pages - len(documents)]
+            if not frontier:
+                break
+            pages = await asyncio.gather(*(self._fetch_page(page_url, depth) for page_url in frontier))
+
+            next_frontier = []
+            for page_url, page in zip(frontier, pages):
+                if page is None:
+                    if depth == 0:
+                        raise CrawlError(f"Could not fetch {page_url}")
+                    continue
+                document, links = page
+                documents.append(document)
+                seen.add(document.metadata["source"])
+                if origin is None:
+                    # Use the origin after redirects, e.g. http -> https
+                    origin = self._origin(document.metadata["source"])
+                for link in links:
+                    if link not in seen and self._origin(link) == origin:
+                        seen.add(link)
+                        next_frontier.append(link)
+            frontier = next_frontier
+
+        logger.info(f"Crawled {len(documents)} pages from {url}")
+        return documents
+
+    async def fetch(self, url: str) -> Optional[Tuple[str, str, bytes]]:
+        """
+        Fetch a URL, revalidating a cached copy if there is one.
+        Returns (final URL, content type, body), or None for non-HTML or failed responses.
+        """
+        cached = await asyncio.to_thread(self.cache.get, url)
+        headers = {}
+        if cached:
+            meta = cached[0]
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        async with self.semaphore:
+            self.requests += 1
+            response = await self._send(url, headers)
+            try:
+                if response.status_code == 304 and cached:
+                    self.not_modified += 1
+                    meta, body = cached
+                    return meta["url"], meta["content_type"], body
+                if response.status_code != 200:
+                    logger.warning(f"Fetching {url} returned HTTP {response.status_code}")
+                    return None
+
+                content_type = response.headers.get("content-type", "")
+                if content_type.split(";")[0].strip().lower() not in HTML_CONTENT_TYPES:
+                    return None
+
+                body = bytearray()
+                truncated = False
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) > self.max_page_bytes:
+                        logger.warning(f"{url} is larger than {self.max_page_bytes} bytes, truncating")
+                        del body[self.max_page_bytes:]
+                        truncated = True
+                        break
+                final_url = str(response.url)
+                etag = response.headers.get("etag")
+                last_modified = response.headers.get("last-modified")
+            finally:
+                await response.aclose()
+
+        body = bytes(body)
+        # A truncated body is not what the validators describe; caching it would let every
+        # later 304 serve the cut-off page
+        if (etag or last_modified) and not truncated:
+            meta = {"url": final_url, "content_type": content_type, "etag": etag, "last_modified": last_modified}
+            await asyncio.to_thread(self.cache.put, url, meta, body)
+        return final_url, content_type, body
+
+    async def _send(self, url: str, headers: Dict[str, str]) -> httpx.Response:
+        """Send a streamed GET, following redirects one hop at a time after checking each hop's host"""
+        for _ in range(self.max_redirects + 1):
+            await self._check_url(url)
+            response = await self.client.send(self.client.build_request("GET", url, headers=headers), stream=True)
+            if not response.has_redirect_location:
+                return response
+            await response.aclose()
+            url = urldefrag(urljoin(str(response.url), response.headers["location"]))[0]
+        raise httpx.TooManyRedirects(f"More than {self.max_redirects} redirects", request=response.request)
+
+    async def _check_url(self, url: str):
+        """Raise BlockedURLError unless the URL is http(s) and its host resolves to public addresses only"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise BlockedURLError(f"{url} is not an http(s) URL")
+        if self.allow_private_hosts:
+            return
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        try:
+            addresses = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise CrawlError(f"Could not resolve {parts.hostname}: {e}") from e
+        for *_, sockaddr in addresses:
+            if not is_public_address(sockaddr[0]):
+                raise BlockedURLError(f"{parts.hostname} resolves to {sockaddr[0]}, which is not a public address")
+
+    async def aclose(self):
+        """Close the pooled HTTP connections"""
+        await self.client.aclose()
+
+    async def _fetch_page(self, url: str, depth: int) -> Optional[Tuple[Document, List[str]]]:
+        try:
+            fetched = await self.fetch(url)
+        except BlockedURLError as e:
+            # Refuse the requested URL with its reason rather than a generic fetch failure
+            if depth == 0:
+                raise
+            logger.warning(f"Not fetching {url}: {e}")
+            return None
+        except (httpx.HTTPError, CrawlError) as e:
+            logger.warning(f"Fetching {url} failed: {e}")
+            return None
+        if fetched is None:
+            return None
+
+        final_url, content_type, body = fetched
+        # Parsing is CPU bound, keep it off the event loop
+        title, text, links = await asyncio.to_thread(self._parse, body, content_type, final_url)
+        document = Document(page_content=text, metadata={"source": final_url, "title": title, "depth": depth})
+        return document, links
+
+    @staticmethod
+    def _parse(body: bytes, content_type: str, base_url: str) -> Tuple[str, str, List[str]]:
+        """Extract the title, visible text and links of an HTML page"""
+        encoding = None
+        if "charset=" in content_type:
+            encoding = content_type.split("charset=")[-1].split(";")[0].strip()
+        soup = BeautifulSoup(body, "html.parser", from_encoding=encoding)
+
+        links = []
+        for anchor in soup.find_all("a", href=True):
+            link = urldefrag(urljoin(base_url, anchor["href"]))[0]
+            if link.startswith(("http://", "https://")) and not urlsplit(link).path.lower().endswith(SKIPPED_EXTENSIONS):
+                links.append(link)
+
+        title = soup.title.get_text(strip=True) if soup.title else ""
+        for element in soup(["script", "style", "noscript", "svg", "template"]):
+            element.decompose()
+        lines = (line.strip() for line in soup.get_text("\n").splitlines())
+        text = "\n".join(line for line in lines if line)
+        return title, text, links
+
+    @staticmethod
+    def _origin(url: str) -> Tuple[str, str]:
+        parts = urlsplit(url)
+        return parts.scheme, parts.netloc.lower()
+
+# Initialize global web crawler
+web_crawler = WebCrawler()
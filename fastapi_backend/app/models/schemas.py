@@ -9,6 +9,7 @@ class ChatRequest(BaseModel):
     conversation_id: Optional[str] = None
     model: Optional[str] = "gpt-4o"
     file_id: Optional[str] = None
+    stream: Optional[bool] = False  # Stream tokens back as Server-Sent Events
 
 class ChatResponse(BaseModel):
     id: str
@@ -26,6 +27,25 @@ class FileUploadResponse(BaseModel):
     file_id: str
     conversation_id: str
     message: str
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+
+# PDF ingestion job status
+class IngestionJobStatus(BaseModel):
+    job_id: str
+    file_id: str
+    conversation_id: str
+    status: str = "queued"  # queued, loading, embedding, ready or failed (loading and embedding overlap)
+    pages_loaded: int = 0
+    total_pages: Optional[int] = None
+    chunks: int = 0
+    chunks_embedded: int = 0
+    embedding_cache_hits: int = 0
+    embedding_cache_misses: int = 0
+    error: Optional[str] = None
+    index_key: Optional[str] = None
+    created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
+    finished_at: Optional[str] = None
 
 class FileMetadata(BaseModel):
     filename: str
@@ -33,6 +53,7 @@ class FileMetadata(BaseModel):
     uploaded_at: str
     size: int
     content_type: str
+    sha256: Optional[str] = None
 
 # URL Chat models
 class ChatURLRequest(ChatRequest):
@@ -57,4 +78,23 @@ class Conversation(BaseModel):
     messages: List[Message]
     created_at: str
     updated_at: str
-    model: Optional[str] = "gpt-4o"
\ No newline at end of file
+    model: Optional[str] = "gpt-4o"
+
+# LLM gateway models
+class TokenUsage(BaseModel):
+    prompt: int = 0
+    completion: int = 0
+    total: int = 0
+
+class LLMRequest(BaseModel):
+    model: str
+    messages: List[Dict[str, str]]  # role ("system", "user" or "assistant") and content
+    temperature: float = 0.7
+    max_tokens: int = 1000
+    operation: str = "chat"  # chat, analyze_document, analyze_url or decode_error
+
+class LLMResponse(BaseModel):
+    content: str
+    model: str
+    tokens_used: Optional[TokenUsage] = None
+    error: Optional[str] = None
@@ -0,0 +1,228 @@
+"""
+Admission control for the expensive API endpoints.
+
+Every request to an admitted endpoint passes two checks before its handler runs:
+
+- the client's token bucket: ADMISSION_CLIENT_REQUESTS_PER_SECOND with bursts of
+  ADMISSION_CLIENT_BURST, overridden per client key in ADMISSION_CLIENT_RATES.
+  A client over its rate gets 429 right away.
+- a slot among ADMISSION_MAX_CONCURRENCY requests in flight. Without a free slot the
+  request waits in a bounded priority queue, interactive chats ahead of uploads.
+  If ADMISSION_MAX_QUEUE requests are already waiting, or no slot frees up within
+  ADMISSION_QUEUE_TIMEOUT_SECONDS, the answer is 503.
+
+Both rejections carry a Retry-After estimate. Turning excess load away early keeps
+the latency of admitted requests stable and the providers below their own rate
+limits, instead of every request slowing down until all of them time out or get
+a 429 from the provider.
+
+Queue waits are recorded in stage_timings as "admission.<lane>.wait".
+"""
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from .rate_limit import TokenBucket
+from .metrics import metrics, record_stage
+from .stage_timings import stage_timings
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 64))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 256))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 10))
+# Requests per second and burst per client key (0 disables the per-client limit)
+ADMISSION_CLIENT_REQUESTS_PER_SECOND = float(os.getenv("ADMISSION_CLIENT_REQUESTS_PER_SECOND", 5))
+ADMISSION_CLIENT_BURST = int(os.getenv("ADMISSION_CLIENT_BURST", 20))
+# Comma separated client=requests_per_second pairs, e.g. "partner-key=50,trial-key=1"
+ADMISSION_CLIENT_RATES = os.getenv("ADMISSION_CLIENT_RATES", "")
+# Header identifying the client; requests without it are keyed by client address
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "X-API-Key")
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", 10000))
+
+# Lower numbers are admitted first when requests queue up
+LANE_PRIORITIES = {"interactive": 0, "upload": 1}
+
+
+def parse_rates(value: str) -> Dict[str, float]:
+    """Parse "client=rate,client=rate" into a dict"""
+    rates = {}
+    for pair in value.split(","):
+        if "=" in pair:
+            client, rate = pair.split("=", 1)
+            rates[client.strip()] = float(rate)
+    return rates
+
+
+class AdmissionRejected(Exception):
+    """A request was turned away; answer with status_code and a Retry-After header"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class ClientRateLimiter:
+    """Token bucket per client key, keeping the most recently seen max_clients"""
+
+    def __init__(self,
+                 rate: float = ADMISSION_CLIENT_REQUESTS_PER_SECOND,
+                 burst: int = ADMISSION_CLIENT_BURST,
+                 overrides: Optional[Dict[str, float]] = None,
+                 max_clients: int = ADMISSION_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = parse_rates(ADMISSION_CLIENT_RATES) if overrides is None else overrides
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client: str) -> float:
+        """Take a token from the client's bucket; 0 if allowed, else the seconds until it would be"""
+        rate = self.overrides.get(client, self.rate)
+        if rate <= 0:
+            return 0.0
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(rate, max(self.burst, math.ceil(rate)))
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+        return bucket.try_acquire()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AdmissionQueue:
+    """
+    At most max_concurrency holders at a time; others wait in priority then arrival
+    order, at most max_queue of them and for at most timeout seconds
+    """
+
+    def __init__(self,
+                 max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+                 max_queue: int = ADMISSION_MAX_QUEUE,
+                 timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self.service_time = 1.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    def retry_after(self) -> float:
+        """Rough time until a request sent now would get a slot"""
+        return (self.queued + 1) * self.service_time / self.max_concurrency
+
+    async def acquire(self, priority: int = 0):
+        """Wait for a slot; raises AdmissionRejected if the queue is full or the wait times out"""
+        if self.in_flight < self.max_concurrency and not self.queued:
+            self.in_flight += 1
+            return
+        if self.queued >= self.max_queue:
+            raise AdmissionRejected(503, "Server is busy, try again later", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await asyncio.wait_for(future, self.timeout or None)
+        except asyncio.TimeoutError:
+            raise AdmissionRejected(503, "Server is busy, timed out waiting in the queue", self.retry_after())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the request went away
+                self.release()
+            raise
+        finally:
+            if future.cancelled():
+                # Left the queue without a slot; release() skips cancelled entries
+                self.queued -= 1
+
+    def release(self, held_seconds: Optional[float] = None):
+        """Give the slot to the next waiter, or free it"""
+        if held_seconds is not None:
+            self.service_time = 0.9 * self.service_time + 0.1 * held_seconds
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.cancelled():
+                self.queued -= 1
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+class AdmissionController:
+    """Applies the per-client rate limit and the admission queue to requests of each lane"""
+
+    def __init__(self,
+                 limiter: Optional[ClientRateLimiter] = None,
+                 queue: Optional[AdmissionQueue] = None,
+                 enabled: bool = ADMISSION_ENABLED):
+        self.limiter = limiter or ClientRateLimiter()
+        self.queue = queue or AdmissionQueue()
+        self.enabled = enabled
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, lane: str, name: str):
+        counters = self.counters.setdefault(lane, {"admitted": 0, "rate_limited": 0, "rejected": 0})
+        counters[name] += 1
+
+    @asynccontextmanager
+    async def admit(self, client: str, lane: str) -> AsyncIterator[None]:
+        """Hold an admission slot for the body of the with block; raises AdmissionRejected"""
+        retry_after = self.limiter.check(client)
+        if retry_after:
+            self._count(lane, "rate_limited")
+            raise AdmissionRejected(429, "Rate limit exceeded", retry_after)
+
+        start = time.perf_counter()
+        try:
+            await self.queue.acquire(LANE_PRIORITIES.get(lane, 0))
+        except AdmissionRejected:
+            self._count(lane, "rejected")
+            raise
+        admitted = time.perf_counter()
+        record_stage(f"admission.{lane}.wait", admitted - start)
+        self._count(lane, "admitted")
+        try:
+            yield
+        finally:
+            self.queue.release(time.perf_counter() - admitted)
+
+    def stats(self) -> Dict:
+        waits = {stage: summary for stage, summary in stage_timings.summary().items() if stage.startswith("admission.")}
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.queue.in_flight,
+            "queued": self.queue.queued,
+            "max_queued": self.queue.max_queued,
+            "max_concurrency": self.queue.max_concurrency,
+            "max_queue": self.queue.max_queue,
+            "service_time_ms": round(self.queue.service_time * 1000, 2),
+            "clients": len(self.limiter),
+            "lanes": {lane: dict(counters) for lane, counters in self.counters.items()},
+            "queue_wait": waits
+        }
+
+# Initialize global admission controller
+admission_controller = AdmissionController()
+metrics.gauge("admission_in_flight", "Admitted requests in flight",
+              callback=lambda: {(): admission_controller.queue.in_flight})
+metrics.gauge("admission_queued", "Requests waiting for an admission slot",
+              callback=lambda: {(): admission_controller.queue.queued})
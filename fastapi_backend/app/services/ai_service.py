@@ -1,78 +1,139 @@
 """
-This file contains the main AI service router that delegates to specific model implementations.
-The actual AI functionality is implemented in the openai_service.py and anthropic_service.py modules.
+This file contains the main AI service used by the API routes.
+It builds the prompts for each feature and sends them through the LLM gateway
+(llm_gateway.py), which routes them to the provider adapters in llm_providers.py.
 """
-from typing import Optional, Dict, Any, List
-import os
-from .openai_service import openai_service
-from .anthropic_service import anthropic_service
-from .groq_service import groq_service
+from typing import Optional, Dict, Any, List, AsyncIterator
+from contextlib import aclosing
+from app.models.schemas import LLMRequest
+from .llm_gateway import LLMGateway, llm_gateway
+from app.logic.url_retrieval import url_retriever
+from app.logic.document_retrieval import document_retriever
+
+DOCUMENT_SYSTEM_PROMPT = "You are an AI assistant that analyzes documents. Answer based on the document content only."
+URL_SYSTEM_PROMPT = "You are an AI assistant that analyzes web content. Answer based on the website content provided."
+ERROR_SYSTEM_PROMPT = (
+    "You are an AI assistant that explains error messages in simple terms. "
+    "For each error, explain: 1) What it means, 2) Common causes, and 3) How to fix it."
+)
 
 class AIService:
-    """Service that routes AI requests to the appropriate implementation"""
-    
-    def __init__(self):
-        # Initialize properties and combine available models from OpenAI and Anthropic
-        self.openai_models = openai_service.available_models
-        self.anthropic_models = anthropic_service.available_models
+    """Service that builds the requests of each AI feature and sends them through the gateway"""
+
+    def __init__(self, gateway: LLMGateway = llm_gateway):
+        self.gateway = gateway
+        self.openai_models = gateway.models("openai")
+        self.anthropic_models = gateway.models("anthropic")
         self.available_models = self.openai_models + self.anthropic_models
-        self.groq_models = groq_service.available_models
+        self.groq_models = gateway.models("groq")
+
+    def _chat_request(self, message: str, conversation_history: Optional[List[Dict[str, str]]], model: str) -> LLMRequest:
+        """Conversation history plus the new message"""
+        messages = [{"role": msg["role"], "content": msg["content"]} for msg in conversation_history or []]
+        messages.append({"role": "user", "content": message})
+        return LLMRequest(model=model, messages=messages, temperature=0.7, operation="chat")
 
-    
-    def _get_service_for_model(self, model: str):
+    def _url_request(self, url: str, query: str, url_content: str, model: str) -> LLMRequest:
+        return LLMRequest(model=model, messages=[
+            {"role": "system", "content": URL_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Website content from {url}:\n\n{url_content}\n\nUser query: {query}"}
+        ], temperature=0.5, operation="analyze_url")
+
+    async def chat_completion(self,
+                             message: str,
+                             conversation_history: List[Dict[str, str]] = None,
+                             model: str = "gpt-4o") -> Dict[str, Any]:
         """
-        Returns the appropriate service for the specified model
+        Generate a chat completion with the given model
         """
-        if model in self.openai_models:
-            return openai_service
-        elif model in self.anthropic_models:
-            return anthropic_service
-        elif model in self.groq_models:
-            return groq_service
-        else:
-            # Default to OpenAI if model not recognized
-            return openai_service
-    
-    async def chat_completion(self, 
-                             message: str, 
-                             conversation_history: List[Dict[str, str]] = None, 
-                             model: str = "gpt-4o") -> Dict[str, Any]:
+        response = await self.gateway.complete(self._chat_request(message, conversation_history, model))
+        return response.model_dump(exclude_none=True)
+
+    async def stream_chat_completion(self,
+                                   message: str,
+                                   conversation_history: List[Dict[str, str]] = None,
+                                   model: str = "gpt-4o") -> AsyncIterator[str]:
         """
-        Route chat completion to the appropriate service based on the model
+        Stream a chat completion with the given model
         """
-        service = self._get_service_for_model(model)
-        return await service.chat_completion(message, conversation_history, model)
-    
-    async def analyze_document(self, 
-                              file_path: str, 
+        async with aclosing(self.gateway.stream(self._chat_request(message, conversation_history, model))) as tokens:
+            async for token in tokens:
+                yield token
+
+    async def analyze_document(self,
+                              file_path: str,
                               query: str,
                               model: str = "gpt-4o") -> Dict[str, Any]:
         """
-        Route document analysis to the appropriate service based on the model
+        Retrieve the parts of the document relevant to the query and have the
+        model answer the query from them
         """
-        service = self._get_service_for_model(model)
-        return await service.analyze_document(file_path, query, model)
-    
-    async def analyze_url(self, 
-                         url: str, 
+        try:
+            document_content = await document_retriever.retrieve(file_path, query)
+        except Exception as e:
+            return {"content": f"Error analyzing document: {str(e)}", "model": model, "error": str(e)}
+
+        response = await self.gateway.complete(LLMRequest(model=model, messages=[
+            {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Document content:\n\n{document_content}\n\nUser query: {query}"}
+        ], temperature=0.5, operation="analyze_document"))
+        return response.model_dump(exclude_none=True)
+
+    async def analyze_url(self,
+                         url: str,
                          query: str,
                          crawl_subpages: bool = False,
                          model: str = "gpt-4o") -> Dict[str, Any]:
         """
-        Route URL analysis to the appropriate service based on the model
+        Crawl the URL, retrieve the content relevant to the query and have the
+        model answer the query from it
         """
-        service = self._get_service_for_model(model)
-        return await service.analyze_url(url, query, crawl_subpages, model)
-    
-    async def decode_error(self, 
-                          error_message: str, 
+        try:
+            url_content = await url_retriever.retrieve(url, query, crawl_subpages)
+        except Exception as e:
+            return {"content": f"Error fetching URL: {str(e)}", "model": model, "error": str(e)}
+
+        response = await self.gateway.complete(self._url_request(url, query, url_content, model))
+        return response.model_dump(exclude_none=True)
+
+    async def stream_analyze_url(self,
+                               url: str,
+                               query: str,
+                               crawl_subpages: bool = False,
+                               model: str = "gpt-4o") -> AsyncIterator[str]:
+        """
+        Crawl the URL, retrieve the content relevant to the query and stream the
+        model's answer
+        """
+        try:
+            url_content = await url_retriever.retrieve(url, query, crawl_subpages)
+        except Exception as e:
+            yield f"Error fetching URL: {str(e)}"
+            return
+
+        async with aclosing(self.gateway.stream(self._url_request(url, query, url_content, model))) as tokens:
+            async for token in tokens:
+                yield token
+
+    async def decode_error(self,
+                          error_message: str,
                           language: Optional[str] = None,
                           model: str = "gpt-4o") -> Dict[str, Any]:
         """
-        Route error decoding to the appropriate service based on the model
+        Explain an error message with the given model
+        """
+        lang_context = f" in {language}" if language else ""
+        response = await self.gateway.complete(LLMRequest(model=model, messages=[
+            {"role": "system", "content": ERROR_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Explain this error message{lang_context}:\n\n{error_message}"}
+        ], temperature=0.3, operation="decode_error"))  # Lower temperature for more precise explanations
+        return response.model_dump(exclude_none=True)
+
+    async def aclose(self):
+        """
+        Close the pooled provider clients (called on application shutdown)
         """
-        service = self._get_service_for_model(model)
-        return await service.decode_error(error_message, language, model)
+        await self.gateway.aclose()
 
 # Initialize global AI service
-ai_service = AIService()
\ No newline at end of file
+ai_service = AIService()
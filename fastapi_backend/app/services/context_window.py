@@ -0,0 +1,205 @@
+"""
+Token-budgeted conversation context.
+
+Instead of sending a whole conversation on every turn, ContextWindowManager keeps the
+newest messages that fit the model's history budget. Token counts come from tiktoken
+and are cached per message, so each stored message is tokenized once. When
+CONTEXT_SUMMARY_ENABLED is set, the turns that no longer fit are folded into a rolling
+summary that is sent as a system message in their place.
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.models.schemas import Message
+from app.services.ai_service import ai_service
+
+logger = logging.getLogger(__name__)
+
+# History tokens sent per request, unless overridden per model by CONTEXT_TOKEN_BUDGETS
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+# Comma separated model=tokens pairs, e.g. "gpt-4o=8000,llama-3.1-8b-instant=2000"
+CONTEXT_TOKEN_BUDGETS = os.getenv("CONTEXT_TOKEN_BUDGETS", "")
+# Most recent messages read from the conversation store per request
+CONTEXT_MAX_HISTORY_MESSAGES = int(os.getenv("CONTEXT_MAX_HISTORY_MESSAGES", 100))
+CONTEXT_SUMMARY_ENABLED = os.getenv("CONTEXT_SUMMARY_ENABLED", "false").lower() == "true"
+CONTEXT_SUMMARY_MODEL = os.getenv("CONTEXT_SUMMARY_MODEL", "llama-3.1-8b-instant")
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", 300))
+# The summary is only rebuilt once this many messages have dropped out of the window
+CONTEXT_SUMMARY_MIN_MESSAGES = int(os.getenv("CONTEXT_SUMMARY_MIN_MESSAGES", 6))
+
+# Tokens each message adds on top of its content (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+TOKEN_COUNT_CACHE_SIZE = 100_000
+SUMMARY_CACHE_SIZE = 10_000
+
+SUMMARY_PROMPT = (
+    "Update the summary of an earlier part of a conversation. Keep facts, names, decisions and open "
+    "questions the assistant may need later. Answer with the summary only, in under {max_tokens} tokens.\n\n"
+    "Current summary:\n{summary}\n\nNew messages:\n{messages}"
+)
+
+
+def parse_budgets(value: str) -> Dict[str, int]:
+    """Parse "model=tokens,model=tokens" into a dict"""
+    budgets = {}
+    for pair in value.split(","):
+        if "=" in pair:
+            model, tokens = pair.split("=", 1)
+            budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+class TokenCounter:
+    """
+    Counts tokens with the tiktoken encoding of each model. Models without a tiktoken
+    encoding (Claude, Llama) are approximated with cl100k_base, and if no encoding can be
+    loaded (e.g. offline) tokens are estimated from the text length.
+    """
+
+    def __init__(self, cache_size: int = TOKEN_COUNT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._encodings = {}
+        self._counts: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text: str, model: str) -> int:
+        encoding = self._encoding(model)
+        if encoding is None:
+            return len(text) // 4 + 1
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_message(self, message: Message, model: str) -> int:
+        """Tokens of a stored message, cached by message ID since stored messages never change"""
+        key = (self._encoding_name(model), message.id)
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
+
+        count = self.count(message.content, model) + MESSAGE_OVERHEAD_TOKENS
+        with self._lock:
+            self._counts[key] = count
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return count
+
+    def _encoding_name(self, model: str) -> str:
+        encoding = self._encoding(model)
+        return encoding.name if encoding is not None else "estimate"
+
+    def _encoding(self, model: str):
+        if model in self._encodings:
+            return self._encodings[model]
+        try:
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"No tokenizer for {model} ({e}), estimating tokens from text length")
+            encoding = None
+        self._encodings[model] = encoding
+        return encoding
+
+
+class ContextWindowManager:
+    """Fits conversation history into a per-model token budget"""
+
+    def __init__(self,
+                 default_budget: int = CONTEXT_TOKEN_BUDGET,
+                 budgets: Optional[Dict[str, int]] = None,
+                 max_messages: int = CONTEXT_MAX_HISTORY_MESSAGES,
+                 summarize: bool = CONTEXT_SUMMARY_ENABLED,
+                 summary_model: str = CONTEXT_SUMMARY_MODEL,
+                 counter: Optional[TokenCounter] = None):
+        self.default_budget = default_budget
+        self.budgets = parse_budgets(CONTEXT_TOKEN_BUDGETS) if budgets is None else budgets
+        self.max_messages = max_messages
+        self.summarize = summarize
+        self.summary_model = summary_model
+        self.counter = counter or TokenCounter()
+        # conversation_id -> (ID of the last summarized message, summary text)
+        self._summaries: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+    def budget_for(self, model: str) -> int:
+        return self.budgets.get(model, self.default_budget)
+
+    def fit(self, history: List[Message], model: str, budget: Optional[int] = None) -> Tuple[List[Message], List[Message]]:
+        """
+        Split history into (kept, dropped): kept is the longest suffix that fits the
+        budget, starting with a user message so every provider accepts it.
+        """
+        budget = self.budget_for(model) if budget is None else budget
+        used = 0
+        start = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            tokens = self.counter.count_message(history[i], model)
+            if used + tokens > budget:
+                break
+            used += tokens
+            start = i
+
+        while start < len(history) and history[start].role != "user":
+            start += 1
+        return history[start:], history[:start]
+
+    async def build(self, conversation_id: str, history: List[Message], model: str) -> List[Message]:
+        """Return the messages to send as history for the next turn of a conversation"""
+        budget = self.budget_for(model)
+        summary = None
+        if self.summarize:
+            budget -= CONTEXT_SUMMARY_MAX_TOKENS + MESSAGE_OVERHEAD_TOKENS
+
+        kept, dropped = self.fit(history, model, budget)
+        if self.summarize and dropped:
+            summary = await self._rolling_summary(conversation_id, dropped)
+
+        total_tokens = sum(self.counter.count_message(msg, model) for msg in history)
+        sent_tokens = sum(self.counter.count_message(msg, model) for msg in kept)
+        summary_tokens = self.counter.count(summary, model) if summary else 0
+        logger.info(
+            f"Context for {conversation_id} ({model}): {sent_tokens + summary_tokens} of {total_tokens} history tokens, "
+            f"{len(kept)}/{len(history)} messages, summary {summary_tokens} tokens"
+        )
+
+        if summary:
+            summary_message = Message(
+                id=f"summary-{conversation_id}",
+                role="system",
+                content=f"Summary of the earlier conversation:\n{summary}",
+                timestamp=kept[0].timestamp if kept else ""
+            )
+            return [summary_message] + kept
+        return kept
+
+    async def _rolling_summary(self, conversation_id: str, dropped: List[Message]) -> Optional[str]:
+        """Fold messages that left the window into the conversation's summary"""
+        last_id, summary = self._summaries.get(conversation_id, (None, ""))
+        ids = [msg.id for msg in dropped]
+        new_messages = dropped[ids.index(last_id) + 1:] if last_id in ids else dropped
+        if len(new_messages) < CONTEXT_SUMMARY_MIN_MESSAGES:
+            return summary or None
+
+        prompt = SUMMARY_PROMPT.format(
+            max_tokens=CONTEXT_SUMMARY_MAX_TOKENS,
+            summary=summary or "(none)",
+            messages="\n".join(f"{msg.role}: {msg.content}" for msg in new_messages)
+        )
+        response = await ai_service.chat_completion(message=prompt, conversation_history=[], model=self.summary_model)
+        if response.get("error"):
+            logger.warning(f"Summarizing {conversation_id} failed: {response['error']}")
+            return summary or None
+
+        summary = response.get("content", "")
+        self._summaries[conversation_id] = (new_messages[-1].id, summary)
+        self._summaries.move_to_end(conversation_id)
+        if len(self._summaries) > SUMMARY_CACHE_SIZE:
+            self._summaries.popitem(last=False)
+        return summary
+
+# Initialize global context window manager
+context_window = ContextWindowManager()
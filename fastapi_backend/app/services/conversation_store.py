@@ -0,0 +1,231 @@
+"""
+Conversation storage backends.
+
+ConversationStore is the interface Storage uses for messages. Two implementations:
+    InMemoryConversationStore - the default, per-process, lost on restart
+    SQLiteConversationStore   - persistent and shared between workers (WAL mode)
+
+Messages are append-only and can be read as a tail (the last N messages) or a page
+further back, so callers never need to load a whole conversation. Conversations
+not updated for CONVERSATION_TTL_SECONDS are expired (0 keeps them forever).
+"""
+import os
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from app.models.schemas import Message
+
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "memory")
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "data/conversations.sqlite3")
+CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", 0))
+# Expired conversations are purged at most this often
+CONVERSATION_PURGE_INTERVAL = float(os.getenv("CONVERSATION_PURGE_INTERVAL", 60))
+
+
+class ConversationStore(ABC):
+    """Interface for conversation storage backends"""
+
+    def __init__(self, ttl_seconds: float = CONVERSATION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._last_purge = time.time()
+
+    @abstractmethod
+    def create_conversation(self, conversation_id: str):
+        """Create a conversation if it does not exist yet"""
+
+    @abstractmethod
+    def exists(self, conversation_id: str) -> bool:
+        """Check whether a conversation exists and has not expired"""
+
+    @abstractmethod
+    def append_message(self, conversation_id: str, message: Message):
+        """
+        Append a message to a conversation. A conversation purged since the caller
+        checked it exists is started over with this message rather than lost.
+        """
+
+    @abstractmethod
+    def get_messages(self, conversation_id: str, limit: Optional[int] = None, offset: int = 0) -> Optional[List[Message]]:
+        """
+        Get messages in chronological order, or None if the conversation does not exist.
+        With a limit, returns the last `limit` messages before the newest `offset` ones.
+        """
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Delete conversations idle for longer than the TTL and return how many were removed"""
+
+    def maybe_purge_expired(self):
+        """Purge expired conversations if the purge interval has passed"""
+        if self.ttl_seconds and time.time() - self._last_purge >= CONVERSATION_PURGE_INTERVAL:
+            self._last_purge = time.time()
+            self.purge_expired()
+
+    def _is_expired(self, updated_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - updated_at > self.ttl_seconds
+
+
+class _MemoryConversation:
+    __slots__ = ("messages", "updated_at")
+
+    def __init__(self):
+        self.messages: List[Message] = []
+        self.updated_at = time.time()
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Keeps conversations in process memory"""
+
+    def __init__(self, ttl_seconds: float = CONVERSATION_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.conversations: Dict[str, _MemoryConversation] = {}
+        self._lock = threading.Lock()
+
+    def create_conversation(self, conversation_id: str):
+        self.maybe_purge_expired()
+        with self._lock:
+            conversation = self.conversations.get(conversation_id)
+            if conversation is None or self._is_expired(conversation.updated_at):
+                self.conversations[conversation_id] = _MemoryConversation()
+
+    def exists(self, conversation_id: str) -> bool:
+        return self._get(conversation_id) is not None
+
+    def append_message(self, conversation_id: str, message: Message):
+        with self._lock:
+            conversation = self.conversations.get(conversation_id)
+            if conversation is None or self._is_expired(conversation.updated_at):
+                conversation = self.conversations[conversation_id] = _MemoryConversation()
+            conversation.messages.append(message)
+            conversation.updated_at = time.time()
+
+    def get_messages(self, conversation_id: str, limit: Optional[int] = None, offset: int = 0) -> Optional[List[Message]]:
+        conversation = self._get(conversation_id)
+        if conversation is None:
+            return None
+        end = len(conversation.messages) - offset
+        start = 0 if limit is None else max(0, end - limit)
+        return conversation.messages[start:max(0, end)]
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            expired = [cid for cid, conv in self.conversations.items() if self._is_expired(conv.updated_at)]
+            for conversation_id in expired:
+                del self.conversations[conversation_id]
+        return len(expired)
+
+    def _get(self, conversation_id: str) -> Optional[_MemoryConversation]:
+        conversation = self.conversations.get(conversation_id)
+        if conversation is None or self._is_expired(conversation.updated_at):
+            return None
+        return conversation
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Stores conversations in SQLite with write-ahead logging, so several uvicorn
+    workers can share one database file. Each thread uses its own connection.
+    """
+
+    def __init__(self, path: str = CONVERSATION_DB_PATH, ttl_seconds: float = CONVERSATION_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages (conversation_id, seq);
+            CREATE INDEX IF NOT EXISTS conversations_by_update ON conversations (updated_at);
+        """)
+
+    def create_conversation(self, conversation_id: str):
+        self.maybe_purge_expired()
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            if self.ttl_seconds:
+                # An expired conversation is started over rather than revived
+                self._delete_where(conn, "id = ? AND updated_at < ?", (conversation_id, now - self.ttl_seconds))
+            conn.execute(
+                "INSERT OR IGNORE INTO conversations (id, created_at, updated_at) VALUES (?, ?, ?)",
+                (conversation_id, now, now)
+            )
+
+    def exists(self, conversation_id: str) -> bool:
+        row = self._conn().execute("SELECT updated_at FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return row is not None and not self._is_expired(row[0])
+
+    def append_message(self, conversation_id: str, message: Message):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            if self.ttl_seconds:
+                self._delete_where(conn, "id = ? AND updated_at < ?", (conversation_id, now - self.ttl_seconds))
+            # Without the conversation row the message would be orphaned and never read back
+            conn.execute(
+                "INSERT OR IGNORE INTO conversations (id, created_at, updated_at) VALUES (?, ?, ?)",
+                (conversation_id, now, now)
+            )
+            conn.execute(
+                "INSERT INTO messages (conversation_id, id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, message.id, message.role, message.content, message.timestamp)
+            )
+            conn.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
+
+    def get_messages(self, conversation_id: str, limit: Optional[int] = None, offset: int = 0) -> Optional[List[Message]]:
+        if not self.exists(conversation_id):
+            return None
+        # Read newest first through the (conversation_id, seq) index, then restore chronological order
+        rows = self._conn().execute(
+            "SELECT id, role, content, timestamp FROM messages WHERE conversation_id = ? "
+            "ORDER BY seq DESC LIMIT ? OFFSET ?",
+            (conversation_id, -1 if limit is None else limit, offset)
+        ).fetchall()
+        return [Message(id=id_, role=role, content=content, timestamp=timestamp)
+                for id_, role, content, timestamp in reversed(rows)]
+
+    def purge_expired(self) -> int:
+        if not self.ttl_seconds:
+            return 0
+        conn = self._conn()
+        with conn:
+            return self._delete_where(conn, "updated_at < ?", (time.time() - self.ttl_seconds,))
+
+    def _delete_where(self, conn: sqlite3.Connection, condition: str, params: tuple) -> int:
+        conn.execute(f"DELETE FROM messages WHERE conversation_id IN (SELECT id FROM conversations WHERE {condition})", params)
+        return conn.execute(f"DELETE FROM conversations WHERE {condition}", params).rowcount
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def create_conversation_store() -> ConversationStore:
+    """Create the backend selected by CONVERSATION_STORE ("memory" or "sqlite")"""
+    if CONVERSATION_STORE == "sqlite":
+        return SQLiteConversationStore()
+    if CONVERSATION_STORE == "memory":
+        return InMemoryConversationStore()
+    raise ValueError(f"Unknown CONVERSATION_STORE: {CONVERSATION_STORE}")
@@ -0,0 +1,271 @@
+"""
+Persistent FAISS index store shared by all workers.
+
+Every vectorstore built by create_db is saved under {INDEX_DIR}/indexes/{key}, where
+the key is derived from the document's content hash, together with the BM25 keyword
+index used for hybrid retrieval, and conversations are linked to
+an index through small JSON files under {INDEX_DIR}/conversations. The status of
+ingestion jobs is kept the same way under {INDEX_DIR}/jobs. Any worker can
+therefore serve any conversation or job status query: indexes are loaded back from
+disk on demand and kept in an LRU cache bounded by INDEX_CACHE_MAX_BYTES and
+INDEX_IDLE_SECONDS.
+
+FAISS vectors are memory-mapped in place (IO_FLAG_MMAP_IFC), so they live in the
+page cache, shared by every worker that has the index open and reclaimable by the
+kernel. Only memory private to the process counts against INDEX_CACHE_MAX_BYTES:
+the docstore, the keyword index, and the vectors of index types that cannot be
+mapped and are read into memory instead.
+"""
+import os
+import re
+import json
+import hashlib
+import time
+import pickle
+import shutil
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+import faiss
+from langchain_community.vectorstores import FAISS
+from app.logic.conversation_retrieval import create_embeddings
+from app.logic.hybrid_retrieval import KeywordIndex, KEYWORD_INDEX_FILE
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.getenv("INDEX_DIR", "indexes")
+INDEX_CACHE_MAX_BYTES = int(os.getenv("INDEX_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+INDEX_IDLE_SECONDS = float(os.getenv("INDEX_IDLE_SECONDS", 1800))
+# Conversation and job IDs usable as file names without hashing
+SAFE_ID = re.compile(r"[A-Za-z0-9_-]+")
+# Python object overhead of an unpickled docstore entry (Document, metadata, dict slots) beyond its text
+DOCSTORE_BYTES_PER_CHUNK = 1024
+
+
+class CachedIndex:
+    """A loaded vectorstore and its keyword index together with their estimated size and last access time"""
+
+    def __init__(self, vectorstore: FAISS, keyword_index: KeywordIndex, size: int):
+        self.vectorstore = vectorstore
+        self.keyword_index = keyword_index
+        self.size = size
+        self.last_used = time.monotonic()
+
+
+class VectorIndexStore:
+    """Saves vectorstores to disk by content key and loads them back through an LRU cache"""
+
+    def __init__(self,
+                 base_dir: str = INDEX_DIR,
+                 embeddings_factory: Callable = create_embeddings,
+                 max_bytes: int = INDEX_CACHE_MAX_BYTES,
+                 idle_seconds: float = INDEX_IDLE_SECONDS):
+        self.index_dir = os.path.join(base_dir, "indexes")
+        self.conversation_dir = os.path.join(base_dir, "conversations")
+        self.job_dir = os.path.join(base_dir, "jobs")
+        os.makedirs(self.index_dir, exist_ok=True)
+        os.makedirs(self.conversation_dir, exist_ok=True)
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.embeddings_factory = embeddings_factory
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._cache: "OrderedDict[str, CachedIndex]" = OrderedDict()
+        self._cached_bytes = 0
+        self._embeddings = None
+        self._lock = threading.RLock()
+
+    def exists(self, key: str) -> bool:
+        """Check whether an index has been saved for a key"""
+        return os.path.exists(os.path.join(self._index_path(key), "index.faiss"))
+
+    def save(self, key: str, vectorstore: FAISS):
+        """Persist a vectorstore under a key. The write is atomic so readers never see a partial index."""
+        final_path = self._index_path(key)
+        tmp_path = f"{final_path}.tmp-{uuid.uuid4().hex}"
+        vectorstore.save_local(tmp_path)
+        KeywordIndex.from_vectorstore(vectorstore).save(os.path.join(tmp_path, KEYWORD_INDEX_FILE))
+        try:
+            os.rename(tmp_path, final_path)
+        except OSError:
+            # Another worker saved the same content first, keep its copy
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        logger.info(f"Saved index {key}")
+
+    def load(self, key: str) -> Optional[FAISS]:
+        """Get the vectorstore for a key from memory, memory-mapping it from disk if needed"""
+        cached = self._load_cached(key)
+        return cached.vectorstore if cached else None
+
+    def load_keyword_index(self, key: str) -> Optional[KeywordIndex]:
+        """Get the keyword index saved with the vectorstore for a key"""
+        cached = self._load_cached(key)
+        return cached.keyword_index if cached else None
+
+    def link_conversation(self, conversation_id: str, **fields):
+        """Record index details (index_key, job_id, status, error) for a conversation"""
+        with self._lock:
+            link = self.get_conversation_link(conversation_id) or {}
+            link.update(fields)
+            self._write_json(self._conversation_path(conversation_id), link)
+
+    def get_conversation_link(self, conversation_id: str) -> Optional[dict]:
+        """Get the index details recorded for a conversation"""
+        return self._read_json(self._conversation_path(conversation_id))
+
+    def save_job(self, job_id: str, status: dict):
+        """Record the status of an ingestion job (status, error, index_key and progress)"""
+        self._write_json(self._job_path(job_id), status)
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """Get the status last recorded for an ingestion job"""
+        return self._read_json(self._job_path(job_id))
+
+    def load_for_conversation(self, conversation_id: str) -> Optional[FAISS]:
+        """Get the vectorstore linked to a conversation, or None if it is not ready"""
+        link = self.get_conversation_link(conversation_id)
+        if not link or not link.get("index_key"):
+            return None
+        return self.load(link["index_key"])
+
+    def load_keyword_index_for_conversation(self, conversation_id: str) -> Optional[KeywordIndex]:
+        """Get the keyword index linked to a conversation, or None if it is not ready"""
+        link = self.get_conversation_link(conversation_id)
+        if not link or not link.get("index_key"):
+            return None
+        return self.load_keyword_index(link["index_key"])
+
+    def _load_cached(self, key: str) -> Optional[CachedIndex]:
+        with self._lock:
+            self._evict_idle()
+            cached = self._cache.get(key)
+            if cached:
+                cached.last_used = time.monotonic()
+                self._cache.move_to_end(key)
+                return cached
+
+        if not self.exists(key):
+            return None
+
+        vectorstore, mapped = self._read(key)
+        keyword_index = self._read_keyword_index(key, vectorstore)
+        size = self._estimate_size(vectorstore, mapped) + keyword_index.nbytes
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = CachedIndex(vectorstore, keyword_index, size)
+                self._cached_bytes += size
+                self._evict_over_budget()
+            return self._cache[key]
+
+    def _read(self, key: str) -> Tuple[FAISS, bool]:
+        """The vectorstore for a key, and whether its vectors are memory-mapped rather than copied"""
+        path = self._index_path(key)
+        index_file = os.path.join(path, "index.faiss")
+        try:
+            # Saved indexes are immutable, so their vectors can be used in place from a read-only
+            # mapping and shared through the page cache (IO_FLAG_MMAP alone still copies them)
+            index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+            mapped = True
+        except RuntimeError:
+            logger.info(f"Index {key} cannot be memory-mapped, reading it into memory")
+            index = faiss.read_index(index_file)
+            mapped = False
+
+        with open(os.path.join(path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+
+        vectorstore = FAISS(
+            embedding_function=self._get_embeddings(),
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id
+        )
+        return vectorstore, mapped
+
+    def _read_keyword_index(self, key: str, vectorstore: FAISS) -> KeywordIndex:
+        path = os.path.join(self._index_path(key), KEYWORD_INDEX_FILE)
+        try:
+            return KeywordIndex.load(path)
+        except FileNotFoundError:
+            pass
+
+        # Indexes saved before keyword search existed get theirs built on first use
+        keyword_index = KeywordIndex.from_vectorstore(vectorstore)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        try:
+            keyword_index.save(tmp_path)
+            os.replace(tmp_path, path)
+            logger.info(f"Built keyword index for {key}")
+        except OSError:
+            logger.warning(f"Could not save keyword index for {key}", exc_info=True)
+        return keyword_index
+
+    def _get_embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = self.embeddings_factory()
+        return self._embeddings
+
+    def _estimate_size(self, vectorstore: FAISS, mapped: bool) -> int:
+        """
+        Approximate private bytes held by an index: the docstore, plus the float32
+        vectors unless they are memory-mapped (those pages belong to the page cache)
+        """
+        vector_bytes = 0 if mapped else vectorstore.index.ntotal * vectorstore.index.d * 4
+        chunks = vectorstore.docstore._dict.values()
+        docstore_bytes = sum(len(doc.page_content) for doc in chunks) + len(chunks) * DOCSTORE_BYTES_PER_CHUNK
+        return vector_bytes + docstore_bytes
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key in [key for key, cached in self._cache.items() if now - cached.last_used > self.idle_seconds]:
+            self._evict(key)
+
+    def _evict_over_budget(self):
+        # Always keep the most recently used index, even if it alone exceeds the budget
+        while self._cached_bytes > self.max_bytes and len(self._cache) > 1:
+            self._evict(next(iter(self._cache)))
+
+    def _evict(self, key: str):
+        cached = self._cache.pop(key)
+        self._cached_bytes -= cached.size
+        logger.info(f"Evicted index {key} from memory")
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self.index_dir, key)
+
+    def _conversation_path(self, conversation_id: str) -> str:
+        return os.path.join(self.conversation_dir, f"{self._safe_id(conversation_id)}.json")
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir, f"{self._safe_id(job_id)}.json")
+
+    @staticmethod
+    def _safe_id(value: str) -> str:
+        """
+        File name for a client-supplied conversation or job ID. IDs made only of
+        [A-Za-z0-9_-] (such as UUIDs) are used as is; any other ID is hashed, and the
+        "." in the hashed name keeps it from colliding with an ID used as is
+        """
+        if SAFE_ID.fullmatch(value):
+            return value
+        return f"sha256.{hashlib.sha256(value.encode()).hexdigest()}"
+
+    @staticmethod
+    def _write_json(path: str, data: dict):
+        # Written to a temporary file and renamed, so readers never see a partial file
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_json(path: str) -> Optional[dict]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+# Initialize global index store
+index_store = VectorIndexStore()
@@ -0,0 +1,248 @@
+"""
+Background ingestion of uploaded PDFs.
+
+Loading, splitting and embedding a document is CPU and network bound synchronous
+work, so it runs on a worker thread pool instead of inside the request handler.
+PDF text extraction, the CPU heavy part, goes one step further by default and runs
+on the pdf_extraction worker processes, so parsing does not hold the GIL the event
+loop needs.
+Each upload becomes a job whose progress can be polled while it runs. Job status is
+saved in the index store, so any worker can answer for any job; the jobs kept in
+memory only save a disk read for the worker running them. The resulting
+index is saved to the shared index store, keyed by the document's content hash, so a
+document that was already indexed is not loaded or embedded again. Uploads of a
+document that is still being indexed join the running job instead of starting their
+own, and their conversations are linked to the index when that job finishes.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.models.schemas import IngestionJobStatus
+from app.logic.document_loaders import DocumentLoader
+from app.logic.conversation_retrieval import create_db, create_embeddings, EMBEDDING_MODEL
+from app.services.index_store import index_store
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", 4))
+# Finished jobs kept around for status queries before the oldest are dropped
+INGESTION_MAX_FINISHED_JOBS = int(os.getenv("INGESTION_MAX_FINISHED_JOBS", 1000))
+# Uploads are turned away while this many jobs are queued or running (0 disables the limit)
+INGESTION_MAX_BACKLOG = int(os.getenv("INGESTION_MAX_BACKLOG", 100))
+# Extract PDF text on worker processes (PDF_EXTRACTION_WORKERS of them) rather than ingestion threads
+INGESTION_ISOLATE_PDF_EXTRACTION = os.getenv("INGESTION_ISOLATE_PDF_EXTRACTION", "true").lower() == "true"
+
+FINISHED_STATES = ("ready", "failed")
+# Progress of a running job is saved to the index store at most this often
+JOB_PROGRESS_SAVE_SECONDS = 1.0
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash a file's content without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_key(content_hash: str) -> str:
+    """Index store key for a document: its content plus everything that shapes the index"""
+    settings = f"{EMBEDDING_MODEL}:{CHUNK_SIZE}:{CHUNK_OVERLAP}:{content_hash}"
+    return hashlib.sha256(settings.encode()).hexdigest()
+
+
+class IngestionManager:
+    """Runs PDF ingestion jobs on a thread pool and tracks their progress"""
+
+    def __init__(self, max_workers: int = INGESTION_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self.jobs: "OrderedDict[str, IngestionJobStatus]" = OrderedDict()
+        # index key -> (job building it, other conversations waiting for it)
+        self._in_flight: Dict[str, Tuple[IngestionJobStatus, List[str]]] = {}
+        # job ID -> when its progress was last saved
+        self._progress_saved: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def submit(self,
+               file_id: str,
+               file_path: str,
+               conversation_id: str,
+               content_hash: Optional[str] = None) -> IngestionJobStatus:
+        """
+        Queue a PDF for ingestion and return its job right away.
+        Once the index is saved, the conversation is linked to it in the index store.
+        If content_hash is given and that content was indexed before, the existing
+        index is linked immediately and the job is returned already finished. If that
+        content is being indexed right now, the running job is returned instead of a
+        new one and the conversation is linked when it finishes.
+        """
+        key = index_key(content_hash) if content_hash else None
+        if key and index_store.exists(key):
+            job = self._add_job(file_id, conversation_id)
+            logger.info(f"Job {job.job_id}: duplicate upload, reusing index {key}")
+            job.status = "ready"
+            job.index_key = key
+            job.finished_at = datetime.now().isoformat()
+            self._save(job)
+            index_store.link_conversation(conversation_id, job_id=job.job_id, index_key=key, status=job.status, error=None)
+            return job
+
+        with self._lock:
+            running = self._in_flight.get(key) if key else None
+            if running:
+                job, waiting = running
+                waiting.append(conversation_id)
+                # Linked under the lock, so _run's final link for this conversation always comes later
+                index_store.link_conversation(conversation_id, job_id=job.job_id, index_key=None, status=job.status, error=None)
+        if running:
+            logger.info(f"Job {job.job_id}: duplicate upload for conversation {conversation_id} joins the running job")
+            return job
+
+        job = self._add_job(file_id, conversation_id)
+        if key:
+            with self._lock:
+                self._in_flight[key] = (job, [])
+        self._save(job)
+        # Lets other workers answer "still processing" for this conversation
+        index_store.link_conversation(conversation_id, job_id=job.job_id, index_key=None, status=job.status, error=None)
+        self.executor.submit(self._run, job, file_path, content_hash)
+        return job
+
+    def backlog(self) -> int:
+        """Number of jobs queued or running"""
+        with self._lock:
+            return sum(1 for job in self.jobs.values() if job.status not in FINISHED_STATES)
+
+    def get_job(self, job_id: str) -> Optional[IngestionJobStatus]:
+        """Get a job by ID, from memory or else as last saved by whichever worker runs it"""
+        job = self.jobs.get(job_id)
+        if job:
+            return job
+        status = index_store.get_job(job_id)
+        if not status:
+            return None
+        job = IngestionJobStatus(**status)
+        if job.status in FINISHED_STATES:
+            # Finished jobs no longer change, keep them for the next query
+            with self._lock:
+                self.jobs.setdefault(job_id, job)
+                self._prune()
+        return job
+
+    def shutdown(self):
+        """Stop accepting jobs and wait for running ones to finish"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _add_job(self, file_id: str, conversation_id: str) -> IngestionJobStatus:
+        job = IngestionJobStatus(
+            job_id=str(uuid.uuid4()),
+            file_id=file_id,
+            conversation_id=conversation_id
+        )
+        with self._lock:
+            self.jobs[job.job_id] = job
+            self._prune()
+        return job
+
+    def _run(self, job: IngestionJobStatus, file_path: str, content_hash: Optional[str] = None):
+        try:
+            key = index_key(content_hash or file_sha256(file_path))
+            if index_store.exists(key):
+                logger.info(f"Job {job.job_id}: reusing existing index {key}")
+            else:
+                self._build_index(job, file_path, key)
+
+            job.status = "ready"
+            job.index_key = key
+            link = {"index_key": key, "status": job.status}
+        except Exception as e:
+            logger.error(f"Job {job.job_id}: ingestion failed", exc_info=True)
+            job.status = "failed"
+            job.error = str(e)
+            link = {"status": job.status, "error": job.error}
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            self._save(job)
+
+        conversation_ids = [job.conversation_id]
+        if content_hash:
+            with self._lock:
+                # Later uploads of this content start a new job (or reuse the saved index)
+                _, waiting = self._in_flight.pop(index_key(content_hash), (job, []))
+            conversation_ids += waiting
+        for conversation_id in conversation_ids:
+            index_store.link_conversation(conversation_id, **link)
+        if job.status == "ready":
+            logger.info(f"Job {job.job_id}: index ready for conversations {', '.join(conversation_ids)}")
+
+    def _build_index(self, job: IngestionJobStatus, file_path: str, key: str):
+        job.status = "loading"
+        self._save(job)
+        loader = DocumentLoader(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+        def on_page(page):
+            job.pages_loaded += 1
+            if job.total_pages is None:
+                job.total_pages = page.metadata.get("total_pages")
+            self._save_progress(job)
+
+        def counted(chunks):
+            for chunk in chunks:
+                job.chunks += 1
+                yield chunk
+
+        def on_progress(embedded: int):
+            started = job.status != "embedding"
+            job.status = "embedding"
+            job.chunks_embedded = embedded
+            if started:
+                self._save(job)
+            else:
+                self._save_progress(job)
+
+        # Pages are read, split and embedded as a stream, so the whole document is never in memory
+        embeddings = create_embeddings()
+        chunks = counted(loader.iter_pdf_chunks(file_path, on_page=on_page, isolated=INGESTION_ISOLATE_PDF_EXTRACTION))
+        vectorstore = create_db(chunks, on_progress=on_progress, embeddings=embeddings)
+        logger.info(f"Job {job.job_id}: indexed {job.pages_loaded} pages, {job.chunks} chunks")
+        job.embedding_cache_hits = embeddings.hits
+        job.embedding_cache_misses = embeddings.misses
+        index_store.save(key, vectorstore)
+
+    def _save(self, job: IngestionJobStatus):
+        """Save a job's status to the index store for the other workers"""
+        try:
+            index_store.save_job(job.job_id, job.model_dump())
+        except OSError:
+            logger.warning(f"Job {job.job_id}: could not save its status", exc_info=True)
+        if job.status in FINISHED_STATES:
+            self._progress_saved.pop(job.job_id, None)
+        else:
+            self._progress_saved[job.job_id] = time.monotonic()
+
+    def _save_progress(self, job: IngestionJobStatus):
+        """Save a running job's progress, at most every JOB_PROGRESS_SAVE_SECONDS"""
+        if time.monotonic() - self._progress_saved.get(job.job_id, 0.0) >= JOB_PROGRESS_SAVE_SECONDS:
+            self._save(job)
+
+    def _prune(self):
+        """Drop the oldest finished jobs once more than the retention limit are kept"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - INGESTION_MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+# Initialize global ingestion manager
+ingestion_manager = IngestionManager()
+metrics.gauge("ingestion_backlog", "Ingestion jobs queued or running", callback=lambda: {(): ingestion_manager.backlog()})
@@ -0,0 +1,470 @@
+"""
+Provider-agnostic LLM gateway.
+
+Every LLM request of the application goes through LLMGateway.complete or
+LLMGateway.stream as an LLMRequest. The gateway picks the provider adapter serving
+the model, checks its API key and passes the request through a chain of middleware
+before the adapter sends it. Provider errors come back as an LLMResponse with an
+error (or as an error message in the stream), so callers never see provider
+specific exceptions.
+
+Middleware is written once and applies to every provider. In the default order:
+
+- SingleFlightMiddleware: identical concurrent requests share one upstream call
+- MetricsMiddleware: request, error and token counters plus latencies per provider
+- RetryMiddleware: resends requests that failed with a retryable error
+- RateLimitMiddleware: paces requests to each provider with a token bucket
+- ConcurrencyLimitMiddleware: bounds in-flight requests per provider
+- LLMRouter (llm_router.py): health of every provider/model, for circuit breaking,
+  failover to equivalent models and hedged requests
+
+A middleware implements `complete(request, adapter, call_next)` and
+`stream(request, adapter, call_next)`; the defaults pass the request on unchanged.
+"""
+import os
+import time
+import asyncio
+import logging
+from contextlib import aclosing
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from app.models.schemas import LLMRequest, LLMResponse
+from .rate_limit import TokenBucket
+from .llm_providers import (
+    ProviderAdapter, FakeAdapter, create_openai_adapter, create_anthropic_adapter, create_groq_adapter
+)
+from .llm_router import LLMRouter
+from .provider_pool import create_semaphore, provider_setting
+from .single_flight import SingleFlight, SINGLE_FLIGHT_ENABLED, request_key
+from .metrics import llm_requests, llm_request_duration, llm_time_to_first_token, llm_tokens, trace_span
+
+logger = logging.getLogger(__name__)
+
+# Provider for models no adapter lists
+LLM_DEFAULT_PROVIDER = os.getenv("LLM_DEFAULT_PROVIDER", "openai")
+# Gateway level retries on top of the SDK retries (LLM_MAX_RETRIES), e.g. for streams cut off before the first token
+LLM_GATEWAY_RETRIES = int(os.getenv("LLM_GATEWAY_RETRIES", 0))
+LLM_GATEWAY_RETRY_BACKOFF = float(os.getenv("LLM_GATEWAY_RETRY_BACKOFF", 0.5))
+# Longest a request waits for the provider's token bucket before failing
+LLM_RATE_LIMIT_MAX_WAIT = float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT", 5))
+# Serve the "fake-model" model from the offline fake adapter
+LLM_FAKE_PROVIDER_ENABLED = os.getenv("LLM_FAKE_PROVIDER_ENABLED", "false").lower() == "true"
+
+# Shown to the user before the provider's error message
+ERROR_PREFIXES = {
+    "chat": "Error generating response",
+    "analyze_document": "Error analyzing document",
+    "analyze_url": "Error analyzing URL",
+    "decode_error": "Error decoding message"
+}
+
+CompleteHandler = Callable[[LLMRequest], Awaitable[LLMResponse]]
+StreamHandler = Callable[[LLMRequest], AsyncIterator[str]]
+
+
+class Middleware:
+    """Hook around every provider call"""
+
+    async def complete(self, request: LLMRequest, adapter: ProviderAdapter, call_next: CompleteHandler) -> LLMResponse:
+        return await call_next(request)
+
+    def stream(self, request: LLMRequest, adapter: ProviderAdapter, call_next: StreamHandler) -> AsyncIterator[str]:
+        return call_next(request)
+
+
+class SingleFlightMiddleware(Middleware):
+    """Identical concurrent requests to a provider share one upstream call or stream"""
+
+    def __init__(self, single_flight: Optional[SingleFlight] = None):
+        self.single_flight = single_flight or SingleFlight()
+
+    async def complete(self, request, adapter, call_next):
+        key = request_key("complete", adapter.name, request.model_dump())
+        response = await self.single_flight.do(key, lambda: call_next(request))
+        # Each caller gets its own copy of the shared response
+        return response.model_copy(deep=True)
+
+    def stream(self, request, adapter, call_next):
+        key = request_key("stream", adapter.name, request.model_dump())
+        return self.single_flight.stream(key, lambda: call_next(request))
+
+    def stats(self) -> Dict[str, int]:
+        return self.single_flight.stats()
+
+
+class MetricsMiddleware(Middleware):
+    """
+    Counts requests, errors and tokens per provider for stats(), and exports requests
+    by outcome, durations, time to first token and tokens per provider and model as
+    the llm_* metrics.
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, adapter: ProviderAdapter, **increments: int):
+        counters = self.counters.setdefault(adapter.name, {
+            "requests": 0, "streams": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0
+        })
+        for name, value in increments.items():
+            counters[name] += value
+
+    async def complete(self, request, adapter, call_next):
+        self._count(adapter, requests=1)
+        labels = {"provider": adapter.name, "model": request.model}
+        start = time.perf_counter()
+        try:
+            with trace_span("llm.complete", operation=request.operation, **labels):
+                response = await call_next(request)
+        except Exception:
+            self._count(adapter, errors=1)
+            llm_requests.inc(outcome="error", **labels)
+            raise
+        finally:
+            llm_request_duration.observe(time.perf_counter() - start, **labels)
+        llm_requests.inc(outcome="ok", **labels)
+        if response.tokens_used:
+            self._count(adapter, prompt_tokens=response.tokens_used.prompt,
+                        completion_tokens=response.tokens_used.completion)
+            llm_tokens.inc(response.tokens_used.prompt, direction="prompt", **labels)
+            llm_tokens.inc(response.tokens_used.completion, direction="completion", **labels)
+        return response
+
+    async def stream(self, request, adapter, call_next):
+        self._count(adapter, streams=1)
+        labels = {"provider": adapter.name, "model": request.model}
+        start = time.perf_counter()
+        first_token = True
+        try:
+            async with aclosing(call_next(request)) as tokens:
+                async for token in tokens:
+                    if first_token:
+                        llm_time_to_first_token.observe(time.perf_counter() - start, **labels)
+                        first_token = False
+                    yield token
+        except Exception:
+            self._count(adapter, errors=1)
+            llm_requests.inc(outcome="error", **labels)
+            raise
+        else:
+            llm_requests.inc(outcome="ok", **labels)
+        finally:
+            llm_request_duration.observe(time.perf_counter() - start, **labels)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: dict(counters) for name, counters in self.counters.items()}
+
+
+class RetryMiddleware(Middleware):
+    """
+    Resends requests that failed with an error the adapter considers retryable, with
+    exponential backoff. A stream is only retried if it failed before its first token.
+    """
+
+    def __init__(self, retries: int = LLM_GATEWAY_RETRIES, backoff: float = LLM_GATEWAY_RETRY_BACKOFF):
+        self.retries = retries
+        self.backoff = backoff
+        self.retried = 0
+
+    async def _backoff(self, adapter: ProviderAdapter, attempt: int, error: Exception):
+        delay = self.backoff * 2 ** attempt
+        self.retried += 1
+        logger.warning(f"{adapter.label} request failed ({error}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    async def complete(self, request, adapter, call_next):
+        attempt = 0
+        while True:
+            try:
+                return await call_next(request)
+            except Exception as e:
+                if attempt >= self.retries or not adapter.is_retryable(e):
+                    raise
+                await self._backoff(adapter, attempt, e)
+                attempt += 1
+
+    async def stream(self, request, adapter, call_next):
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with aclosing(call_next(request)) as tokens:
+                    async for token in tokens:
+                        started = True
+                        yield token
+                return
+            except Exception as e:
+                if started or attempt >= self.retries or not adapter.is_retryable(e):
+                    raise
+                await self._backoff(adapter, attempt, e)
+                attempt += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"retried": self.retried}
+
+
+class ProviderRateLimitError(Exception):
+    """The provider's request rate limit would have been exceeded"""
+    status_code = 429
+
+
+class RateLimitMiddleware(Middleware):
+    """
+    Paces requests to each provider with a token bucket ({PROVIDER}_REQUESTS_PER_SECOND,
+    bursts of {PROVIDER}_BURST; 0 disables it), so bursts are spread out instead of
+    running into the provider's 429s. A request that would wait longer than
+    LLM_RATE_LIMIT_MAX_WAIT fails with a retryable error, so the router can fail it over.
+    """
+
+    def __init__(self, max_wait: float = LLM_RATE_LIMIT_MAX_WAIT):
+        self.max_wait = max_wait
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.throttled = 0
+
+    def _bucket(self, adapter: ProviderAdapter) -> TokenBucket:
+        bucket = self._buckets.get(adapter.name)
+        if bucket is None:
+            rate = provider_setting(adapter.name, "REQUESTS_PER_SECOND", 0, float)
+            bucket = self._buckets[adapter.name] = TokenBucket(rate, provider_setting(adapter.name, "BURST", max(1, int(rate)), int))
+        return bucket
+
+    async def _wait(self, adapter: ProviderAdapter):
+        bucket = self._bucket(adapter)
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait_time = bucket.try_acquire()
+            if not wait_time:
+                return
+            if time.monotonic() + wait_time > deadline:
+                raise ProviderRateLimitError(f"{adapter.label} request rate limit reached")
+            self.throttled += 1
+            await asyncio.sleep(wait_time)
+
+    async def complete(self, request, adapter, call_next):
+        await self._wait(adapter)
+        return await call_next(request)
+
+    async def stream(self, request, adapter, call_next):
+        await self._wait(adapter)
+        async with aclosing(call_next(request)) as tokens:
+            async for token in tokens:
+                yield token
+
+    def stats(self) -> Dict[str, int]:
+        return {"throttled": self.throttled}
+
+
+class ConcurrencyLimitMiddleware(Middleware):
+    """Bounds the in-flight requests to each provider ({PROVIDER}_MAX_CONCURRENCY)"""
+
+    def __init__(self):
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, adapter: ProviderAdapter) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(adapter.name)
+        if semaphore is None:
+            semaphore = self._semaphores[adapter.name] = create_semaphore(adapter.name.upper())
+        return semaphore
+
+    async def complete(self, request, adapter, call_next):
+        async with self._semaphore(adapter):
+            return await call_next(request)
+
+    async def stream(self, request, adapter, call_next):
+        async with self._semaphore(adapter):
+            async with aclosing(call_next(request)) as tokens:
+                async for token in tokens:
+                    yield token
+
+
+def default_middleware(single_flight: bool = SINGLE_FLIGHT_ENABLED, retries: int = LLM_GATEWAY_RETRIES) -> List[Middleware]:
+    """The middleware chain used by the application, outermost first"""
+    middleware: List[Middleware] = [SingleFlightMiddleware()] if single_flight else []
+    return middleware + [MetricsMiddleware(), RetryMiddleware(retries), RateLimitMiddleware(), ConcurrencyLimitMiddleware()]
+
+
+class LLMGateway:
+    """Routes LLMRequests to provider adapters through the middleware chain"""
+
+    def __init__(self,
+                 adapters: Sequence[ProviderAdapter],
+                 middleware: Optional[Sequence[Middleware]] = None,
+                 default_provider: str = LLM_DEFAULT_PROVIDER,
+                 router: Optional[LLMRouter] = None):
+        self.adapters: Dict[str, ProviderAdapter] = {adapter.name: adapter for adapter in adapters}
+        self.middleware: List[Middleware] = list(default_middleware() if middleware is None else middleware)
+        self.default_provider = default_provider
+        # Without a router every request goes to the requested model only
+        self.router = router
+        self._unknown_models = set()
+
+    def adapter_for_model(self, model: str) -> ProviderAdapter:
+        """The adapter listing the model, or the default provider's for unknown models"""
+        for adapter in self.adapters.values():
+            if model in adapter.models:
+                return adapter
+        if model not in self._unknown_models:
+            self._unknown_models.add(model)
+            logger.warning(f"No provider lists model {model!r}, sending it to {self.default_provider}")
+        return self.adapters[self.default_provider]
+
+    def models(self, provider: Optional[str] = None) -> List[str]:
+        """Models served by one provider, or by all of them"""
+        adapters = [self.adapters[provider]] if provider else self.adapters.values()
+        return [model for adapter in adapters for model in adapter.models]
+
+    def _missing_key_message(self, adapter: ProviderAdapter) -> str:
+        return f"{adapter.label} API key not found. Please set the {adapter.api_key_env} environment variable."
+
+    def _error_response(self, request: LLMRequest, error: Exception) -> LLMResponse:
+        prefix = ERROR_PREFIXES.get(request.operation, ERROR_PREFIXES["chat"])
+        return LLMResponse(content=f"{prefix}: {str(error)}", model=request.model, error=str(error))
+
+    def _chain(self) -> List:
+        return self.middleware + ([self.router] if self.router else [])
+
+    def _routes(self, request: LLMRequest) -> List[Tuple[ProviderAdapter, LLMRequest]]:
+        """
+        (adapter, request) pairs to try in order: the requested model and, with a
+        router, its configured equivalents, leaving out models with an open circuit
+        and providers without an API key
+        """
+        if self.router is None:
+            return [(self.adapter_for_model(request.model), request)]
+        candidates = []
+        for model in self.router.candidates(request.model):
+            adapter = self.adapter_for_model(model)
+            if model == request.model or adapter.configured:
+                candidates.append((adapter, model))
+        return [
+            (adapter, request if model == request.model else request.model_copy(update={"model": model}))
+            for adapter, model in self.router.order(candidates)
+        ]
+
+    async def _send(self, adapter: ProviderAdapter, request: LLMRequest) -> LLMResponse:
+        """Pass the request through the middleware chain to the adapter; raises on failure"""
+        handler: CompleteHandler = adapter.complete
+        for middleware in reversed(self._chain()):
+            handler = partial(middleware.complete, adapter=adapter, call_next=handler)
+        return await handler(request)
+
+    def _send_stream(self, adapter: ProviderAdapter, request: LLMRequest) -> AsyncIterator[str]:
+        handler: StreamHandler = adapter.stream
+        for middleware in reversed(self._chain()):
+            handler = partial(middleware.stream, adapter=adapter, call_next=handler)
+        return handler(request)
+
+    async def _send_hedged(self, adapter: ProviderAdapter, request: LLMRequest,
+                           backups: List[Tuple[ProviderAdapter, LLMRequest]]) -> LLMResponse:
+        """
+        Send the request, and if it has not been answered after the router's hedge
+        delay, also to the first backup (taken off the list). The first answer wins
+        and the other request is cancelled.
+        """
+        delay = self.router.hedge_delay(adapter, request.model) if self.router and backups else None
+        if delay is None:
+            return await self._send(adapter, request)
+
+        primary = asyncio.ensure_future(self._send(adapter, request))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.router.hedged += 1
+                backup_adapter, backup_request = backups.pop(0)
+                tasks.add(asyncio.ensure_future(self._send(backup_adapter, backup_request)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.router.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if not primary.done():
+                primary.cancel()
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        """
+        Send the request to the model's provider and return the answer or the error.
+        With a router, a retryable failure is retried on the next equivalent model.
+        """
+        primary = self.adapter_for_model(request.model)
+        if not primary.configured:
+            return LLMResponse(content=self._missing_key_message(primary), model=request.model,
+                               error=f"{primary.api_key_env} is not set")
+
+        routes = self._routes(request)
+        if not routes:
+            return self._error_response(request, RuntimeError(f"{request.model} is unavailable, try again later"))
+        while routes:
+            adapter, attempt = routes.pop(0)
+            try:
+                return await self._send_hedged(adapter, attempt, routes)
+            except Exception as e:
+                if not routes or not adapter.is_retryable(e):
+                    return self._error_response(request, e)
+                self.router.failovers += 1
+                logger.warning(f"{adapter.label} {attempt.model} failed ({e}), failing over to {routes[0][1].model}")
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        """
+        Yield text deltas of the answer, or the error as the last chunk. With a router,
+        a stream failing before its first token is retried on the next equivalent model.
+        Closing the generator (e.g. when the client disconnects) closes the upstream response.
+        """
+        primary = self.adapter_for_model(request.model)
+        if not primary.configured:
+            yield self._missing_key_message(primary)
+            return
+
+        routes = self._routes(request)
+        if not routes:
+            yield f"{ERROR_PREFIXES['chat']}: {request.model} is unavailable, try again later"
+            return
+        while routes:
+            adapter, attempt = routes.pop(0)
+            started = False
+            try:
+                async with aclosing(self._send_stream(adapter, attempt)) as tokens:
+                    async for token in tokens:
+                        started = True
+                        yield token
+                return
+            except Exception as e:
+                if started or not routes or not adapter.is_retryable(e):
+                    yield f"{ERROR_PREFIXES['chat']}: {str(e)}"
+                    return
+                self.router.failovers += 1
+                logger.warning(f"{adapter.label} {attempt.model} failed ({e}), failing over to {routes[0][1].model}")
+
+    def stats(self) -> Dict[str, Dict]:
+        """Statistics of every middleware that keeps any"""
+        return {
+            type(middleware).__name__: middleware.stats()
+            for middleware in self._chain() if hasattr(middleware, "stats")
+        }
+
+    async def aclose(self):
+        """Close the pooled provider clients (called on application shutdown)"""
+        for adapter in self.adapters.values():
+            await adapter.aclose()
+
+
+def create_gateway(middleware: Optional[Sequence[Middleware]] = None) -> LLMGateway:
+    """
+    Gateway with the OpenAI, Anthropic and Groq adapters (and the fake one if
+    enabled), routing with the LLM_FALLBACK_MODELS and circuit breaker settings
+    """
+    adapters: List[ProviderAdapter] = [create_openai_adapter(), create_anthropic_adapter(), create_groq_adapter()]
+    if LLM_FAKE_PROVIDER_ENABLED:
+        adapters.append(FakeAdapter())
+    return LLMGateway(adapters, middleware, router=LLMRouter())
+
+# Initialize global LLM gateway
+llm_gateway = create_gateway()
@@ -0,0 +1,269 @@
+"""
+Provider adapters for the LLM gateway.
+
+An adapter turns a provider-agnostic LLMRequest into one API call and the answer
+back into an LLMResponse (or a stream of text deltas). Everything else, prompt
+building, API key checks, error handling, coalescing, concurrency limits, retries
+and metrics, lives in the gateway and applies to every adapter alike.
+
+OpenAI and Groq share the chat completions format and differ only in their SDK
+client. Anthropic takes the system prompt separately. FakeAdapter answers without
+any network access, for offline development and the benchmarks.
+"""
+import os
+import asyncio
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+import anthropic
+import groq
+import httpx
+import openai
+from dotenv import load_dotenv
+from app.models.schemas import LLMRequest, LLMResponse, TokenUsage
+from .provider_pool import create_http_client, create_timeout, max_retries
+
+load_dotenv()
+
+# Statuses worth another attempt: rate limits, overload and transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class ProviderAdapter(ABC):
+    """Sends LLMRequests to one provider"""
+
+    name: str = ""  # lower case, also the prefix of the provider's connection settings
+    label: str = ""  # shown in messages to the user
+    api_key_env: Optional[str] = None
+    retryable_errors: Tuple[type, ...] = (httpx.TransportError, asyncio.TimeoutError)
+
+    def __init__(self, models: Sequence[str]):
+        self.models = list(models)
+
+    @property
+    def configured(self) -> bool:
+        """Whether the provider's API key is set"""
+        return self.api_key_env is None or bool(os.environ.get(self.api_key_env))
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether a failed request may succeed when sent again"""
+        return isinstance(error, self.retryable_errors) or getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+    @abstractmethod
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        """Send the request and return the whole answer; raises on failure"""
+
+    @abstractmethod
+    def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        """
+        Yield text deltas of the answer; raises on failure. Closing the generator
+        closes the upstream response so no more tokens are billed.
+        """
+
+    async def aclose(self):
+        """Close the pooled HTTP connections to the provider"""
+
+
+class ChatCompletionsAdapter(ProviderAdapter):
+    """Providers with an OpenAI style chat completions API (OpenAI, Groq)"""
+
+    def __init__(self, name: str, label: str, api_key_env: str, models: Sequence[str], client, retryable_errors: Tuple[type, ...] = ()):
+        super().__init__(models)
+        self.name = name
+        self.label = label
+        self.api_key_env = api_key_env
+        self.client = client
+        self.retryable_errors = ProviderAdapter.retryable_errors + tuple(retryable_errors)
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        response = await self.client.chat.completions.create(
+            model=request.model,
+            messages=request.messages,
+            temperature=request.temperature,
+            max_tokens=request.max_tokens
+        )
+        return LLMResponse(
+            content=response.choices[0].message.content,
+            model=request.model,
+            tokens_used=TokenUsage(
+                prompt=response.usage.prompt_tokens,
+                completion=response.usage.completion_tokens,
+                total=response.usage.total_tokens
+            )
+        )
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=request.model,
+            messages=request.messages,
+            temperature=request.temperature,
+            max_tokens=request.max_tokens,
+            stream=True
+        )
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    async def aclose(self):
+        await self.client.close()
+
+
+class AnthropicAdapter(ProviderAdapter):
+    """Anthropic messages API"""
+
+    name = "anthropic"
+    label = "Anthropic"
+    api_key_env = "ANTHROPIC_API_KEY"
+    retryable_errors = ProviderAdapter.retryable_errors + (anthropic.APIConnectionError,)
+
+    def __init__(self, models: Sequence[str], client: anthropic.AsyncAnthropic):
+        super().__init__(models)
+        self.client = client
+
+    def _split_system(self, messages: List[Dict[str, str]]) -> Tuple[Dict[str, str], List[Dict[str, str]]]:
+        """
+        Anthropic takes the system prompt separately, so system messages (instructions,
+        a summary of earlier turns) are joined into it
+        """
+        system_parts = [msg["content"] for msg in messages if msg["role"] == "system"]
+        conversation = [
+            {"role": "user" if msg["role"] == "user" else "assistant", "content": msg["content"]}
+            for msg in messages if msg["role"] != "system"
+        ]
+        return ({"system": "\n\n".join(system_parts)} if system_parts else {}), conversation
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        system, messages = self._split_system(request.messages)
+        response = await self.client.messages.create(
+            model=request.model,
+            max_tokens=request.max_tokens,
+            messages=messages,
+            temperature=request.temperature,
+            **system
+        )
+        return LLMResponse(
+            content=response.content[0].text,
+            model=request.model,
+            tokens_used=TokenUsage(
+                prompt=response.usage.input_tokens,
+                completion=response.usage.output_tokens,
+                total=response.usage.input_tokens + response.usage.output_tokens
+            )
+        )
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        system, messages = self._split_system(request.messages)
+        async with self.client.messages.stream(
+            model=request.model,
+            max_tokens=request.max_tokens,
+            messages=messages,
+            temperature=request.temperature,
+            **system
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+    async def aclose(self):
+        await self.client.close()
+
+
+class FakeProviderError(Exception):
+    """Simulated transient provider failure"""
+    status_code = 503
+
+
+class FakeAdapter(ProviderAdapter):
+    """
+    Answers every request with the same tokens after a delay, without network
+    access. Every `fail_every`-th request fails with a retryable error and every
+    `slow_every`-th request takes `slow_latency` seconds instead of `latency`.
+    """
+
+    label = "Fake"
+
+    def __init__(self,
+                 models: Sequence[str] = ("fake-model",),
+                 latency: float = 0.0,
+                 token_delay: float = 0.0,
+                 tokens: Sequence[str] = ("This ", "is ", "a ", "fake ", "completion."),
+                 fail_every: int = 0,
+                 slow_every: int = 0,
+                 slow_latency: float = 0.0,
+                 name: str = "fake"):
+        super().__init__(models)
+        self.name = name
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tokens = list(tokens)
+        self.fail_every = fail_every
+        self.slow_every = slow_every
+        self.slow_latency = slow_latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _simulate(self):
+        self.requests += 1
+        number = self.requests
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            slow = self.slow_every and number % self.slow_every == 0
+            await asyncio.sleep(self.slow_latency if slow else self.latency)
+        finally:
+            self.in_flight -= 1
+        if self.fail_every and number % self.fail_every == 0:
+            raise FakeProviderError("Fake provider overloaded")
+
+    def _usage(self, request: LLMRequest) -> TokenUsage:
+        prompt = sum(len(msg["content"]) for msg in request.messages) // 4
+        return TokenUsage(prompt=prompt, completion=len(self.tokens), total=prompt + len(self.tokens))
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        await self._simulate()
+        return LLMResponse(content="".join(self.tokens), model=request.model, tokens_used=self._usage(request))
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        await self._simulate()
+        for token in self.tokens:
+            await asyncio.sleep(self.token_delay)
+            yield token
+
+
+def create_openai_adapter() -> ChatCompletionsAdapter:
+    client = openai.AsyncOpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY", ""),
+        http_client=create_http_client("OPENAI", openai.DefaultAsyncHttpxClient),
+        timeout=create_timeout("OPENAI"),
+        max_retries=max_retries("OPENAI")
+    )
+    return ChatCompletionsAdapter("openai", "OpenAI", "OPENAI_API_KEY", [
+        "gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024. do not change this unless explicitly requested by the user
+        "gpt-3.5-turbo"
+    ], client, retryable_errors=(openai.APIConnectionError,))
+
+
+def create_anthropic_adapter() -> AnthropicAdapter:
+    client = anthropic.AsyncAnthropic(
+        api_key=os.environ.get("ANTHROPIC_API_KEY", ""),
+        http_client=create_http_client("ANTHROPIC", anthropic.DefaultAsyncHttpxClient),
+        timeout=create_timeout("ANTHROPIC"),
+        max_retries=max_retries("ANTHROPIC")
+    )
+    return AnthropicAdapter([
+        "claude-3-7-sonnet-20250219",  # the newest Anthropic model is "claude-3-7-sonnet-20250219" which was released February 24, 2025
+        "claude-3-opus-20240229"
+    ], client)
+
+
+def create_groq_adapter() -> ChatCompletionsAdapter:
+    client = groq.AsyncGroq(
+        api_key=os.environ.get("GROQ_API_KEY", ""),
+        http_client=create_http_client("GROQ", groq.DefaultAsyncHttpxClient),
+        timeout=create_timeout("GROQ"),
+        max_retries=max_retries("GROQ")
+    )
+    return ChatCompletionsAdapter("groq", "Groq", "GROQ_API_KEY", [
+        "llama-3.1-8b-instant",
+        "deepseek-r1-distill-qwen-32b"
+    ], client, retryable_errors=(groq.APIConnectionError,))
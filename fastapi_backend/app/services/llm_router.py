@@ -0,0 +1,238 @@
+"""
+Latency-aware routing, circuit breaking and failover for the LLM gateway.
+
+LLMRouter runs innermost in the gateway's middleware chain and records the outcome
+and latency of every upstream attempt per provider/model. A model whose recent
+error rate (over at least LLM_CIRCUIT_MIN_REQUESTS attempts) reaches
+LLM_CIRCUIT_ERROR_RATE, or whose p95 latency exceeds LLM_CIRCUIT_LATENCY_SECONDS,
+gets an open circuit: it receives no requests for LLM_CIRCUIT_OPEN_SECONDS, then one
+probe request decides whether it is closed again.
+
+The gateway asks the router for the candidates of a request: the requested model
+and the equivalents configured in LLM_FALLBACK_MODELS whose circuit is not open.
+A request failing with a retryable error is sent to the next candidate. With
+LLM_HEDGE_AFTER, a request that has not been answered after that many seconds (or
+after the model's p95 latency) is also sent to the next candidate and the first
+answer wins.
+
+Only retryable errors (connection problems, timeouts, 429 and 5xx) count as
+failures; a bad request says nothing about the health of the backend. Cancelled
+attempts, such as the loser of a hedge, are not recorded: their duration is only a
+lower bound, and counting them as fast successes would make a slow model look healthy.
+"""
+import os
+import time
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from contextlib import aclosing
+from .llm_providers import ProviderAdapter
+
+logger = logging.getLogger(__name__)
+
+# Comma separated model=fallback pairs, several fallbacks separated by "|", e.g.
+# "gpt-4o=claude-3-7-sonnet-20250219|llama-3.1-8b-instant,gpt-3.5-turbo=llama-3.1-8b-instant"
+LLM_FALLBACK_MODELS = os.getenv("LLM_FALLBACK_MODELS", "")
+# Recent attempts per model the error rate and latency percentiles are computed over
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", 100))
+LLM_CIRCUIT_MIN_REQUESTS = int(os.getenv("LLM_CIRCUIT_MIN_REQUESTS", 10))
+LLM_CIRCUIT_ERROR_RATE = float(os.getenv("LLM_CIRCUIT_ERROR_RATE", 0.5))
+# p95 latency that opens the circuit (0 disables the latency check)
+LLM_CIRCUIT_LATENCY_SECONDS = float(os.getenv("LLM_CIRCUIT_LATENCY_SECONDS", 0))
+LLM_CIRCUIT_OPEN_SECONDS = float(os.getenv("LLM_CIRCUIT_OPEN_SECONDS", 30))
+# "off", "p95" (the model's rolling p95 latency) or a number of seconds
+LLM_HEDGE_AFTER = os.getenv("LLM_HEDGE_AFTER", "off")
+# Send each request to the candidate with the lowest p50 latency instead of the requested model first
+LLM_ROUTER_PREFER_FASTEST = os.getenv("LLM_ROUTER_PREFER_FASTEST", "false").lower() == "true"
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def parse_fallbacks(value: str) -> Dict[str, List[str]]:
+    """Parse "model=fallback|fallback,model=fallback" into a dict"""
+    fallbacks = {}
+    for pair in value.split(","):
+        if "=" in pair:
+            model, alternatives = pair.split("=", 1)
+            fallbacks[model.strip()] = [alternative.strip() for alternative in alternatives.split("|") if alternative.strip()]
+    return fallbacks
+
+
+class ModelHealth:
+    """Recent attempts and circuit state of one provider/model"""
+
+    def __init__(self, window: int):
+        # (succeeded, seconds) of the most recent attempts
+        self.samples: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self.state = CLOSED
+        self.changed_at = time.monotonic()
+
+    def record(self, succeeded: bool, seconds: float):
+        self.samples.append((succeeded, seconds))
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for succeeded, _ in self.samples if not succeeded) / len(self.samples)
+
+    def latency(self, quantile: float) -> Optional[float]:
+        """Latency quantile of the successful attempts, None without any"""
+        durations = sorted(seconds for succeeded, seconds in self.samples if succeeded)
+        if not durations:
+            return None
+        return durations[min(len(durations) - 1, int(len(durations) * quantile))]
+
+    def set_state(self, state: str):
+        self.state = state
+        self.changed_at = time.monotonic()
+        if state == CLOSED:
+            # Start over so failures from before the outage do not open the circuit again
+            self.samples.clear()
+
+
+class LLMRouter:
+    """
+    Tracks the health of every provider/model and picks the candidates for a request.
+    Its complete and stream hooks are the innermost middleware of the gateway.
+    """
+
+    def __init__(self,
+                 fallbacks: Optional[Dict[str, List[str]]] = None,
+                 window: int = LLM_ROUTER_WINDOW,
+                 min_requests: int = LLM_CIRCUIT_MIN_REQUESTS,
+                 error_rate: float = LLM_CIRCUIT_ERROR_RATE,
+                 latency_threshold: float = LLM_CIRCUIT_LATENCY_SECONDS,
+                 open_seconds: float = LLM_CIRCUIT_OPEN_SECONDS,
+                 hedge_after: str = LLM_HEDGE_AFTER,
+                 prefer_fastest: bool = LLM_ROUTER_PREFER_FASTEST):
+        self.fallbacks = parse_fallbacks(LLM_FALLBACK_MODELS) if fallbacks is None else fallbacks
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.latency_threshold = latency_threshold
+        self.open_seconds = open_seconds
+        self.hedge_after = hedge_after
+        self.prefer_fastest = prefer_fastest
+        self._health: Dict[Tuple[str, str], ModelHealth] = {}
+        self.failovers = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    def health(self, adapter: ProviderAdapter, model: str) -> ModelHealth:
+        key = (adapter.name, model)
+        health = self._health.get(key)
+        if health is None:
+            health = self._health[key] = ModelHealth(self.window)
+        return health
+
+    def available(self, adapter: ProviderAdapter, model: str) -> bool:
+        """
+        Whether the model may receive a request. An open circuit lets one probe
+        through after open_seconds (and another if the probe never reports back).
+        """
+        health = self.health(adapter, model)
+        if health.state == CLOSED:
+            return True
+        if time.monotonic() - health.changed_at < self.open_seconds:
+            return False
+        health.set_state(HALF_OPEN)
+        return True
+
+    def candidates(self, model: str) -> List[str]:
+        """The requested model followed by its configured equivalents"""
+        return [model] + [fallback for fallback in self.fallbacks.get(model, []) if fallback != model]
+
+    def order(self, candidates: List[Tuple[ProviderAdapter, str]]) -> List[Tuple[ProviderAdapter, str]]:
+        """Drop candidates with an open circuit and, with prefer_fastest, put the fastest first"""
+        available = [(adapter, model) for adapter, model in candidates if self.available(adapter, model)]
+        self.rejected += len(candidates) - len(available)
+        if self.prefer_fastest:
+            def p50(candidate):
+                health = self.health(*candidate)
+                median = health.latency(0.5) if len(health.samples) >= self.min_requests else None
+                return float("inf") if median is None else median
+            # Stable sort: models without enough samples keep the configured order
+            available.sort(key=p50)
+        return available
+
+    def hedge_delay(self, adapter: ProviderAdapter, model: str) -> Optional[float]:
+        """Seconds after which a second request is sent, None to never hedge"""
+        if self.hedge_after == "off":
+            return None
+        if self.hedge_after == "p95":
+            health = self.health(adapter, model)
+            return health.latency(0.95) if len(health.samples) >= self.min_requests else None
+        return float(self.hedge_after)
+
+    def _record(self, adapter: ProviderAdapter, model: str, succeeded: bool, seconds: float):
+        health = self.health(adapter, model)
+        health.record(succeeded, seconds)
+        if health.state == HALF_OPEN:
+            health.set_state(CLOSED if succeeded else OPEN)
+            logger.info(f"Circuit for {adapter.name}/{model} {'closed' if succeeded else 'opened again'}")
+            return
+        if health.state != CLOSED or len(health.samples) < self.min_requests:
+            return
+        error_rate = health.error_rate()
+        p95 = health.latency(0.95)
+        if error_rate >= self.error_rate or (self.latency_threshold and p95 and p95 > self.latency_threshold):
+            health.set_state(OPEN)
+            logger.warning(f"Circuit for {adapter.name}/{model} opened: error rate {error_rate:.0%}, "
+                           f"p95 {p95 or 0:.2f}s over the last {len(health.samples)} requests")
+
+    async def complete(self, request, adapter, call_next):
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        except Exception as e:
+            if adapter.is_retryable(e):
+                self._record(adapter, request.model, False, time.perf_counter() - start)
+            raise
+        except BaseException:
+            # Cancelled, e.g. a hedged request that lost; its outcome and latency are unknown
+            self.cancelled += 1
+            raise
+        self._record(adapter, request.model, True, time.perf_counter() - start)
+        return response
+
+    async def stream(self, request, adapter, call_next):
+        # The latency of a stream is its time to first token
+        start = time.perf_counter()
+        latency = None
+        try:
+            async with aclosing(call_next(request)) as tokens:
+                async for token in tokens:
+                    if latency is None:
+                        latency = time.perf_counter() - start
+                    yield token
+        except Exception as e:
+            if adapter.is_retryable(e):
+                self._record(adapter, request.model, False, latency or time.perf_counter() - start)
+            raise
+        except BaseException:
+            # Closed or cancelled before the end, not a sample of the model's health
+            self.cancelled += 1
+            raise
+        self._record(adapter, request.model, True, latency or time.perf_counter() - start)
+
+    def stats(self) -> Dict:
+        models = {}
+        for (provider, model), health in self._health.items():
+            p50, p95 = health.latency(0.5), health.latency(0.95)
+            models[f"{provider}/{model}"] = {
+                "state": health.state,
+                "requests": len(health.samples),
+                "error_rate": round(health.error_rate(), 3),
+                "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 2) if p95 is not None else None
+            }
+        return {
+            "failovers": self.failovers,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "models": models
+        }
@@ -0,0 +1,270 @@
+"""
+Prometheus-style metrics and span timing for the request path.
+
+Counters, gauges and fixed-bucket histograms are kept in process and rendered in
+the Prometheus text format by GET /metrics. Observing a histogram is a bisect and
+two increments under a lock, cheap enough for every request and stage.
+
+`span(stage)` times a stage of the request path (storage operations, document
+loading and splitting, embedding, vectorstore creation, retrieval, the chain): the
+duration goes to the stage_duration_seconds histogram and to stage_timings. With
+OTEL_ENABLED, every span (and every HTTP request and provider call) is also an
+OpenTelemetry span, exported over OTLP if OTEL_EXPORTER_OTLP_ENDPOINT is set and
+opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http are installed.
+"""
+import os
+import time
+import asyncio
+import logging
+import functools
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from .stage_timings import stage_timings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the latency histogram buckets
+METRICS_LATENCY_BUCKETS = [
+    float(bound) for bound in os.getenv("METRICS_LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60").split(",")
+]
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ai-assistant-api")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # A counter without labels is exported as 0 before its first increment
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values]
+
+
+class Gauge(_Metric):
+    """
+    Current value per label set, either set directly or read from `callback` when
+    rendered. The callback returns {label values tuple: value}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self.callback:
+            values.update(self.callback())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """Counts of observations per bucket, plus their sum and count, per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = METRICS_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = sorted(buckets)
+        # label values -> [count per bucket (the last one is +Inf), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float("inf")], counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics rendered together by GET /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception:
+                logger.warning(f"Collecting metric {metric.name} failed", exc_info=True)
+        return "\n".join(blocks) + "\n"
+
+
+def _create_tracer():
+    """OpenTelemetry tracer if OTEL_ENABLED, exporting over OTLP when an endpoint is configured"""
+    if not OTEL_ENABLED:
+        return None
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logger.warning("OTEL_ENABLED is set but opentelemetry-api is not installed, tracing is off")
+        return None
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(provider)
+        except ImportError:
+            logger.warning("Exporting spans needs opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http")
+    return trace.get_tracer(OTEL_SERVICE_NAME)
+
+
+tracer = _create_tracer()
+
+
+def trace_span(name: str, **attributes):
+    """OpenTelemetry span (a no-op context without OTEL_ENABLED)"""
+    if tracer is None:
+        return nullcontext()
+    return tracer.start_as_current_span(name, attributes={key: str(value) for key, value in attributes.items()})
+
+
+def record_stage(stage: str, seconds: float):
+    """Record a stage duration measured elsewhere"""
+    stage_duration.observe(seconds, stage=stage)
+    stage_timings.record(stage, seconds)
+
+
+@contextmanager
+def span(stage: str, **attributes) -> Iterator[None]:
+    """Time the body of the with block as a stage of the request path, also when it raises"""
+    start = time.perf_counter()
+    with trace_span(stage, **attributes):
+        try:
+            yield
+        finally:
+            record_stage(stage, time.perf_counter() - start)
+
+
+def traced(stage: str):
+    """Decorator timing every call of a function (sync or async) as a stage"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Initialize global metrics registry and the metrics of the request path
+metrics = MetricsRegistry()
+http_requests = metrics.counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_request_duration = metrics.histogram("http_request_duration_seconds", "HTTP request duration, response body included", ("method", "route"))
+stage_duration = metrics.histogram("stage_duration_seconds", "Duration of request path stages", ("stage",))
+llm_requests = metrics.counter("llm_requests_total", "Upstream LLM requests by outcome", ("provider", "model", "outcome"))
+llm_request_duration = metrics.histogram("llm_request_duration_seconds", "Upstream LLM request duration", ("provider", "model"))
+llm_time_to_first_token = metrics.histogram("llm_time_to_first_token_seconds", "Time to the first streamed token", ("provider", "model"))
+llm_tokens = metrics.counter("llm_tokens_total", "Tokens sent (prompt) and received (completion)", ("provider", "model", "direction"))
+embedding_texts = metrics.counter("embedding_texts_total", "Texts embedded by the embedding pipeline, embedding cache hits included")
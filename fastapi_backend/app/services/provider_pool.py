@@ -0,0 +1,61 @@
+"""
+Shared connection pool and concurrency settings for the LLM provider services.
+Each provider gets one long-lived async HTTP client and one semaphore so a single
+worker can keep many completions in flight without opening a socket per request.
+"""
+import os
+import asyncio
+import httpx
+
+# Defaults used when neither a provider specific nor a global setting is present
+DEFAULT_MAX_CONNECTIONS = 200
+DEFAULT_MAX_KEEPALIVE = 50
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_MAX_CONCURRENCY = 100
+DEFAULT_MAX_RETRIES = 2
+
+
+def provider_setting(provider: str, name: str, default, cast=str):
+    """
+    Read a setting for a provider from the environment.
+
+    Looks up {PROVIDER}_{NAME} first (e.g. OPENAI_MAX_CONCURRENCY), then the
+    global LLM_{NAME}, and falls back to the given default.
+    """
+    value = os.getenv(f"{provider.upper()}_{name}", os.getenv(f"LLM_{name}"))
+    if value is None or value == "":
+        return default
+    return cast(value)
+
+
+def create_http_client(provider: str, client_class=httpx.AsyncClient) -> httpx.AsyncClient:
+    """
+    Create the pooled async HTTP client shared by all requests to a provider.
+    Pass the SDK's DefaultAsyncHttpxClient as client_class to keep the SDK defaults.
+    """
+    limits = httpx.Limits(
+        max_connections=provider_setting(provider, "MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS, int),
+        max_keepalive_connections=provider_setting(provider, "MAX_KEEPALIVE", DEFAULT_MAX_KEEPALIVE, int),
+        keepalive_expiry=provider_setting(provider, "KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY, float),
+    )
+    return client_class(limits=limits, timeout=create_timeout(provider))
+
+
+def create_timeout(provider: str) -> httpx.Timeout:
+    """Request timeout for a provider (total read timeout plus a shorter connect timeout)"""
+    return httpx.Timeout(
+        provider_setting(provider, "TIMEOUT", DEFAULT_TIMEOUT, float),
+        connect=provider_setting(provider, "CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT, float),
+    )
+
+
+def create_semaphore(provider: str) -> asyncio.Semaphore:
+    """Semaphore bounding the number of in-flight requests to a provider"""
+    return asyncio.Semaphore(provider_setting(provider, "MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY, int))
+
+
+def max_retries(provider: str) -> int:
+    """Number of SDK level retries for a provider"""
+    return provider_setting(provider, "MAX_RETRIES", DEFAULT_MAX_RETRIES, int)
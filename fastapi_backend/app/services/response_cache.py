@@ -0,0 +1,175 @@
+"""
+Response cache for error decoding.
+
+CI systems send the same stack traces over and over with only paths, line numbers,
+memory addresses and timestamps changing. Responses are cached under the error text
+with those details normalized away, plus the language and model. An optional
+similarity tier also serves near-duplicate traces: each cached error is embedded
+with the local HashingEmbeddings, and a lookup that misses the exact tier is matched
+by cosine similarity. Entries expire after a TTL and the least recently used entries
+are evicted once the cache is full.
+"""
+import os
+import re
+import copy
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+import numpy as np
+from app.logic.local_embeddings import HashingEmbeddings
+
+ERROR_CACHE_ENABLED = os.getenv("ERROR_CACHE_ENABLED", "true").lower() == "true"
+ERROR_CACHE_MAX_ENTRIES = int(os.getenv("ERROR_CACHE_MAX_ENTRIES", 10000))
+ERROR_CACHE_TTL_SECONDS = float(os.getenv("ERROR_CACHE_TTL_SECONDS", 86400))
+# Minimum cosine similarity for a near-duplicate hit, 0 disables the similarity tier
+ERROR_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ERROR_CACHE_SIMILARITY_THRESHOLD", 0))
+
+# Applied in order; UUIDs and paths go first so line numbers and timestamps inside them are removed too
+NORMALIZATION_PATTERNS = [
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.I), "<uuid>"),
+    (re.compile(r"(?:[A-Za-z]:)?(?:[\\/][\w.\-@+~]*)+[\\/]([\w.\-]+)"), r"<path>/\1"),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<timestamp>"),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), "<time>"),
+    (re.compile(r"\b0x[0-9a-f]+\b", re.I), "<address>"),
+    (re.compile(r"\b(line|ln|col|column)\s*:?\s*\d+", re.I), r"\1 <n>"),
+    (re.compile(r"(\.\w+):\d+(?::\d+)?"), r"\1:<n>"),
+]
+
+
+def normalize_error(text: str) -> str:
+    """Strip details that differ between occurrences of the same error"""
+    for pattern, replacement in NORMALIZATION_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return " ".join(text.split())
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "slot")
+
+    def __init__(self, value: Dict[str, Any], expires_at: float, slot: Optional[int]):
+        self.value = value
+        self.expires_at = expires_at
+        self.slot = slot
+
+
+class ResponseCache:
+    """Exact and, optionally, similarity based cache of AI responses with TTL and LRU eviction"""
+
+    def __init__(self,
+                 max_entries: int = ERROR_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = ERROR_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = ERROR_CACHE_SIMILARITY_THRESHOLD,
+                 embeddings: Optional[HashingEmbeddings] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+        if similarity_threshold > 0:
+            self.embeddings = embeddings or HashingEmbeddings()
+            # One row per cache slot, so a lookup is a single matrix-vector product
+            self.vectors = np.zeros((max_entries, self.embeddings.dimensions), dtype=np.float32)
+            self.slot_keys = [None] * max_entries
+            self.slot_groups = np.zeros(max_entries, dtype=np.int64)
+            self.slot_used = np.zeros(max_entries, dtype=bool)
+            self.free_slots = list(range(max_entries - 1, -1, -1))
+        else:
+            self.embeddings = None
+
+    async def get_or_compute(self,
+                             error_message: str,
+                             language: Optional[str],
+                             model: str,
+                             compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Return the cached response for an error, calling compute() on a miss"""
+        normalized = normalize_error(error_message)
+        group_name = f"{language or ''}\x00{model}"
+        key = hashlib.sha256(f"{group_name}\x00{normalized}".encode("utf-8")).hexdigest()
+        group = int.from_bytes(hashlib.blake2b(group_name.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+        entry = self._get(key)
+        if entry is not None:
+            self.exact_hits += 1
+            return copy.deepcopy(entry.value)
+
+        vector = None
+        if self.embeddings is not None:
+            vector = np.asarray(self.embeddings.embed_query(normalized), dtype=np.float32)
+            entry = self._get_similar(vector, group)
+            if entry is not None:
+                self.similar_hits += 1
+                return copy.deepcopy(entry.value)
+
+        self.misses += 1
+        value = await compute()
+        # Failures (including a missing API key) are not cached so the next request retries the provider.
+        # Callers get their own copies, so mutating a response can't change the cached one.
+        if not value.get("error"):
+            self._put(key, copy.deepcopy(value), vector, group)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters since startup"""
+        hits = self.exact_hits + self.similar_hits
+        total = hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0
+        }
+
+    def clear(self):
+        for key in list(self.entries):
+            self._remove(key)
+
+    def _get(self, key: str) -> Optional[_Entry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _get_similar(self, vector: np.ndarray, group: int) -> Optional[_Entry]:
+        if not self.entries:
+            return None
+        # Vectors are L2-normalized, so the dot product is the cosine similarity
+        scores = self.vectors @ vector
+        scores[~self.slot_used | (self.slot_groups != group)] = -1.0
+        slot = int(np.argmax(scores))
+        if scores[slot] < self.similarity_threshold:
+            return None
+        return self._get(self.slot_keys[slot])
+
+    def _put(self, key: str, value: Dict[str, Any], vector: Optional[np.ndarray], group: int):
+        if key in self.entries:
+            self._remove(key)
+        while len(self.entries) >= self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+        slot = None
+        if vector is not None:
+            slot = self.free_slots.pop()
+            self.vectors[slot] = vector
+            self.slot_keys[slot] = key
+            self.slot_groups[slot] = group
+            self.slot_used[slot] = True
+        self.entries[key] = _Entry(value, time.monotonic() + self.ttl_seconds, slot)
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key)
+        if entry.slot is not None:
+            self.slot_used[entry.slot] = False
+            self.slot_keys[entry.slot] = None
+            self.free_slots.append(entry.slot)
+
+# Initialize global error decoder cache
+error_decoder_cache = ResponseCache()
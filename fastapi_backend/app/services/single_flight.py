@@ -0,0 +1,141 @@
+"""
+Single-flight coalescing of identical provider requests.
+
+When several callers make the same request (same method, model and arguments) while
+one is already in flight, they wait for that request instead of sending their own.
+Streamed responses are fanned out the same way: every subscriber receives all tokens
+from the start, including tokens produced before it joined.
+
+The upstream call runs in its own task, so one caller disconnecting does not affect
+the others. It is cancelled only when every caller has gone away, which also closes
+the upstream stream.
+"""
+import os
+import json
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+
+def request_key(*parts: Any) -> str:
+    """Stable key for a request from its method, model and arguments"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """Runs one token stream and replays it to any number of subscribers"""
+
+    def __init__(self, tokens: AsyncIterator[str]):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run(tokens))
+
+    async def _run(self, tokens: AsyncIterator[str]):
+        try:
+            async for token in tokens:
+                self.tokens.append(token)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            # Close the upstream generator, also when the broadcast is cancelled
+            aclose = getattr(tokens, "aclose", None)
+            if aclose:
+                await aclose()
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            if position < len(self.tokens):
+                position += 1
+                yield self.tokens[position - 1]
+            elif self.done:
+                if self.error:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls and streams within one event loop"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Return func()'s result, sharing one call among all concurrent callers with the same key"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+            self.upstream_calls += 1
+        else:
+            self.coalesced_calls += 1
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(self._calls, key, call)
+                call.task.cancel()
+        # Each caller gets its own copy of a dict response
+        return dict(result) if isinstance(result, dict) else result
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Yield the tokens of factory()'s stream, shared among all concurrent subscribers with the same key"""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast(factory())
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._forget(self._streams, key, broadcast))
+            self.upstream_calls += 1
+        else:
+            self.coalesced_calls += 1
+
+        broadcast.subscribers += 1
+        try:
+            async for token in broadcast.subscribe():
+                yield token
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                # Nobody is listening any more, stop the upstream stream
+                self._forget(self._streams, key, broadcast)
+                broadcast.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "upstream_calls": self.upstream_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "in_flight": len(self._calls) + len(self._streams)
+        }
+
+    @staticmethod
+    def _forget(registry: Dict[str, Any], key: str, entry: Any):
+        if registry.get(key) is entry:
+            del registry[key]
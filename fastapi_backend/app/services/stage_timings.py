@@ -0,0 +1,61 @@
+"""
+Per-stage latency recording.
+
+Request handlers time named stages (query rewrite, retrieval, answer generation, ...)
+with `stage_timings.time(stage)`. The most recent STAGE_TIMINGS_WINDOW durations of
+each stage are kept to report count, mean and percentiles without unbounded memory.
+"""
+import os
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator
+
+STAGE_TIMINGS_WINDOW = int(os.getenv("STAGE_TIMINGS_WINDOW", 1000))
+
+
+class StageTimings:
+    """Recent durations of named request stages"""
+
+    def __init__(self, window: int = STAGE_TIMINGS_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples[stage].append(seconds)
+            self._counts[stage] += 1
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Record how long the body of the with block takes, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count of every stage plus mean, p50, p95 and max in milliseconds over the recent window"""
+        with self._lock:
+            samples = {stage: sorted(durations) for stage, durations in self._samples.items()}
+            counts = dict(self._counts)
+
+        summary = {}
+        for stage, durations in samples.items():
+            if not durations:
+                continue
+            summary[stage] = {
+                "count": counts[stage],
+                "mean_ms": round(sum(durations) / len(durations) * 1000, 2),
+                "p50_ms": round(durations[len(durations) // 2] * 1000, 2),
+                "p95_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000, 2),
+                "max_ms": round(durations[-1] * 1000, 2)
+            }
+        return summary
+
+# Initialize global stage timings
+stage_timings = StageTimings()
@@ -1,36 +1,50 @@
 from typing import Dict, List, Optional
 import os
-import shutil
+import hashlib
 from datetime import datetime
 import uuid
 from app.models.schemas import Message, Conversation, FileMetadata
+from app.services.conversation_store import ConversationStore, create_conversation_store
+from app.services.metrics import traced
 
-# In-memory storage for development
-# In production, you would use a proper database
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 50 * 1024 * 1024))
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the maximum allowed size"""
+
+# Conversations go to the backend selected by CONVERSATION_STORE,
+# file metadata is kept in memory
 class Storage:
-    def __init__(self, upload_dir: str = "uploads"):
-        self.conversations: Dict[str, List[Message]] = {}
+    def __init__(self, upload_dir: str = "uploads", conversation_store: Optional[ConversationStore] = None):
+        self.conversations = conversation_store or create_conversation_store()
         self.files: Dict[str, FileMetadata] = {}
         self.upload_dir = upload_dir
-        os.makedirs(upload_dir, exist_ok=True)
+        self.blob_dir = os.path.join(upload_dir, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
     
-    def get_conversation(self, conversation_id: str) -> Optional[List[Message]]:
-        """Get a conversation by ID"""
-        return self.conversations.get(conversation_id)
+    @traced("storage.get_conversation")
+    def get_conversation(self, conversation_id: str, limit: Optional[int] = None, offset: int = 0) -> Optional[List[Message]]:
+        """
+        Get a conversation by ID. With a limit, only the last `limit` messages
+        (skipping the newest `offset`) are returned, in chronological order.
+        """
+        return self.conversations.get_messages(conversation_id, limit=limit, offset=offset)
     
+    @traced("storage.create_conversation")
     def create_conversation(self, conversation_id: Optional[str] = None) -> str:
         """Create a new conversation"""
         if conversation_id is None:
             conversation_id = str(uuid.uuid4())
         
-        if conversation_id not in self.conversations:
-            self.conversations[conversation_id] = []
-        
+        self.conversations.create_conversation(conversation_id)
         return conversation_id
     
+    @traced("storage.add_message")
     def add_message(self, conversation_id: str, role: str, content: str) -> Message:
         """Add a message to a conversation"""
-        if conversation_id not in self.conversations:
+        if not self.conversations.exists(conversation_id):
             self.create_conversation(conversation_id)
         
         message = Message(
@@ -40,20 +54,56 @@ class Storage:
             timestamp=datetime.now().isoformat()
         )
         
-        self.conversations[conversation_id].append(message)
+        self.conversations.append_message(conversation_id, message)
         return message
     
-    def save_file(self, file_obj, filename: str, content_type: str) -> str:
-        """Save an uploaded file and return the file ID"""
+    @traced("storage.save_file")
+    def save_file(self, file_obj, filename: str, content_type: str, max_size: Optional[int] = None) -> str:
+        """
+        Save an uploaded file and return the file ID.
+
+        The content is hashed while it streams to disk and stored once per SHA-256
+        digest under {upload_dir}/blobs, so repeated uploads of the same file share
+        one blob. Raises UploadTooLargeError as soon as more than max_size bytes are read.
+        """
+        max_size = MAX_UPLOAD_SIZE if max_size is None else max_size
         file_id = str(uuid.uuid4())
-        file_path = os.path.join(self.upload_dir, f"{file_id}_{filename}")
-        
-        # Save the file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file_obj, buffer)
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
+        tmp_path = os.path.join(self.blob_dir, f".upload-{file_id}")
+        digest = hashlib.sha256()
+        file_size = 0
+
+        # Reuse one buffer for the whole copy instead of allocating a bytes object per chunk
+        buffer = bytearray(COPY_CHUNK_SIZE)
+        view = memoryview(buffer)
+        readinto = getattr(file_obj, "readinto", None)
+        try:
+            with open(tmp_path, "wb") as out:
+                while True:
+                    if readinto:
+                        read = readinto(buffer)
+                    else:
+                        chunk = file_obj.read(COPY_CHUNK_SIZE)
+                        read = len(chunk)
+                        buffer[:read] = chunk
+                    if not read:
+                        break
+                    file_size += read
+                    if max_size and file_size > max_size:
+                        raise UploadTooLargeError(f"File exceeds the maximum upload size of {max_size} bytes")
+                    digest.update(view[:read])
+                    out.write(view[:read])
+
+            sha256 = digest.hexdigest()
+            file_path = os.path.join(self.blob_dir, sha256)
+            if os.path.exists(file_path):
+                # Same content was uploaded before, keep the existing blob
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
         
         # Store file metadata
         self.files[file_id] = FileMetadata(
@@ -61,7 +111,8 @@ class Storage:
             path=file_path,
             uploaded_at=datetime.now().isoformat(),
             size=file_size,
-            content_type=content_type
+            content_type=content_type,
+            sha256=sha256
         )
         
         return file_id
@@ -1,4 +1,4 @@
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 def convert_to_langchain_messages(history):
     messages = []
@@ -7,4 +7,6 @@ def convert_to_langchain_messages(history):
             messages.append(HumanMessage(content=msg.content))
         elif msg.role == "assistant":
             messages.append(AIMessage(content=msg.content))
+        elif msg.role == "system":
+            messages.append(SystemMessage(content=msg.content))
     return messages
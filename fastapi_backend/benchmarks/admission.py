@@ -0,0 +1,130 @@
+"""
+Overload test of admission control on /chat.
+
+Runs the FastAPI app in-process with the fake provider adapter standing in for the
+LLM. The fake provider slows down as more requests are in flight than its capacity
+and answers 429 beyond twice that. Requests arrive at a fixed rate above what the
+provider can serve, half of them from one noisy tenant and the rest from nine
+others (X-API-Key). The run is repeated with admission control off and on, and
+reports answered requests, provider errors, fast rejections (429 rate limited,
+503 busy) and latency percentiles.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.admission --rate 200 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ["LLM_FAKE_PROVIDER_ENABLED"] = "true"
+os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+
+from app.services.llm_providers import FakeAdapter, FakeProviderError
+
+TENANTS = 10
+
+
+class SaturatingAdapter(FakeAdapter):
+    """Fake provider whose latency grows past `capacity` requests in flight and that answers 429 past twice that"""
+
+    def __init__(self, latency: float, capacity: int):
+        super().__init__(latency=latency)
+        self.capacity = capacity
+        self.rejected = 0
+
+    async def _simulate(self):
+        if self.in_flight >= 2 * self.capacity:
+            self.rejected += 1
+            error = FakeProviderError("Rate limit reached")
+            error.status_code = 429
+            raise error
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency * max(1.0, self.in_flight / self.capacity))
+        finally:
+            self.in_flight -= 1
+
+
+def percentile(values, quantile: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * quantile))]
+
+
+async def run(client, rate: float, seconds: float):
+    results = []
+
+    async def one(i: int):
+        tenant = 0 if i % 2 == 0 else 1 + i % (TENANTS - 1)
+        start = time.perf_counter()
+        response = await client.post("/chat", json={"message": f"Question {i}", "model": "fake-model"},
+                                     headers={"X-API-Key": f"tenant-{tenant}"})
+        elapsed = time.perf_counter() - start
+        if response.status_code == 200:
+            outcome = "error" if response.json()["content"].startswith("Error") else "ok"
+        else:
+            outcome = str(response.status_code)
+        results.append((tenant, outcome, elapsed))
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        tasks.append(asyncio.create_task(one(i)))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def report(label: str, results):
+    ok = [elapsed for _, outcome, elapsed in results if outcome == "ok"]
+    rejected = [elapsed for _, outcome, elapsed in results if outcome in ("429", "503")]
+    count = lambda outcome: sum(1 for _, o, _ in results if o == outcome)
+    quiet = [outcome for tenant, outcome, _ in results if tenant != 0]
+    quiet_ok = sum(1 for outcome in quiet if outcome == "ok") / max(1, len(quiet))
+    print(f"{label:<10} {len(results):>8} {len(ok):>6} {count('error'):>7} {count('429'):>5} {count('503'):>5} "
+          f"{percentile(ok, 0.5) * 1000:>7.0f} {percentile(ok, 0.99) * 1000:>7.0f} "
+          f"{percentile(rejected, 0.5) * 1000:>12.1f} {quiet_ok:>12.0%}")
+
+
+async def main(args):
+    import httpx
+    from main import app
+    from app.services.ai_service import ai_service
+    from app.services.admission import admission_controller, AdmissionQueue, ClientRateLimiter
+
+    # Without a router a failing provider can't be taken out of rotation, which isolates admission control
+    ai_service.gateway.router = None
+    transport = httpx.ASGITransport(app=app)
+    print(f"{args.rate:.0f} requests/s for {args.seconds:.0f} s; provider serves {args.capacity} at a time in "
+          f"{args.latency * 1000:.0f} ms (~{args.capacity / args.latency:.0f} requests/s) and answers 429 past "
+          f"{2 * args.capacity} in flight")
+    print(f"{'admission':<10} {'requests':>8} {'ok':>6} {'errors':>7} {'429':>5} {'503':>5} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'reject p50 ms':>12} {'quiet tenants ok':>12}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for enabled in (False, True):
+            adapter = SaturatingAdapter(args.latency, args.capacity)
+            ai_service.gateway.adapters["fake"] = adapter
+            admission_controller.enabled = enabled
+            admission_controller.queue = AdmissionQueue(args.capacity, args.max_queue, args.queue_timeout)
+            admission_controller.limiter = ClientRateLimiter(args.client_rate, int(args.client_rate))
+            results = await run(client, args.rate, args.seconds)
+            report("on" if enabled else "off", results)
+        print(f"Peak queue depth {admission_controller.queue.max_queued}, "
+              f"queue wait {admission_controller.stats()['queue_wait']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and errors under overload with and without admission control")
+    parser.add_argument("--rate", type=float, default=200, help="Offered requests per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--latency", type=float, default=0.2, help="Provider latency in seconds when not saturated")
+    parser.add_argument("--capacity", type=int, default=20, help="Requests the provider serves at full speed")
+    parser.add_argument("--max-queue", type=int, default=40)
+    parser.add_argument("--queue-timeout", type=float, default=1.0)
+    parser.add_argument("--client-rate", type=float, default=15, help="Requests per second allowed per tenant")
+    asyncio.run(main(parser.parse_args()))
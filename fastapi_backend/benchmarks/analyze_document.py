@@ -0,0 +1,75 @@
+"""
+Benchmark of the document content put into analyze_document prompts.
+
+Compares the previous approach, decoding the raw file as UTF-8 and keeping the first
+12000 characters, with retrieving the chunks relevant to each query from the
+document's index. Reports prompt tokens, the time to build the content (the first
+query includes parsing and indexing the document) and whether the clause a query
+asks about made it into the prompt. Runs fully offline with the local hashing
+embeddings and temporary index directories.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.analyze_document --pages 200 --queries 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+TRUNCATE_CHARS = 12000
+
+
+def truncated_content(file_path: str) -> str:
+    """Document content as analyze_document built it before retrieval"""
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        document_text = f.read()
+    if len(document_text) > TRUNCATE_CHARS:
+        document_text = document_text[:TRUNCATE_CHARS] + "...[truncated]"
+    return document_text
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "indexes")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "embeddings.sqlite3")
+
+    # Imported after the environment is configured so the stores use the temporary directories
+    from benchmarks.synthetic_pdf import synthetic_pdf
+    from app.logic.document_retrieval import DocumentRetriever
+    from app.services.context_window import TokenCounter
+
+    path = synthetic_pdf(os.path.join(tmp, "pdfs"), args.pages)
+    counter = TokenCounter()
+    retriever = DocumentRetriever(k=args.k)
+    rng = random.Random(0)
+
+    print(f"{args.pages} page PDF ({os.path.getsize(path) / 1024:.0f} KB), {args.k} chunks per query")
+    print(f"{'query':>6} {'method':>10} {'ms':>9} {'prompt tokens':>14} {'clause found':>13}")
+    for i in range(args.queries):
+        page, line = rng.randint(1, args.pages), rng.randint(0, 39)
+        clause = f"clause {page}.{line} "
+        query = f"What does clause {page}.{line} on page {page} say?"
+
+        for method in ("truncate", "retrieve"):
+            start = time.perf_counter()
+            if method == "truncate":
+                content = await asyncio.to_thread(truncated_content, path)
+            else:
+                content = await retriever.retrieve(path, query)
+            elapsed = (time.perf_counter() - start) * 1000
+            prompt = f"Document content:\n\n{content}\n\nUser query: {query}"
+            print(f"{i + 1:>6} {method:>10} {elapsed:>9.1f} {counter.count(prompt, args.model):>14} "
+                  f"{'yes' if clause in content else 'no':>13}")
+    print(f"indexes built: {retriever.indexes_built}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt size and latency of document truncation vs retrieval")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--k", type=int, default=6, help="Chunks retrieved per query")
+    parser.add_argument("--model", default="gpt-4o", help="Model whose tokenizer counts prompt tokens")
+    asyncio.run(main(parser.parse_args()))
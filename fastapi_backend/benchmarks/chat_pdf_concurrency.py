@@ -0,0 +1,116 @@
+"""
+Concurrency benchmark of /chat-pdf on a single worker.
+
+Runs the FastAPI app in-process against the local fake provider (the LLM gateway's
+Groq client is pointed at it; the provider has its own thread and event loop, so a
+blocked app loop cannot stall it) and sends many simultaneous PDF chats, each a first
+question and a follow-up that needs a query rewrite. Reports throughput, request
+latency and the worst event loop stall seen by a heartbeat task. (The chain's chat
+model goes through the async LLM gateway, so the old handler, calling the synchronous
+chain.invoke on the event loop, can no longer be replayed.)
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.chat_pdf_concurrency --latency 0.2 --conversations 1 10 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.fake_provider import FakeProvider
+from benchmarks.provider_throughput import configure_environment
+
+QUESTIONS = ["What does clause 3.4 say about payment terms?", "Why?"]
+
+
+class ProviderThread:
+    """Fake provider served from its own event loop on a background thread"""
+
+    def __init__(self, latency: float):
+        self.provider = FakeProvider(latency=latency)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self) -> FakeProvider:
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.provider.start(), self.loop).result()
+        return self.provider
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.provider.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+async def heartbeat(stalls: list, interval: float = 0.01):
+    """Record how late the event loop wakes up a task sleeping for `interval`"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - start - interval)
+
+
+async def run(client, conversations: int, label: str):
+    latencies, stalls = [], []
+
+    async def chat(conversation_id: str):
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            response = await client.post("/chat-pdf", json={"message": question, "conversation_id": conversation_id})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    beat = asyncio.create_task(heartbeat(stalls))
+    start = time.perf_counter()
+    await asyncio.gather(*(chat(f"{label}-{conversations}-{i}") for i in range(conversations)))
+    elapsed = time.perf_counter() - start
+    beat.cancel()
+    return len(latencies) / elapsed, statistics.median(latencies), max(latencies), max(stalls, default=0)
+
+
+async def main(args):
+    provider_thread = ProviderThread(args.latency)
+    provider = provider_thread.start()
+    configure_environment(provider.base_url)
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "indexes")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "embeddings.sqlite3")
+
+    # Imported after the environment is configured so the clients and stores use the fake provider and temporary directories
+    import httpx
+    from langchain_core.documents import Document
+    from main import app
+    from app.logic.conversation_retrieval import create_db
+    from app.services.index_store import index_store
+
+    index_store.save("benchmark", create_db([
+        Document(page_content=f"Clause {section}.{line}: payment is due within {line * 10} days.")
+        for section in range(1, 20) for line in range(10)
+    ]))
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            print(f"Fake provider latency {args.latency * 1000:.0f} ms, {len(QUESTIONS)} questions per conversation")
+            print(f"{'conversations':>13} {'req/s':>7} {'p50 ms':>7} {'max ms':>7} "
+                  f"{'max loop stall ms':>18} {'peak LLM in-flight':>19}")
+            for conversations in args.conversations:
+                for i in range(conversations):
+                    index_store.link_conversation(f"chat-{conversations}-{i}", index_key="benchmark", status="ready")
+                provider.max_in_flight = 0
+                throughput, p50, worst, stall = await run(client, conversations, "chat")
+                print(f"{conversations:>13} {throughput:>7.1f} {p50 * 1000:>7.0f} {worst * 1000:>7.0f} "
+                      f"{stall * 1000:>18.0f} {provider.max_in_flight:>19}")
+    finally:
+        provider_thread.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simultaneous /chat-pdf conversations on one worker")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated provider latency in seconds")
+    parser.add_argument("--conversations", type=int, nargs="+", default=[1, 10, 50])
+    asyncio.run(main(parser.parse_args()))
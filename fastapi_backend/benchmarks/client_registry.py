@@ -0,0 +1,144 @@
+"""
+Benchmark of per-upload chain setup with and without the shared client registry.
+
+For every simulated upload a chain is set up for a separate vectorstore and one
+question is answered through it, via the LLM gateway pointed at the local fake
+provider. The previous setup, a new ChatGroq and new prompt templates per upload,
+is replayed for comparison. Reports setup time per upload and the TCP connections to the
+provider opened and left open by each run, plus the cost of creating a Gemini embeddings client,
+which also used to happen per upload. Runs fully offline.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.client_registry --uploads 50
+"""
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.chat_pdf_concurrency import ProviderThread
+from benchmarks.provider_throughput import configure_environment
+
+ESTABLISHED = "01"
+
+
+def open_connections(port: int) -> int:
+    """Established TCP connections from this process to a local port"""
+    count = 0
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if int(fields[2].rsplit(":", 1)[1], 16) == port and fields[3] == ESTABLISHED:
+                        count += 1
+        except FileNotFoundError:
+            pass
+    return count
+
+
+def legacy_setup(vectorstore, keyword_index):
+    """Chain and embeddings setup as done per upload before the registry"""
+    from langchain.chains import create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from langchain_groq import ChatGroq
+    from app.logic.conversation_retrieval import SYSTEM_PROMPT, RETRIEVAL_CHAT_MODEL
+    from app.logic.hybrid_retrieval import create_retriever
+    from app.logic.query_rewrite import query_rewriter
+
+    llm = ChatGroq(model=RETRIEVAL_CHAT_MODEL)
+    response_prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT), MessagesPlaceholder(variable_name="chat_history"), ("user", "{input}")
+    ])
+    retriever_prompt = ChatPromptTemplate.from_messages([
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("user", "{input}"),
+        ("user", "Given the above conversation, generate a search query to retrieve relevant context.")
+    ])
+    context = query_rewriter.as_retriever(llm=llm, prompt=retriever_prompt,
+                                          retriever=create_retriever(vectorstore, keyword_index))
+    return create_retrieval_chain(context, create_stuff_documents_chain(llm=llm, prompt=response_prompt))
+
+
+def registry_setup(vectorstore, keyword_index):
+    """Chain and embeddings setup through the shared client registry"""
+    from app.logic.conversation_retrieval import create_chain
+
+    return create_chain(vectorstore, keyword_index)
+
+
+def embeddings_client_ms(samples: int = 10) -> float:
+    """Time to create the Gemini embeddings client (no request is sent)"""
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    from app.logic.client_registry import GOOGLE_EMBEDDING_MODEL
+
+    GoogleGenerativeAIEmbeddings(model=GOOGLE_EMBEDDING_MODEL)
+    start = time.perf_counter()
+    for _ in range(samples):
+        GoogleGenerativeAIEmbeddings(model=GOOGLE_EMBEDDING_MODEL)
+    return (time.perf_counter() - start) / samples * 1000
+
+
+async def run(name, setup, indexes, port):
+    from app.logic.conversation_retrieval import process_chat
+
+    baseline = open_connections(port)
+    setup_times = []
+    for vectorstore, keyword_index in indexes:
+        start = time.perf_counter()
+        chain = setup(vectorstore, keyword_index)
+        setup_times.append(time.perf_counter() - start)
+        await process_chat(chain, "What does clause 3.4 say about payment terms?", [])
+        del chain
+    # Count what a long-running worker would keep: connections of clients that are unreachable but not yet collected
+    connections = open_connections(port) - baseline
+    gc.collect()
+    print(f"{name:>10} {statistics.mean(setup_times) * 1000:>9.2f} {max(setup_times) * 1000:>8.2f} "
+          f"{connections:>17} {open_connections(port) - baseline:>16}")
+
+
+async def main(args):
+    provider_thread = ProviderThread(args.latency)
+    provider = provider_thread.start()
+    configure_environment(provider.base_url)
+    os.environ["GROQ_API_BASE"] = provider.base_url
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "indexes")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "embeddings.sqlite3")
+
+    # Imported after the environment is configured so the clients and stores use the fake provider and temporary directories
+    from langchain_core.documents import Document
+    from app.logic.conversation_retrieval import create_db
+    from app.services.llm_gateway import llm_gateway
+    from app.logic.hybrid_retrieval import KeywordIndex
+
+    indexes = []
+    for upload in range(args.uploads):
+        vectorstore = create_db([
+            Document(page_content=f"Upload {upload} clause {section}.{line}: payment is due within {line * 10} days.")
+            for section in range(1, 5) for line in range(10)
+        ])
+        indexes.append((vectorstore, KeywordIndex.from_vectorstore(vectorstore)))
+
+    try:
+        print(f"{args.uploads} uploads, one question each, fake provider latency {args.latency * 1000:.0f} ms")
+        print(f"{'setup':>10} {'mean ms':>9} {'max ms':>8} {'open connections':>17} {'after gc.collect':>16}")
+        await run("per upload", legacy_setup, indexes, provider.port)
+        await run("registry", registry_setup, indexes, provider.port)
+        print(f"Gemini embeddings client: {embeddings_client_ms():.2f} ms per upload before, created once per process now")
+    finally:
+        await llm_gateway.aclose()
+        provider_thread.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-upload chain setup time and open provider connections")
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated provider latency in seconds")
+    asyncio.run(main(parser.parse_args()))
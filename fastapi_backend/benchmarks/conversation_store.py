@@ -0,0 +1,77 @@
+"""
+Benchmark of the conversation store backends.
+
+Appends messages round-robin across many conversations, one transaction per
+message as the chat routes do, then measures the latency of reading the last N
+messages of random conversations compared with reading them in full.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.conversation_store --messages 1000000 --conversations 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+from app.models.schemas import Message
+from app.services.conversation_store import InMemoryConversationStore, SQLiteConversationStore
+
+
+def make_store(backend: str, directory: str):
+    if backend == "sqlite":
+        return SQLiteConversationStore(os.path.join(directory, "conversations.sqlite3"), ttl_seconds=0)
+    return InMemoryConversationStore(ttl_seconds=0)
+
+
+def percentile(samples, fraction: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def time_reads(store, conversation_ids, reads: int, limit):
+    samples = []
+    for conversation_id in random.choices(conversation_ids, k=reads):
+        start = time.perf_counter()
+        store.get_messages(conversation_id, limit=limit)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main(args):
+    random.seed(0)
+    conversation_ids = [str(uuid.uuid4()) for _ in range(args.conversations)]
+    content = "x" * args.content_size
+    print(f"{args.messages} messages over {args.conversations} conversations, "
+          f"{args.content_size} byte messages, tail of {args.tail}")
+    print(f"{'backend':>8} {'appends/s':>10} {'tail p50 ms':>12} {'tail p99 ms':>12} "
+          f"{'full p50 ms':>12} {'full p99 ms':>12}")
+
+    for backend in args.backends:
+        with tempfile.TemporaryDirectory() as directory:
+            store = make_store(backend, directory)
+            for conversation_id in conversation_ids:
+                store.create_conversation(conversation_id)
+
+            start = time.perf_counter()
+            for i in range(args.messages):
+                message = Message(id=str(i), role="user" if i % 2 else "assistant", content=content, timestamp="")
+                store.append_message(conversation_ids[i % len(conversation_ids)], message)
+            appends_per_second = args.messages / (time.perf_counter() - start)
+
+            tail = time_reads(store, conversation_ids, args.reads, args.tail)
+            full = time_reads(store, conversation_ids, args.reads, None)
+            print(f"{backend:>8} {appends_per_second:>10.0f} {statistics.median(tail):>12.3f} "
+                  f"{percentile(tail, 0.99):>12.3f} {statistics.median(full):>12.3f} {percentile(full, 0.99):>12.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversation store append and tail-read performance")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--conversations", type=int, default=10_000)
+    parser.add_argument("--content-size", type=int, default=200, help="Bytes per message")
+    parser.add_argument("--tail", type=int, default=20, help="Messages per tail read")
+    parser.add_argument("--reads", type=int, default=1000)
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"], choices=["memory", "sqlite"])
+    main(parser.parse_args())
@@ -0,0 +1,85 @@
+"""
+Offline benchmark of the embedding pipeline.
+
+Uses the local HashingEmbeddings behind a simulated provider that adds per-call
+latency and randomly fails calls with a 429, so batch size, concurrency and rate
+limiting can be tuned without network access.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.embedding_pipeline --chunks 5000 --latency 0.2 --error-rate 0.05
+"""
+import argparse
+import logging
+import random
+import time
+
+from langchain_core.documents import Document
+
+from app.logic.embedding_pipeline import EmbeddingPipeline, RateLimitedEmbeddings
+from app.services.rate_limit import TokenBucket
+from app.logic.local_embeddings import HashingEmbeddings
+
+
+class RateLimitError(Exception):
+    """A 429 from the simulated provider, carrying its status code like provider SDK errors do"""
+    status_code = 429
+
+
+class SimulatedProviderEmbeddings(HashingEmbeddings):
+    """Hashing embeddings with network-like latency and injected rate limit errors"""
+
+    def __init__(self, latency: float, error_rate: float):
+        super().__init__()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            raise RateLimitError("429 Too Many Requests")
+        return super().embed_documents(texts)
+
+
+def make_chunks(count: int):
+    words = "contract clause payment term party notice liability invoice schedule annex".split()
+    return [
+        Document(page_content=" ".join(random.choices(words, k=150)) + f" chunk {i}", metadata={"page": i // 3})
+        for i in range(count)
+    ]
+
+
+def main(args):
+    random.seed(0)
+    # Injected failures are expected, keep the retry warnings out of the report
+    logging.getLogger("app.logic.embedding_pipeline").setLevel(logging.ERROR)
+    chunks = make_chunks(args.chunks)
+    print(f"{args.chunks} chunks, {args.latency * 1000:.0f} ms per call, {args.error_rate:.0%} errors, "
+          f"{args.rate or 'unlimited'} calls/s")
+    print(f"{'batch':>6} {'concurrency':>11} {'seconds':>8} {'chunks/s':>9} {'calls':>6} {'retries':>8}")
+    for batch_size in args.batch_sizes:
+        for concurrency in args.concurrency:
+            provider = SimulatedProviderEmbeddings(args.latency, args.error_rate)
+            limiter = TokenBucket(args.rate, max(1, int(args.rate))) if args.rate else None
+            embeddings = RateLimitedEmbeddings(provider, limiter, max_retries=8, backoff=0.05)
+            pipeline = EmbeddingPipeline(embeddings, batch_size=batch_size, concurrency=concurrency)
+
+            start = time.perf_counter()
+            vectorstore = pipeline.build(chunks)
+            elapsed = time.perf_counter() - start
+
+            assert vectorstore.index.ntotal == len(chunks)
+            print(f"{batch_size:>6} {concurrency:>11} {elapsed:>8.2f} {len(chunks) / elapsed:>9.0f} "
+                  f"{provider.calls:>6} {embeddings.retries:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding pipeline throughput with a simulated provider")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per embedding call")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Fraction of calls failing with 429")
+    parser.add_argument("--rate", type=float, default=0, help="Calls per second allowed (0 for unlimited)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[50, 100])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    main(parser.parse_args())
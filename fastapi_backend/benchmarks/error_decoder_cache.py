@@ -0,0 +1,123 @@
+"""
+Replay benchmark of the error decoder response cache.
+
+Builds a corpus of CI-style stack traces from a set of error templates: every
+occurrence gets its own checkout path, line numbers, addresses and timestamps,
+and some also vary the offending identifier (near-duplicates the exact tier
+cannot match). Traces are replayed with a skewed distribution, as CI bots repeat
+the same few failures, through the cache with a stubbed decode_error.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.error_decoder_cache --requests 20000 --templates 200
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app.services.response_cache import ResponseCache
+
+TEMPLATES = [
+    ('Traceback (most recent call last):\n  File "{root}/app/{module}.py", line {line}, in {func}\n'
+     '    value = payload["{name}"]\nKeyError: \'{name}\''),
+    ('Traceback (most recent call last):\n  File "{root}/lib/{module}.py", line {line}, in {func}\n'
+     '    return obj.{name}()\nAttributeError: \'NoneType\' object has no attribute \'{name}\''),
+    ('{timestamp} ERROR worker crashed\nSegmentation fault at {address} in {func} ({root}/src/{module}.c:{line})'),
+    ('Exception in thread "main" java.lang.NullPointerException: Cannot invoke "{name}()"\n'
+     '    at com.example.{module}.{func}({module}.java:{line})\n    at com.example.Main.main(Main.java:{line2})'),
+    ('{root}/src/{module}.ts:{line}:{col} - error TS2339: Property \'{name}\' does not exist on type \'{func}\'.'),
+    ('{timestamp} FATAL connection to {address} refused while running {func}\n'
+     '  File "{root}/db/{module}.py", line {line}, in connect\nConnectionRefusedError: [Errno 111] Connection refused'),
+]
+WORDS = "user order invoice account session token payload config client cache queue worker".split()
+
+
+def make_template_params(count: int):
+    """Distinct errors: a template with a fixed module, function and identifier"""
+    return [
+        {
+            "template": TEMPLATES[i % len(TEMPLATES)],
+            "module": f"{random.choice(WORDS)}_{i}",
+            "func": f"handle_{random.choice(WORDS)}",
+            "name": random.choice(WORDS),
+        }
+        for i in range(count)
+    ]
+
+
+def render(params, near_duplicate: bool) -> str:
+    name = params["name"]
+    if near_duplicate:
+        name = f"{name}_{random.randint(1, 50)}"
+    return params["template"].format(
+        root=f"/home/runner/work/build-{random.randint(1, 10 ** 6)}",
+        module=params["module"],
+        func=params["func"],
+        name=name,
+        line=random.randint(1, 2000),
+        line2=random.randint(1, 2000),
+        col=random.randint(1, 80),
+        address=hex(random.getrandbits(48)),
+        timestamp=f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}T"
+                  f"{random.randint(0, 23):02d}:{random.randint(0, 59):02d}:{random.randint(0, 59):02d}Z",
+    )
+
+
+def make_corpus(requests: int, templates: int, near_duplicate_rate: float, skew: float):
+    params = make_template_params(templates)
+    weights = [1 / (rank + 1) ** skew for rank in range(templates)]
+    picks = random.choices(range(templates), weights, k=requests)
+    return [(error_id, render(params[error_id], random.random() < near_duplicate_rate)) for error_id in picks]
+
+
+async def replay(cache, corpus, latency: float):
+    provider_calls = 0
+    wrong = 0
+    overhead = 0.0
+
+    for error_id, trace in corpus:
+        async def decode():
+            nonlocal provider_calls
+            provider_calls += 1
+            return {"content": f"explanation of error {error_id}", "model": "gpt-4o"}
+
+        start = time.perf_counter()
+        if cache is None:
+            response = await decode()
+        else:
+            response = await cache.get_or_compute(trace, "python", "gpt-4o", decode)
+        overhead += time.perf_counter() - start
+        # A similarity hit on a different error returns the wrong explanation
+        wrong += response["content"] != f"explanation of error {error_id}"
+    return provider_calls, wrong, overhead, provider_calls * latency
+
+
+def main(args):
+    random.seed(0)
+    corpus = make_corpus(args.requests, args.templates, args.near_duplicate_rate, args.skew)
+    print(f"{args.requests} traces from {args.templates} errors, {args.near_duplicate_rate:.0%} near-duplicates, "
+          f"{args.latency:.1f} s per provider call")
+    print(f"{'cache':>18} {'provider calls':>15} {'hit rate':>9} {'lookup us':>10} {'provider s':>11} {'wrong':>6}")
+
+    configs = [("none", None), ("exact", ResponseCache(max_entries=args.max_entries, similarity_threshold=0))]
+    for threshold in args.thresholds:
+        configs.append((f"similarity {threshold}",
+                        ResponseCache(max_entries=args.max_entries, similarity_threshold=threshold)))
+
+    for name, cache in configs:
+        calls, wrong, overhead, provider_seconds = asyncio.run(replay(cache, corpus, args.latency))
+        hit_rate = cache.stats()["hit_rate"] if cache else 0.0
+        print(f"{name:>18} {calls:>15} {hit_rate:>9.1%} {overhead / len(corpus) * 1e6:>10.1f} {provider_seconds:>11.0f} {wrong:>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Error decoder cache hit rate on a replayed trace corpus")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--templates", type=int, default=200, help="Distinct errors in the corpus")
+    parser.add_argument("--near-duplicate-rate", type=float, default=0.3,
+                        help="Fraction of traces with a varied identifier")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of error frequency")
+    parser.add_argument("--latency", type=float, default=2.0, help="Seconds per decode_error provider call")
+    parser.add_argument("--max-entries", type=int, default=10000)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.9, 0.8])
+    main(parser.parse_args())
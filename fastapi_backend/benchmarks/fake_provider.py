@@ -0,0 +1,275 @@
+"""
+Local stand-in for the LLM and embedding provider APIs used by the benchmarks.
+
+Answers OpenAI/Groq style chat completions, Anthropic style messages and Gemini
+embedContent/batchEmbedContents after a configurable delay, so throughput can be
+measured without paid API calls. Requests with "stream": true are answered token by
+token as Server-Sent Events, one token every token_delay seconds; other answers
+take `latency` in total. With error_rate set, that fraction of requests is answered
+with error_status in the provider's error format (429s carry a Retry-After header).
+
+It can also be run on its own, to point a locally started API server at it:
+    python -m benchmarks.fake_provider --port 8900 --latency 0.2 --tokens-per-second 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from aiohttp import web
+from app.logic.local_embeddings import HashingEmbeddings
+
+FAKE_TOKENS = ["This ", "is ", "a ", "fake ", "completion."]
+# Dimensions of the Gemini embedding-001 model
+EMBEDDING_DIMENSIONS = 768
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt, about four characters per token"""
+    return max(1, len(text) // 4)
+
+
+class FakeProvider:
+    """Fake provider HTTP server running on localhost"""
+
+    def __init__(self,
+                 latency: float = 0.2,
+                 token_delay: float = 0.01,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 tokens: int = len(FAKE_TOKENS),
+                 error_rate: float = 0.0,
+                 error_status: int = 503,
+                 embedding_latency: float = 0.05,
+                 seed: int = 0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.host = host
+        self.port = port
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.embedding_latency = embedding_latency
+        self.requests = 0
+        self.errors = 0
+        self.embedding_requests = 0
+        self.texts_embedded = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.tokens_sent = 0
+        self.cancelled_streams = 0
+        self._random = random.Random(seed)
+        self._embeddings = HashingEmbeddings(EMBEDDING_DIMENSIONS)
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def completion_tokens(self):
+        """The words of a completion, FAKE_TOKENS repeated up to `tokens` of them"""
+        return [FAKE_TOKENS[i % len(FAKE_TOKENS)] for i in range(self.tokens)]
+
+    def should_fail(self) -> bool:
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+    def error_response(self, body) -> web.Response:
+        headers = {"Retry-After": "1"} if self.error_status == 429 else None
+        return web.json_response(body, status=self.error_status, headers=headers)
+
+    async def _simulate(self, latency=None):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency if latency is None else latency)
+        finally:
+            self.in_flight -= 1
+
+    async def _stream(self, request: web.Request, events) -> web.StreamResponse:
+        """Send (event, payload, is_token) triples as SSE, one token every token_delay seconds"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for event, payload, is_token in events:
+            if is_token:
+                await asyncio.sleep(self.token_delay)
+                self.tokens_sent += 1
+            prefix = f"event: {event}\n" if event else ""
+            data = payload if isinstance(payload, str) else json.dumps(payload)
+            try:
+                await response.write(f"{prefix}data: {data}\n\n".encode())
+            except ConnectionResetError:
+                # The client cancelled the stream, stop generating like a real provider would
+                self.cancelled_streams += 1
+                return response
+        await response.write_eof()
+        return response
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        await self._simulate()
+        if self.should_fail():
+            return self.error_response({"error": {
+                "message": "Fake provider error", "type": "server_error", "code": str(self.error_status)
+            }})
+        words = self.completion_tokens()
+        prompt_tokens = sum(estimate_tokens(str(message.get("content", ""))) for message in body.get("messages", []))
+        if body.get("stream"):
+            chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+            def chunk(delta, finish_reason=None):
+                return {
+                    "id": chunk_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                }
+
+            events = [(None, chunk({"role": "assistant", "content": word}), True) for word in words]
+            events.append((None, chunk({}, "stop"), False))
+            events.append((None, "[DONE]", False))
+            return await self._stream(request, events)
+        return web.json_response({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(words)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                      "total_tokens": prompt_tokens + len(words)}
+        })
+
+    async def messages(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        await self._simulate()
+        if self.should_fail():
+            error_type = "rate_limit_error" if self.error_status == 429 else "overloaded_error"
+            return self.error_response({"type": "error", "error": {"type": error_type, "message": "Fake provider error"}})
+        words = self.completion_tokens()
+        prompt_tokens = estimate_tokens(str(body.get("system", ""))) + sum(
+            estimate_tokens(str(message.get("content", ""))) for message in body.get("messages", [])
+        )
+        if body.get("stream"):
+            message = {
+                "id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant",
+                "model": body.get("model"), "content": [], "stop_reason": None,
+                "stop_sequence": None, "usage": {"input_tokens": prompt_tokens, "output_tokens": 0}
+            }
+            events = [
+                ("message_start", {"type": "message_start", "message": message}, False),
+                ("content_block_start", {"type": "content_block_start", "index": 0,
+                                         "content_block": {"type": "text", "text": ""}}, False),
+            ]
+            events += [("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                "delta": {"type": "text_delta", "text": word}}, True)
+                       for word in words]
+            events += [
+                ("content_block_stop", {"type": "content_block_stop", "index": 0}, False),
+                ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                   "usage": {"output_tokens": len(words)}}, False),
+                ("message_stop", {"type": "message_stop"}, False),
+            ]
+            return await self._stream(request, events)
+        return web.json_response({
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model"),
+            "content": [{"type": "text", "text": "".join(words)}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": prompt_tokens, "output_tokens": len(words)}
+        })
+
+    async def gemini_models(self, request: web.Request) -> web.Response:
+        """POST /v1beta/models/{model}:embedContent and :batchEmbedContents (REST transport)"""
+        model, _, method = request.match_info["call"].partition(":")
+        if method not in ("embedContent", "batchEmbedContents"):
+            raise web.HTTPNotFound()
+        body = await request.json()
+        self.embedding_requests += 1
+        await self._simulate(self.embedding_latency)
+        if self.should_fail():
+            status = "RESOURCE_EXHAUSTED" if self.error_status == 429 else "UNAVAILABLE"
+            return self.error_response({"error": {"code": self.error_status, "message": "Fake provider error", "status": status}})
+
+        def embed(content_request):
+            text = " ".join(part.get("text", "") for part in content_request.get("content", {}).get("parts", []))
+            return {"values": self._embeddings.embed_query(text)}
+
+        if method == "embedContent":
+            self.texts_embedded += 1
+            return web.json_response({"embedding": embed(body)})
+        requests = body.get("requests", [])
+        self.texts_embedded += len(requests)
+        return web.json_response({"embeddings": [embed(content_request) for content_request in requests]})
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "embedding_requests": self.embedding_requests,
+            "texts_embedded": self.texts_embedded,
+            "max_in_flight": self.max_in_flight,
+            "tokens_sent": self.tokens_sent,
+            "cancelled_streams": self.cancelled_streams
+        }
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/openai/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/messages", self.messages)
+        app.router.add_post("/v1beta/models/{call}", self.gemini_models)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Resolve the port when an ephemeral one was requested
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+
+async def serve(args):
+    provider = FakeProvider(
+        latency=args.latency, token_delay=1 / args.tokens_per_second, host=args.host, port=args.port,
+        tokens=args.tokens, error_rate=args.error_rate, error_status=args.error_status,
+        embedding_latency=args.embedding_latency
+    )
+    await provider.start()
+    print("Fake provider listening, start the API with:")
+    print(f"    OPENAI_BASE_URL={provider.base_url}/v1 ANTHROPIC_BASE_URL={provider.base_url} "
+          f"GROQ_BASE_URL={provider.base_url} GROQ_API_BASE={provider.base_url} "
+          f"GOOGLE_EMBEDDING_API_ENDPOINT={provider.base_url} uvicorn main:app")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await provider.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake OpenAI/Anthropic/Groq/Gemini embedding server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before an answer or its first streamed token")
+    parser.add_argument("--tokens-per-second", type=float, default=100)
+    parser.add_argument("--tokens", type=int, default=50, help="Tokens per completion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
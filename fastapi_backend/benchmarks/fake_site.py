@@ -0,0 +1,94 @@
+"""
+Local website used to exercise the web crawler without network access.
+
+Serves a tree of HTML pages where every page links to `fanout` children, back to the
+root, to an off-site URL and to a PDF, so origin filtering, deduplication and link
+skipping all get exercised. Responses carry an ETag and Last-Modified header and
+conditional requests are answered with 304 Not Modified. /redirect?to=<url> answers
+with a 302 to any URL, for checking where the crawler lets redirects take it.
+"""
+import asyncio
+import hashlib
+from email.utils import formatdate
+
+from aiohttp import web
+
+
+class FakeSite:
+    """aiohttp server for a generated documentation-like site"""
+
+    def __init__(self, pages: int = 50, fanout: int = 4, latency: float = 0.05,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.pages = pages
+        self.fanout = fanout
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.not_modified = 0
+        self.redirects = 0
+        self.bytes_sent = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.last_modified = formatdate(usegmt=True)
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def render(self, number: int) -> str:
+        children = [child for child in range(number * self.fanout + 1, number * self.fanout + self.fanout + 1)
+                    if child < self.pages]
+        links = "".join(f'<li><a href="/page/{child}#top">Page {child}</a></li>' for child in children)
+        paragraphs = "".join(
+            f"<p>Section {number}.{i}: configuring option_{number}_{i} sets the timeout for worker pool {i} "
+            f"of service {number}. The default value is {number * 10 + i} seconds.</p>"
+            for i in range(20)
+        )
+        return (
+            f"<html><head><title>Page {number}</title><style>p {{color: black}}</style></head><body>"
+            f"<script>var tracking = {number};</script><h1>Page {number}</h1>{paragraphs}"
+            f'<ul>{links}</ul><a href="/">Home</a><a href="https://example.org/elsewhere">Elsewhere</a>'
+            f'<a href="/files/manual.pdf">Manual</a></body></html>'
+        )
+
+    async def page(self, request: web.Request) -> web.Response:
+        number = int(request.match_info.get("number", 0))
+        if number >= self.pages:
+            raise web.HTTPNotFound()
+
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+        body = self.render(number).encode("utf-8")
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        headers = {"ETag": etag, "Last-Modified": self.last_modified}
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        self.bytes_sent += len(body)
+        return web.Response(body=body, content_type="text/html", charset="utf-8", headers=headers)
+
+    async def redirect(self, request: web.Request) -> web.Response:
+        self.redirects += 1
+        raise web.HTTPFound(request.query["to"])
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/", self.page)
+        app.router.add_get("/page/{number}", self.page)
+        app.router.add_get("/redirect", self.redirect)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self._runner.cleanup()
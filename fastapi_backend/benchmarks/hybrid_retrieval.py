@@ -0,0 +1,82 @@
+"""
+Benchmark of retrieval recall and latency for vector, keyword and hybrid search.
+
+Indexes a synthetic PDF whose lines carry clause numbers (e.g. "clause 87.12") and
+asks for randomly chosen clauses, in a short form and in a wordier natural-language
+form. A query counts as recalled when a chunk containing the clause is among the
+top k chunks. Runs fully offline with the local hashing embeddings.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.hybrid_retrieval --pages 300 --queries 200 --k 4
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+QUERY_FORMS = [
+    "clause {clause}",
+    "What do the parties agree to in clause {clause} of the agreement?",
+]
+
+
+def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "embeddings.sqlite3")
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "indexes")
+
+    # Imported after the environment is configured so the stores use the temporary directories
+    from benchmarks.synthetic_pdf import synthetic_pdf
+    from app.logic.conversation_retrieval import create_db
+    from app.logic.hybrid_retrieval import KeywordIndex, hybrid_search
+    from app.logic.document_retrieval import document_loader
+
+    path = synthetic_pdf(os.path.join(tmp, "pdfs"), args.pages)
+    vectorstore = create_db(document_loader.iter_pdf_chunks(path))
+    start = time.perf_counter()
+    keyword_index = KeywordIndex.from_vectorstore(vectorstore)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"{args.pages} pages, {vectorstore.index.ntotal} chunks; keyword index built in {build_ms:.0f} ms, "
+          f"{keyword_index.nbytes / 1024:.0f} KB, {len(keyword_index.vocabulary)} terms")
+
+    rng = random.Random(0)
+    queries = []
+    for _ in range(args.queries):
+        clause = f"{rng.randint(1, args.pages)}.{rng.randint(0, 39)}"
+        form = rng.choice(QUERY_FORMS)
+        queries.append((form.format(clause=clause), f"clause {clause} "))
+
+    methods = {
+        "vector": lambda query: hybrid_search(vectorstore, None, query, args.k),
+        "keyword": lambda query: [
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[row])
+            for row, _ in keyword_index.search(query, args.k)
+        ],
+        "hybrid": lambda query: hybrid_search(vectorstore, keyword_index, query, args.k, reranker="none"),
+        "hybrid+rerank": lambda query: hybrid_search(vectorstore, keyword_index, query, args.k, reranker="lexical"),
+    }
+    print(f"{'method':>14} {'recall@' + str(args.k):>10} {'hit@1':>6} {'p50 ms':>7} {'p95 ms':>7}")
+    for name, search in methods.items():
+        latencies, recalled, first = [], 0, 0
+        for query, needle in queries:
+            start = time.perf_counter()
+            chunks = search(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits = [needle in chunk.page_content for chunk in chunks]
+            recalled += any(hits)
+            first += bool(hits and hits[0])
+        latencies.sort()
+        print(f"{name:>14} {recalled / len(queries):>10.1%} {first / len(queries):>6.1%} "
+              f"{statistics.median(latencies):>7.2f} {latencies[int(len(latencies) * 0.95) - 1]:>7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall and latency of vector, keyword and hybrid retrieval")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4, help="Chunks retrieved per query")
+    main(parser.parse_args())
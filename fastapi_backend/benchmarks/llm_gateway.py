@@ -0,0 +1,77 @@
+"""
+Offline benchmark of the LLM gateway with the fake provider adapter.
+
+Measures what the middleware chain adds per request by sending the same requests
+to a FakeAdapter directly and through the gateway, then sends requests to an adapter
+that fails every Nth request, with and without gateway retries, and reports how many
+reached the caller as errors. No network access or API keys are needed.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.llm_gateway --requests 5000 --fail-every 10
+"""
+import argparse
+import asyncio
+import time
+
+from app.models.schemas import LLMRequest
+from app.services.llm_gateway import LLMGateway, default_middleware
+from app.services.llm_providers import FakeAdapter
+
+
+def make_request(i: int) -> LLMRequest:
+    return LLMRequest(model="fake-model", messages=[{"role": "user", "content": f"Benchmark message {i}"}])
+
+
+async def overhead(requests: int, concurrency: int):
+    adapter = FakeAdapter()
+    gateway = LLMGateway([adapter], default_middleware(), default_provider="fake")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(send) -> float:
+        async def one(i: int):
+            async with semaphore:
+                await send(make_request(i))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return (time.perf_counter() - start) / requests * 1e6
+
+    async def stream(request: LLMRequest):
+        async for _ in gateway.stream(request):
+            pass
+
+    direct = await run(adapter.complete)
+    routed = await run(gateway.complete)
+    streamed = await run(stream)
+    print(f"{requests} requests, {concurrency} concurrent, zero provider latency")
+    print(f"{'path':<20} {'us/request':>11}")
+    print(f"{'adapter directly':<20} {direct:>11.1f}")
+    print(f"{'gateway complete':<20} {routed:>11.1f}")
+    print(f"{'gateway stream':<20} {streamed:>11.1f}")
+
+
+async def flaky(requests: int, fail_every: int):
+    print(f"\n{requests} requests, every {fail_every}th upstream request fails with a retryable error")
+    print(f"{'gateway retries':>15} {'upstream':>9} {'errors':>7}")
+    for retries in (0, 2):
+        adapter = FakeAdapter(latency=0.001, fail_every=fail_every)
+        gateway = LLMGateway([adapter], default_middleware(retries=retries), default_provider="fake")
+        for middleware in gateway.middleware:
+            if hasattr(middleware, "backoff"):
+                middleware.backoff = 0.001
+        responses = await asyncio.gather(*(gateway.complete(make_request(i)) for i in range(requests)))
+        errors = sum(1 for response in responses if response.error)
+        print(f"{retries:>15} {adapter.requests:>9} {errors:>7}")
+
+
+async def main(args):
+    await overhead(args.requests, args.concurrency)
+    await flaky(args.requests // 10, args.fail_every)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Middleware overhead and retries of the LLM gateway, offline")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--fail-every", type=int, default=10, help="Every Nth upstream request fails")
+    asyncio.run(main(parser.parse_args()))
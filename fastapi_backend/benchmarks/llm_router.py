@@ -0,0 +1,105 @@
+"""
+Offline benchmark of latency-aware routing, circuit breaking, failover and hedging.
+
+Two fake provider adapters serve equivalent models. In the outage scenario every
+request to the primary fails (slowly, like a timeout) until it recovers halfway
+through; in the tail scenario every 10th primary request is slow. Both are run
+without a router, with failover and the circuit breaker, and with hedged requests.
+Reports errors, latency percentiles and the requests each provider received.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.llm_router --requests 400
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from app.models.schemas import LLMRequest
+from app.services.llm_gateway import LLMGateway, default_middleware
+from app.services.llm_providers import FakeAdapter
+from app.services.llm_router import LLMRouter
+
+FALLBACKS = {"primary-model": ["backup-model"]}
+
+
+def percentile(values, quantile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * quantile))]
+
+
+async def run(gateway: LLMGateway, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await gateway.complete(LLMRequest(
+                model="primary-model", messages=[{"role": "user", "content": f"Question {i}"}]
+            ))
+            latencies.append(time.perf_counter() - start)
+            errors += response.error is not None
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, errors
+
+
+def report(label: str, latencies, errors: int, primary: FakeAdapter, backup: FakeAdapter, router):
+    state = router.stats()["models"].get("primary/primary-model", {}).get("state", "-") if router else "-"
+    print(f"{label:<22} {errors:>6} {statistics.median(latencies) * 1000:>7.0f} {percentile(latencies, 0.99) * 1000:>7.0f} "
+          f"{primary.requests:>8} {backup.requests:>7} {state:>10}")
+
+
+async def outage(args):
+    print(f"\nOutage: the primary fails every request after {args.failure_latency * 1000:.0f} ms, "
+          f"recovers after {args.requests // 2} requests")
+    print(f"{'routing':<22} {'errors':>6} {'p50 ms':>7} {'p99 ms':>7} {'primary':>8} {'backup':>7} {'circuit':>10}")
+    for label, router in (("none", None), ("failover + breaker", LLMRouter(FALLBACKS, open_seconds=args.open_seconds))):
+        primary = FakeAdapter(["primary-model"], latency=args.failure_latency, fail_every=1, name="primary")
+        backup = FakeAdapter(["backup-model"], latency=args.latency, name="backup")
+        gateway = LLMGateway([primary, backup], default_middleware(single_flight=False), "primary", router)
+
+        latencies, errors = await run(gateway, args.requests // 2, args.concurrency)
+        # Let an open circuit reach its probe time before the second half
+        await asyncio.sleep(args.open_seconds)
+        primary.fail_every, primary.latency = 0, args.latency
+        more_latencies, more_errors = await run(gateway, args.requests // 2, args.concurrency)
+        report(label, latencies + more_latencies, errors + more_errors, primary, backup, router)
+
+
+async def tail(args):
+    print(f"\nTail latency: every 10th primary request takes {args.slow_latency * 1000:.0f} ms instead of "
+          f"{args.latency * 1000:.0f} ms")
+    print(f"{'routing':<22} {'errors':>6} {'p50 ms':>7} {'p99 ms':>7} {'primary':>8} {'backup':>7} {'circuit':>10}")
+    routers = (
+        ("none", None),
+        ("hedge after 100 ms", LLMRouter(FALLBACKS, hedge_after="0.1")),
+        ("hedge after p95", LLMRouter(FALLBACKS, hedge_after="p95")),
+    )
+    for label, router in routers:
+        primary = FakeAdapter(["primary-model"], latency=args.latency, slow_every=10,
+                              slow_latency=args.slow_latency, name="primary")
+        backup = FakeAdapter(["backup-model"], latency=args.latency, name="backup")
+        gateway = LLMGateway([primary, backup], default_middleware(single_flight=False), "primary", router)
+        latencies, errors = await run(gateway, args.requests, args.concurrency)
+        report(label, latencies, errors, primary, backup, router)
+
+
+async def main(args):
+    logging.getLogger("app.services").setLevel(logging.ERROR)
+    await outage(args)
+    await tail(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Routing, failover and hedging against injected failures and latency")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="Normal provider latency in seconds")
+    parser.add_argument("--failure-latency", type=float, default=0.5, help="Seconds until a failing request errors")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Latency of the slow tail in seconds")
+    parser.add_argument("--open-seconds", type=float, default=1.0, help="Circuit breaker open time")
+    asyncio.run(main(parser.parse_args()))
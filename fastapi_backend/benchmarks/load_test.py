@@ -0,0 +1,343 @@
+"""
+End-to-end load test of the API against local fake providers, with a regression baseline.
+
+benchmarks.fake_provider answers the OpenAI, Anthropic and Groq chat APIs and Gemini
+embeddings with configurable latency, token rate and error injection, and
+benchmarks.fake_site serves the pages crawled by /chat-url. Both run in this process;
+every scenario runs the app in a fresh process (through an in-process ASGI client)
+with its own temporary directories, so its peak RSS is its own. Scenarios:
+
+- chat_burst: concurrent /chat requests spread over the three chat providers,
+  every fourth one streamed
+- error_decoder: concurrent /error-decoder requests, half of them repeated traces
+- chat_url: questions about a crawled fake site, subpages included
+- pdf_ingest: upload of a synthetic PDF of --pages pages, then /chat-pdf questions
+- long_conversation: one /chat conversation of --turns sequential turns
+
+Reports requests, errors, throughput, p50/p99 latency and peak RSS per scenario.
+With --baseline the results are compared against a baseline file, and the run exits
+with status 1 if throughput dropped or latency or memory grew by more than
+--tolerance; --update-baseline writes the results to the baseline file instead.
+Latencies depend on the machine and vary by a few tens of percent between runs, so
+compare against a baseline recorded on the same kind of machine with the same
+settings; the default tolerance only catches large regressions.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.load_test --baseline benchmarks/baseline.json
+    python -m benchmarks.load_test --scenarios chat_burst --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_provider import FakeProvider
+from benchmarks.fake_site import FakeSite
+from benchmarks.provider_throughput import configure_environment
+from benchmarks.synthetic_pdf import synthetic_pdf
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHAT_MODELS = ["gpt-4o", "claude-3-7-sonnet-20250219", "llama-3.1-8b-instant"]
+ERROR_TRACE = """Traceback (most recent call last):
+  File "app/worker_{number}.py", line {line}, in run
+    result = handlers[name](payload)
+KeyError: 'handler_{number}'"""
+
+# Metrics compared against the baseline, and the change below which they are never a regression
+HIGHER_IS_BETTER = {"throughput": 0.0, "pages_per_second": 0.0}
+LOWER_IS_BETTER = {"p50_ms": 25.0, "p99_ms": 100.0, "ingest_seconds": 0.5, "peak_rss_mb": 20.0}
+
+
+def percentile(values, quantile: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * quantile))]
+
+
+def failed(response) -> bool:
+    """Whether a response is an error: an error status, an SSE error event or an error message as the answer"""
+    if response.status_code != 200:
+        return True
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        return "event: error" in response.text
+    content = response.json().get("content", "")
+    return content.startswith("Error") or content.startswith("There was an error")
+
+
+async def timed_requests(send, total: int, concurrency: int):
+    """Call send(i) for i in range(total) with at most `concurrency` at a time; (latencies, errors, seconds)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - start)
+            errors += failed(response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def chat_burst(client, options):
+    async def send(i: int):
+        return await client.post("/chat", json={
+            "message": f"Question {i}: how do I configure the worker pool timeout?",
+            "model": CHAT_MODELS[i % len(CHAT_MODELS)],
+            "stream": i % 4 == 3
+        })
+    return await timed_requests(send, options["requests"], options["concurrency"])
+
+
+async def error_decoder(client, options):
+    distinct = max(1, options["requests"] // 2)
+
+    async def send(i: int):
+        number = i % distinct
+        return await client.post("/error-decoder", json={
+            "error_message": ERROR_TRACE.format(number=number, line=10 + number), "language": "python"
+        })
+    return await timed_requests(send, options["requests"], options["concurrency"])
+
+
+async def chat_url(client, options):
+    async def send(i: int):
+        return await client.post("/chat-url", json={
+            "message": f"What is the default timeout of worker pool {i % 20}?",
+            "url": options["site_url"],
+            "crawl_subpages": True
+        })
+    return await timed_requests(send, options["questions"], max(1, options["concurrency"] // 10))
+
+
+async def pdf_ingest(client, options):
+    path = synthetic_pdf(os.path.join(os.getcwd(), "pdfs"), options["pages"])
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = await client.post("/upload-pdf", files={"file": (os.path.basename(path), f, "application/pdf")})
+    response.raise_for_status()
+    upload = response.json()
+    while True:
+        job = (await client.get(f"/upload-pdf/{upload['job_id']}")).json()
+        if job["status"] in ("ready", "failed"):
+            break
+        await asyncio.sleep(0.05)
+    ingest_seconds = time.perf_counter() - start
+    if job["status"] == "failed":
+        raise RuntimeError(f"Ingestion failed: {job.get('error')}")
+
+    async def send(i: int):
+        return await client.post("/chat-pdf", json={
+            "message": f"What do the parties agree to in clause {i + 1}.{i % 40}?",
+            "conversation_id": upload["conversation_id"]
+        })
+    latencies, errors, seconds = await timed_requests(send, options["questions"], max(1, options["concurrency"] // 10))
+    return latencies, errors, seconds, {
+        "ingest_seconds": round(ingest_seconds, 3),
+        "pages_per_second": round(options["pages"] / ingest_seconds, 1)
+    }
+
+
+async def long_conversation(client, options):
+    conversation_id = None
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for turn in range(options["turns"]):
+        message = f"Turn {turn}: " + " ".join(f"detail {turn}.{word} of the deployment plan" for word in range(40))
+        request_start = time.perf_counter()
+        response = await client.post("/chat", json={"message": message, "conversation_id": conversation_id})
+        latencies.append(time.perf_counter() - request_start)
+        errors += failed(response)
+        if response.status_code == 200:
+            conversation_id = response.json()["conversation_id"]
+    seconds = time.perf_counter() - start
+    window = max(1, len(latencies) // 4)
+    return latencies, errors, seconds, {
+        "first_turns_ms": round(statistics.median(latencies[:window]) * 1000, 1),
+        "last_turns_ms": round(statistics.median(latencies[-window:]) * 1000, 1)
+    }
+
+
+SCENARIOS = {
+    "chat_burst": chat_burst,
+    "error_decoder": error_decoder,
+    "chat_url": chat_url,
+    "pdf_ingest": pdf_ingest,
+    "long_conversation": long_conversation,
+}
+
+
+async def run_scenario(name: str, options):
+    """Child process: run one scenario against the app and print its result as JSON"""
+    import httpx
+    from main import app, shutdown
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            latencies, errors, seconds, *extra = await SCENARIOS[name](client, options)
+    finally:
+        await shutdown()
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    for values in extra:
+        result.update(values)
+    print("RESULT " + json.dumps(result))
+
+
+async def spawn_scenario(name: str, options) -> dict:
+    """Run a scenario in a fresh process in a temporary directory and return its result"""
+    with tempfile.TemporaryDirectory(prefix=f"load-test-{name}-") as directory:
+        env = dict(os.environ, PYTHONPATH=BACKEND_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "benchmarks.load_test", "--run-scenario", name, "--options", json.dumps(options),
+            cwd=directory, env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+    for line in stdout.decode().splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"Scenario {name} failed:\n{stderr.decode()[-3000:]}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Regressions of results against the baseline, as (scenario, metric, baseline value, value)"""
+    regressions = []
+    for scenario, metrics in results.items():
+        expected = baseline.get("results", {}).get(scenario)
+        if not expected:
+            continue
+        for metric, value in metrics.items():
+            if metric not in expected:
+                continue
+            before = expected[metric]
+            if metric in HIGHER_IS_BETTER:
+                regressed = value < before * (1 - tolerance) and before - value > HIGHER_IS_BETTER[metric]
+            elif metric in LOWER_IS_BETTER:
+                regressed = value > before * (1 + tolerance) and value - before > LOWER_IS_BETTER[metric]
+            else:
+                continue
+            if regressed:
+                regressions.append((scenario, metric, before, value))
+        if metrics["errors"] > expected.get("errors", 0):
+            regressions.append((scenario, "errors", expected.get("errors", 0), metrics["errors"]))
+    return regressions
+
+
+def settings(args) -> dict:
+    """Options that change the results; a baseline only applies to runs with the same ones"""
+    return {
+        name: getattr(args, name) for name in (
+            "latency", "tokens_per_second", "tokens", "error_rate", "embedding_latency", "site_pages",
+            "requests", "concurrency", "questions", "pages", "turns"
+        )
+    }
+
+
+async def main(args):
+    provider = FakeProvider(
+        latency=args.latency, token_delay=1 / args.tokens_per_second, tokens=args.tokens,
+        error_rate=args.error_rate, embedding_latency=args.embedding_latency
+    )
+    site = FakeSite(pages=args.site_pages)
+    await provider.start()
+    await site.start()
+    configure_environment(provider.base_url)
+    os.environ.update({
+        "GOOGLE_EMBEDDING_API_ENDPOINT": provider.base_url,
+        "EMBEDDING_PROVIDER": "google",
+        # Measure the app, not the per-client rate limit of a single benchmark client
+        "ADMISSION_CLIENT_REQUESTS_PER_SECOND": "0",
+        # The fake site runs on localhost
+        "CRAWL_ALLOW_PRIVATE_HOSTS": "true",
+    })
+    options = dict(settings(args), site_url=f"{site.base_url}/")
+
+    print(f"Fake provider: {args.latency * 1000:.0f} ms latency, {args.tokens} tokens per answer at "
+          f"{args.tokens_per_second:.0f} tokens/s, {args.error_rate:.0%} errors")
+    print(f"{'scenario':<18} {'requests':>8} {'errors':>6} {'req/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'peak RSS MB':>11}  extra")
+    results = {}
+    try:
+        for name in args.scenarios:
+            result = results[name] = await spawn_scenario(name, options)
+            extra = ", ".join(f"{key} {value}" for key, value in result.items() if key not in (
+                "requests", "errors", "throughput", "p50_ms", "p99_ms", "peak_rss_mb"
+            ))
+            print(f"{name:<18} {result['requests']:>8} {result['errors']:>6} {result['throughput']:>7.1f} "
+                  f"{result['p50_ms']:>7.0f} {result['p99_ms']:>7.0f} {result['peak_rss_mb']:>11.0f}  {extra}")
+    finally:
+        await site.stop()
+        await provider.stop()
+    print(f"Fake provider: {provider.stats()}")
+
+    report = {
+        "settings": settings(args),
+        "environment": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if not args.baseline:
+        return 0
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != report["settings"]:
+        print("Warning: the baseline was recorded with different settings, the comparison is not meaningful")
+    regressions = compare(results, baseline, args.tolerance)
+    for scenario, metric, before, value in regressions:
+        print(f"REGRESSION {scenario} {metric}: {before} -> {value}")
+    if not regressions:
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scenario load test against fake providers, compared to a baseline")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake provider latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="Streamed tokens per second")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens per answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of provider requests that fail")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--site-pages", type=int, default=20, help="Pages of the fake site crawled by chat_url")
+    parser.add_argument("--requests", type=int, default=200, help="Requests of chat_burst and error_decoder")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=20, help="Questions of chat_url and pdf_ingest")
+    parser.add_argument("--pages", type=int, default=100, help="Pages of the PDF uploaded by pdf_ingest")
+    parser.add_argument("--turns", type=int, default=40, help="Turns of long_conversation")
+    parser.add_argument("--baseline", help="Baseline file to compare against (or write with --update-baseline)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Relative change counted as a regression")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--options", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_scenario:
+        asyncio.run(run_scenario(args.run_scenario, json.loads(args.options)))
+    else:
+        sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,66 @@
+"""
+Cost of the request path instrumentation.
+
+Times a histogram observation, a counter increment, a span() around an empty block
+(histogram plus stage_timings), the same span with an OpenTelemetry tracer (the
+no-op API tracer unless an SDK is configured), and rendering /metrics with many
+label sets.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.metrics_overhead --iterations 200000
+"""
+import argparse
+import time
+
+from app.services import metrics as metrics_module
+from app.services.metrics import Counter, Histogram, MetricsRegistry, span
+
+
+def per_call(func, iterations: int) -> float:
+    """Mean microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def empty_span():
+    with span("benchmark"):
+        pass
+
+
+def main(args):
+    histogram = Histogram("benchmark_seconds", "Benchmark", ("provider", "model"))
+    counter = Counter("benchmark_total", "Benchmark", ("provider", "model"))
+    rows = [
+        ("histogram observe", per_call(lambda: histogram.observe(0.123, provider="fake", model="fake-model"), args.iterations)),
+        ("counter inc", per_call(lambda: counter.inc(provider="fake", model="fake-model"), args.iterations)),
+        ("span", per_call(empty_span, args.iterations)),
+    ]
+    try:
+        from opentelemetry import trace
+        metrics_module.tracer = trace.get_tracer("benchmark")
+        rows.append(("span + OpenTelemetry", per_call(empty_span, args.iterations)))
+        metrics_module.tracer = None
+    except ImportError:
+        print("opentelemetry-api is not installed, skipping the traced span")
+
+    print(f"{'operation':<22} {'us/call':>8}")
+    for label, micros in rows:
+        print(f"{label:<22} {micros:>8.2f}")
+
+    registry = MetricsRegistry()
+    wide = registry.histogram("wide_seconds", "Benchmark", ("route",))
+    for i in range(args.label_sets):
+        wide.observe(0.1, route=f"/route-{i}")
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"Rendering {args.label_sets} histogram label sets: {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"{len(text) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-call cost of metrics and spans")
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--label-sets", type=int, default=1000, help="Label sets rendered by /metrics")
+    main(parser.parse_args())
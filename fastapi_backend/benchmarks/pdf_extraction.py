@@ -0,0 +1,56 @@
+"""
+PDF text extraction time with 1/2/4/8 worker processes on generated PDFs.
+
+Every run is checked against the single-process output, so the merged pages must
+come back complete and in page order.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.pdf_extraction --pages 1000 4000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic_pdf import synthetic_pdf
+from app.logic.document_loaders import DocumentLoader
+from app.logic.pdf_extraction import get_pool, shutdown_pools
+
+
+def main(args):
+    directory = args.dir or tempfile.mkdtemp(prefix="pdf-bench-")
+    loader = DocumentLoader(chunk_size=1000, chunk_overlap=100)
+    print(f"{os.cpu_count()} CPUs available")
+    print(f"{'pages':>6} {'workers':>7} {'seconds':>8} {'pages/s':>8} {'speedup':>8}")
+
+    for pages in args.pages:
+        path = synthetic_pdf(directory, pages)
+        reference = None
+        baseline = None
+        for workers in args.workers:
+            if workers > 1:
+                # Start the worker processes before timing, as the shared pool would be warm in the server
+                pool = get_pool(workers)
+                list(pool.map(abs, range(workers)))
+
+            start = time.perf_counter()
+            docs = list(loader.iter_pdf_pages(path, workers=workers))
+            elapsed = time.perf_counter() - start
+
+            result = [(doc.metadata["page"], doc.page_content) for doc in docs]
+            if reference is None:
+                reference = result
+            assert result == reference, f"{workers} workers returned different pages"
+
+            baseline = baseline or elapsed
+            print(f"{pages:>6} {workers:>7} {elapsed:>8.2f} {pages / elapsed:>8.0f} {baseline / elapsed:>7.1f}x")
+
+    shutdown_pools()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel PDF text extraction benchmark")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000, 4000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--dir", help="Directory for the generated PDFs (default: a temporary directory)")
+    main(parser.parse_args())
@@ -0,0 +1,67 @@
+"""
+Peak memory of PDF loading: the materializing path PyPDFLoader.load() + split_documents
+against the streaming DocumentLoader.iter_pdf_chunks generator.
+
+Each run happens in a fresh process and reports its peak RSS above the baseline after
+imports. The "streaming+index" mode also embeds every chunk into a FAISS index with the
+local hashing embedder, so it includes the memory of the index itself.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.pdf_memory --pages 500 2000 5000
+"""
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+
+from benchmarks.synthetic_pdf import synthetic_pdf
+
+MODES = ["materialized", "streaming", "streaming+index"]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode: str, path: str):
+    from langchain_community.document_loaders import PyPDFLoader
+    from app.logic.document_loaders import DocumentLoader
+    from app.logic.embedding_pipeline import EmbeddingPipeline
+    from app.logic.local_embeddings import HashingEmbeddings
+
+    loader = DocumentLoader(chunk_size=1000, chunk_overlap=100)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+
+    if mode == "materialized":
+        pages = PyPDFLoader(path).load()
+        chunks = len(loader.splitter.split_documents(pages))
+    elif mode == "streaming":
+        chunks = sum(1 for _ in loader.iter_pdf_chunks(path))
+    else:
+        vectorstore = EmbeddingPipeline(HashingEmbeddings()).build(loader.iter_pdf_chunks(path))
+        chunks = vectorstore.index.ntotal
+
+    return chunks, time.perf_counter() - start, peak_rss_mb() - baseline
+
+
+def main(args):
+    directory = args.dir or tempfile.mkdtemp(prefix="pdf-bench-")
+    context = multiprocessing.get_context("spawn")
+    print(f"{'pages':>6} {'mode':<16} {'chunks':>7} {'seconds':>8} {'peak MB':>8}")
+    for pages in args.pages:
+        path = synthetic_pdf(directory, pages)
+        for mode in args.modes:
+            with context.Pool(1) as pool:
+                chunks, seconds, peak = pool.apply(run, (mode, path))
+            print(f"{pages:>6} {mode:<16} {chunks:>7} {seconds:>8.1f} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory of materialized vs streaming PDF loading")
+    parser.add_argument("--pages", type=int, nargs="+", default=[500, 2000])
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--dir", help="Directory for the generated PDFs (default: a temporary directory)")
+    main(parser.parse_args())
@@ -0,0 +1,79 @@
+"""
+Load test for the async provider services against a local fake provider.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.provider_throughput --latency 0.2 --requests 400
+
+With non-blocking clients the throughput should grow roughly linearly with the
+number of concurrent requests until the provider concurrency limit is reached.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fake_provider import FakeProvider
+
+PROVIDER_MODELS = {
+    "openai": "gpt-4o",
+    "anthropic": "claude-3-7-sonnet-20250219",
+    "groq": "llama-3.1-8b-instant",
+}
+
+
+def configure_environment(base_url: str):
+    """Point every provider SDK at the fake server"""
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.environ["GROQ_BASE_URL"] = base_url
+    for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GROQ_API_KEY", "GOOGLE_API_KEY"):
+        os.environ.setdefault(key, "fake-key")
+
+
+async def run_level(ai_service, model: str, concurrency: int, total: int) -> float:
+    """Send `total` chat completions with at most `concurrency` in flight, return requests/sec"""
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            response = await ai_service.chat_completion(f"Benchmark message {i}", [], model)
+            if "error" in response:
+                raise RuntimeError(response["error"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def main(args):
+    provider = FakeProvider(latency=args.latency)
+    await provider.start()
+    configure_environment(provider.base_url)
+
+    # Imported after the environment is configured so the SDK clients pick up the fake base URL
+    from app.services.ai_service import ai_service
+
+    try:
+        print(f"Fake provider latency: {args.latency * 1000:.0f} ms")
+        print(f"{'provider':<10} {'concurrency':>11} {'requests':>9} {'req/s':>9} {'peak in-flight':>15}")
+        for name in args.providers:
+            for concurrency in args.concurrency:
+                provider.max_in_flight = 0
+                total = max(args.requests, concurrency)
+                throughput = await run_level(ai_service, PROVIDER_MODELS[name], concurrency, total)
+                print(f"{name:<10} {concurrency:>11} {total:>9} {throughput:>9.1f} {provider.max_in_flight:>15}")
+    finally:
+        await ai_service.aclose()
+        await provider.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of the provider services against a fake provider")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated provider latency in seconds")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--providers", nargs="+", default=list(PROVIDER_MODELS), choices=list(PROVIDER_MODELS))
+    asyncio.run(main(parser.parse_args()))
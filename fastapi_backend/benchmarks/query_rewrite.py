@@ -0,0 +1,155 @@
+"""
+Benchmark of the query rewrite stage of the chat-with-PDF chain.
+
+Replays a scripted conversation (first question, self-contained questions,
+follow-ups and a client retry) through the full retrieval chain with a chat model
+that answers after a fixed delay and a retriever whose query embedding takes a
+fixed delay (as with a remote embedding provider), once with LangChain's
+create_history_aware_retriever and once per QueryRewriter configuration. Reports
+LLM calls and end-to-end latency per turn. Runs fully offline.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.query_rewrite --llm-latency 0.3 --retrieval-latency 0.15
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+TURNS = [
+    "What is the termination notice period in the agreement?",
+    "Which schedule covers payment terms for the supplier?",
+    "And what about the second one?",
+    "Why?",
+    "What does clause 12.4 say about liability caps?",
+    "Can you explain it in simpler words?",
+]
+# The last question is sent again with the same history, as a client retry would
+RETRIED_TURN = len(TURNS) - 1
+
+
+class SlowChatModel(BaseChatModel):
+    """Chat model that answers after `latency` seconds and counts its calls"""
+
+    latency: float = 0.3
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        self.calls += 1
+        if messages[-1].content.startswith("Given the above conversation"):
+            # Rewrite: questions that already stand alone come back unchanged
+            question = messages[-2].content
+            content = question if len(question.split()) >= 5 else f"{question} (about the agreement)"
+        else:
+            content = f"Answer to: {messages[-1].content}"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+def build_chain(llm, retriever, rewriter):
+    """The create_chain pipeline with a given chat model and rewrite stage"""
+    from langchain.chains import create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain.chains.history_aware_retriever import create_history_aware_retriever
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from app.logic.conversation_retrieval import SYSTEM_PROMPT
+
+    response_prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT), MessagesPlaceholder(variable_name="chat_history"), ("user", "{input}")
+    ])
+    retriever_prompt = ChatPromptTemplate.from_messages([
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("user", "{input}"),
+        ("user", "Given the above conversation, generate a search query to retrieve relevant context.")
+    ])
+    if rewriter is None:
+        context = create_history_aware_retriever(llm=llm, retriever=retriever, prompt=retriever_prompt)
+    else:
+        context = rewriter.as_retriever(llm=llm, retriever=retriever, prompt=retriever_prompt)
+    return create_retrieval_chain(context, create_stuff_documents_chain(llm=llm, prompt=response_prompt))
+
+
+async def run(name, rewriter, retriever, args):
+    llm = SlowChatModel(latency=args.llm_latency)
+    chain = build_chain(llm, retriever, rewriter)
+    latencies = []
+    for conversation in range(args.conversations):
+        history = []
+        for i, question in enumerate(TURNS + [TURNS[RETRIED_TURN]]):
+            if i == 0:
+                # Keeps conversations apart, so rewrites are only cached within one
+                question = f"{question} (conversation {conversation})"
+            if i == len(TURNS):
+                # Retry: same question, history as it was before the first attempt
+                history = history[:-2]
+            start = time.perf_counter()
+            result = await chain.ainvoke({"input": question, "chat_history": history})
+            latencies.append(time.perf_counter() - start)
+            history = history + [HumanMessage(content=question), AIMessage(content=result["answer"])]
+
+    turns = len(latencies)
+    print(f"{name:>22} {llm.calls / turns:>10.2f} {statistics.mean(latencies) * 1000:>8.0f} "
+          f"{sorted(latencies)[int(turns * 0.95) - 1] * 1000:>8.0f}")
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "embeddings.sqlite3")
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "indexes")
+
+    # Imported after the environment is configured so the stores use the temporary directories
+    from langchain_core.documents import Document
+    from app.logic.conversation_retrieval import create_db
+    from app.logic.hybrid_retrieval import HybridRetriever, KeywordIndex
+    from app.logic.query_rewrite import QueryRewriter
+
+    vectorstore = create_db([
+        Document(page_content=f"Clause {section}.{line}: the parties agree to the terms of schedule {line % 7}.")
+        for section in range(1, 30) for line in range(10)
+    ])
+
+    class SlowRetriever(HybridRetriever):
+        def _get_relevant_documents(self, query, *, run_manager):
+            time.sleep(args.retrieval_latency)
+            return super()._get_relevant_documents(query, run_manager=run_manager)
+
+    retriever = SlowRetriever(vectorstore=vectorstore, keyword_index=KeywordIndex.from_vectorstore(vectorstore))
+
+    print(f"LLM latency {args.llm_latency * 1000:.0f} ms, retrieval {args.retrieval_latency * 1000:.0f} ms, "
+          f"{args.conversations} conversations of "
+          f"{len(TURNS) + 1} turns")
+    print(f"{'rewrite stage':>22} {'LLM calls':>10} {'mean ms':>8} {'p95 ms':>8}  (per turn)")
+    await run("history-aware (before)", None, retriever, args)
+    await run("always + cache", QueryRewriter(mode="always"), retriever, args)
+    await run("auto + cache", QueryRewriter(mode="auto"), retriever, args)
+    await run("always + speculative", QueryRewriter(mode="always", speculative=True), retriever, args)
+    await run("auto + speculative", QueryRewriter(mode="auto", speculative=True), retriever, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM calls and latency of the chat-with-PDF query rewrite stage")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per simulated LLM call")
+    parser.add_argument("--retrieval-latency", type=float, default=0.15, help="Seconds per simulated query embedding")
+    parser.add_argument("--conversations", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
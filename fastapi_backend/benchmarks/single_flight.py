@@ -0,0 +1,73 @@
+"""
+Burst benchmark of single-flight request coalescing against a local fake provider.
+
+Fires bursts of concurrent decode_error calls and streamed chat completions where
+many callers ask the same thing, with single-flight on and off, and reports how many
+requests reached the provider. Streamed subscribers are checked to receive the
+complete answer.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.single_flight --burst 200 --distinct 5
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.fake_provider import FakeProvider, FAKE_TOKENS
+from benchmarks.provider_throughput import configure_environment
+
+
+async def burst_decode(ai_service, burst: int, distinct: int):
+    responses = await asyncio.gather(*(
+        ai_service.decode_error(f"KeyError: 'field_{i % distinct}'", "python", "gpt-4o")
+        for i in range(burst)
+    ))
+    for response in responses:
+        if "error" in response:
+            raise RuntimeError(response["error"])
+
+
+async def burst_stream(ai_service, burst: int, distinct: int):
+    async def consume(i: int) -> str:
+        tokens = [token async for token in ai_service.stream_chat_completion(f"Question {i % distinct}", [], "gpt-4o")]
+        return "".join(tokens)
+
+    answers = await asyncio.gather(*(consume(i) for i in range(burst)))
+    expected = "".join(FAKE_TOKENS)
+    if any(answer != expected for answer in answers):
+        raise RuntimeError("A streaming subscriber received an incomplete answer")
+
+
+async def main(args):
+    provider = FakeProvider(latency=args.latency, token_delay=args.token_delay)
+    await provider.start()
+    configure_environment(provider.base_url)
+
+    # Imported after the environment is configured so the SDK clients pick up the fake base URL
+    from app.services.ai_service import ai_service
+    from app.services.llm_gateway import default_middleware
+
+    try:
+        print(f"Bursts of {args.burst} requests over {args.distinct} distinct questions, "
+              f"{args.latency * 1000:.0f} ms provider latency")
+        print(f"{'workload':<10} {'single-flight':>13} {'upstream':>9} {'seconds':>8}")
+        for name, workload in (("decode", burst_decode), ("stream", burst_stream)):
+            for enabled in (False, True):
+                ai_service.gateway.middleware = default_middleware(single_flight=enabled)
+                before = provider.requests
+                start = time.perf_counter()
+                await workload(ai_service, args.burst, args.distinct)
+                elapsed = time.perf_counter() - start
+                print(f"{name:<10} {'on' if enabled else 'off':>13} {provider.requests - before:>9} {elapsed:>8.2f}")
+    finally:
+        await ai_service.aclose()
+        await provider.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upstream requests saved by single-flight under bursts")
+    parser.add_argument("--burst", type=int, default=200, help="Concurrent requests per burst")
+    parser.add_argument("--distinct", type=int, default=5, help="Distinct questions in a burst")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated provider latency in seconds")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,53 @@
+"""
+Generates text PDFs of arbitrary size for the ingestion benchmarks.
+
+The file is written object by object, so multi-thousand-page documents can be
+created without holding them in memory.
+"""
+import os
+
+
+def write_synthetic_pdf(path: str, pages: int, lines_per_page: int = 40) -> str:
+    """Write a PDF with `pages` pages of numbered text lines and return its path"""
+    offsets = []
+
+    with open(path, "wb") as f:
+        def write_object(number: int, content: bytes):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n".encode() + content + b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+        for i in range(pages):
+            lines = " ".join(
+                f"(Page {i + 1} line {line}: clause {i + 1}.{line} the parties agree to the terms "
+                f"set out in schedule {line % 7} of this agreement.) '"
+                for line in range(lines_per_page)
+            )
+            stream = f"BT /F1 9 Tf 40 800 Td 11 TL {lines} ET".encode()
+            write_object(4 + 2 * i, (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+            ).encode())
+            write_object(5 + 2 * i, f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+        xref_offset = f.tell()
+        f.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+    return path
+
+
+def synthetic_pdf(directory: str, pages: int) -> str:
+    """Return a cached synthetic PDF with the given number of pages, creating it if needed"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"synthetic_{pages}.pdf")
+    if not os.path.exists(path):
+        write_synthetic_pdf(path, pages)
+    return path
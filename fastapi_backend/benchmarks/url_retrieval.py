@@ -0,0 +1,75 @@
+"""
+Benchmark of repeat questions about the same site through the URL retriever.
+
+Asks several questions about a local site and reports, per question, the time to
+build the prompt context, whether the site was crawled and embedded again, and the
+size of the context compared with sending all crawled text. Runs fully offline with
+the local hashing embeddings and temporary cache directories.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.url_retrieval --pages 40 --questions 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+QUESTIONS = [
+    "What is the default timeout of worker pool 3?",
+    "How do I configure option_5_2?",
+    "Which service has the longest default timeout?",
+    "What does section 12.4 say?",
+    "What is the default value for option_1_1?",
+]
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "indexes")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "embeddings.sqlite3")
+    os.environ["CRAWL_CACHE_DIR"] = os.path.join(tmp, "http")
+    # The fake site runs on localhost
+    os.environ["CRAWL_ALLOW_PRIVATE_HOSTS"] = "true"
+
+    # Imported after the environment is configured so the stores use the temporary directories
+    from benchmarks.fake_site import FakeSite
+    from app.logic.url_retrieval import UrlRetriever
+    from app.logic.web_crawler import web_crawler
+
+    site = FakeSite(pages=args.pages, latency=args.latency)
+    await site.start()
+    url = site.base_url + "/"
+    try:
+        full_text = sum(len(page.page_content) for page in await web_crawler.crawl(url, crawl_subpages=True))
+        site.requests = 0
+        print(f"{args.pages} page site, {args.latency * 1000:.0f} ms per page, all crawled text {full_text} chars")
+        print(f"{'question':>8} {'phase':>12} {'ms':>8} {'site requests':>14} {'indexes built':>14} {'context chars':>14}")
+
+        retriever = UrlRetriever(ttl_seconds=args.ttl)
+        for i in range(args.questions):
+            phase = "cold" if i == 0 else "follow-up"
+            if i == args.questions - 1:
+                # Let the crawl expire: the site is revalidated but the index is reused
+                retriever.ttl_seconds = 0
+                phase = "expired ttl"
+            requests, built = site.requests, retriever.indexes_built
+            start = time.perf_counter()
+            context = await retriever.retrieve(url, QUESTIONS[i % len(QUESTIONS)], crawl_subpages=True)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{i + 1:>8} {phase:>12} {elapsed:>8.1f} {site.requests - requests:>14} "
+                  f"{retriever.indexes_built - built:>14} {len(context):>14}")
+    finally:
+        await web_crawler.aclose()
+        await site.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Context building time for repeat questions about one site")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per page")
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--ttl", type=float, default=300, help="Seconds a crawl is considered fresh")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,60 @@
+"""
+Benchmark of the web crawler against a local site.
+
+Crawls the fake site breadth first at several concurrency limits, first with an
+empty HTTP cache and then again with the cache warm, where every page should be
+revalidated with a 304 instead of downloaded.
+
+Run from the fastapi_backend directory:
+    python -m benchmarks.web_crawler --pages 60 --latency 0.05
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+from benchmarks.fake_site import FakeSite
+from app.logic.web_crawler import HTTPCache, WebCrawler
+
+
+async def crawl(site: FakeSite, crawler: WebCrawler, args):
+    requests, not_modified, sent = site.requests, site.not_modified, site.bytes_sent
+    start = time.perf_counter()
+    documents = await crawler.crawl(site.base_url + "/", crawl_subpages=True,
+                                    max_depth=args.depth, max_pages=args.max_pages)
+    elapsed = time.perf_counter() - start
+    return len(documents), elapsed, site.requests - requests, site.not_modified - not_modified, site.bytes_sent - sent
+
+
+async def main(args):
+    site = FakeSite(pages=args.pages, fanout=args.fanout, latency=args.latency)
+    await site.start()
+    try:
+        print(f"{args.pages} page site, fanout {args.fanout}, {args.latency * 1000:.0f} ms per page, "
+              f"depth {args.depth}, at most {args.max_pages} pages")
+        print(f"{'concurrency':>11} {'cache':>6} {'pages':>6} {'seconds':>8} {'requests':>9} {'304s':>5} "
+              f"{'KB sent':>8} {'peak in-flight':>15}")
+        for concurrency in args.concurrency:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                crawler = WebCrawler(cache=HTTPCache(cache_dir), concurrency=concurrency, allow_private_hosts=True)
+                try:
+                    for cache_state in ("cold", "warm"):
+                        site.max_in_flight = 0
+                        pages, elapsed, requests, not_modified, sent = await crawl(site, crawler, args)
+                        print(f"{concurrency:>11} {cache_state:>6} {pages:>6} {elapsed:>8.2f} {requests:>9} "
+                              f"{not_modified:>5} {sent / 1024:>8.0f} {site.max_in_flight:>15}")
+                finally:
+                    await crawler.aclose()
+    finally:
+        await site.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl time and cache revalidation against a local site")
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per page")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--max-pages", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 10])
+    asyncio.run(main(parser.parse_args()))
@@ -1,6 +1,10 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import chat, chat_pdf, chat_url, error_decoder
+from app.api import chat, chat_pdf, chat_url, error_decoder, admission, metrics
+from app.services.ai_service import ai_service
+from app.services.ingestion import ingestion_manager
+from app.logic.pdf_extraction import shutdown_pools
+from app.logic.web_crawler import web_crawler
 
 # Create the FastAPI app
 app = FastAPI(
@@ -9,6 +13,12 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Admission control for the expensive endpoints (added first so CORS headers wrap its rejections)
+app.add_middleware(admission.AdmissionMiddleware)
+
+# Request counts and latencies per route, admission rejections included
+app.add_middleware(metrics.HTTPMetricsMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -23,6 +33,16 @@ app.include_router(chat.router, tags=["Chat"])
 app.include_router(chat_pdf.router, tags=["Chat with PDF"])
 app.include_router(chat_url.router, tags=["Chat with URL"])
 app.include_router(error_decoder.router, tags=["Error Decoder"])
+app.include_router(admission.router, tags=["Admission"])
+app.include_router(metrics.router, tags=["Metrics"])
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled provider and crawler connections and stop the ingestion workers"""
+    await ai_service.aclose()
+    await web_crawler.aclose()
+    ingestion_manager.shutdown()
+    shutdown_pools()
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,24 @@
+"""
+Test settings, applied before any app module is imported.
+
+The app creates its global stores and clients at import time, so they are pointed
+at a temporary directory, the local hashing embeddings and placeholder API keys
+here. Nothing in the tests sends requests to a real provider.
+
+Run from the fastapi_backend directory:
+    python -m pytest tests
+"""
+import os
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix="ai-assistant-tests-")
+
+for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GROQ_API_KEY", "GOOGLE_API_KEY"):
+    os.environ.setdefault(key, "test-key")
+os.environ.update({
+    "EMBEDDING_PROVIDER": "hashing",
+    "INDEX_DIR": os.path.join(TEST_DIR, "indexes"),
+    "EMBEDDING_CACHE_PATH": os.path.join(TEST_DIR, "embeddings.sqlite3"),
+    "CRAWL_CACHE_DIR": os.path.join(TEST_DIR, "http"),
+    "CONVERSATION_DB_PATH": os.path.join(TEST_DIR, "conversations.sqlite3"),
+})
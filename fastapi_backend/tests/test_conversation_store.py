@@ -0,0 +1,50 @@
+import time
+import pytest
+from app.models.schemas import Message
+from app.services.conversation_store import InMemoryConversationStore, SQLiteConversationStore
+
+
+def message(content: str) -> Message:
+    return Message(id=content, role="user", content=content, timestamp="2026-01-01T00:00:00")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(ttl_seconds: float = 0):
+        if request.param == "memory":
+            return InMemoryConversationStore(ttl_seconds=ttl_seconds)
+        return SQLiteConversationStore(str(tmp_path / "conversations.sqlite3"), ttl_seconds=ttl_seconds)
+    return make
+
+
+def test_messages_are_read_as_tail_and_pages(make_store):
+    store = make_store()
+    store.create_conversation("c")
+    for i in range(5):
+        store.append_message("c", message(str(i)))
+    assert [m.content for m in store.get_messages("c")] == ["0", "1", "2", "3", "4"]
+    assert [m.content for m in store.get_messages("c", limit=2)] == ["3", "4"]
+    assert [m.content for m in store.get_messages("c", limit=2, offset=2)] == ["1", "2"]
+    assert store.get_messages("missing") is None
+
+
+def test_append_after_purge_starts_the_conversation_over(make_store):
+    store = make_store(ttl_seconds=0.05)
+    store.create_conversation("c")
+    store.append_message("c", message("old"))
+    time.sleep(0.1)
+    assert store.purge_expired() == 1
+
+    store.append_message("c", message("new"))
+    assert store.exists("c")
+    assert [m.content for m in store.get_messages("c")] == ["new"]
+
+
+def test_append_to_expired_conversation_does_not_revive_it(make_store):
+    store = make_store(ttl_seconds=0.05)
+    store.create_conversation("c")
+    store.append_message("c", message("old"))
+    time.sleep(0.1)
+
+    store.append_message("c", message("new"))
+    assert [m.content for m in store.get_messages("c")] == ["new"]
@@ -0,0 +1,25 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.logic.embedding_pipeline import RateLimitedEmbeddings
+from app.logic.local_embeddings import HashingEmbeddings
+from app.services.rate_limit import TokenBucket
+
+
+def test_queries_are_not_held_up_by_bulk_embedding():
+    # One document call per second: the second bulk call waits about a second
+    embeddings = RateLimitedEmbeddings(HashingEmbeddings(), TokenBucket(1, 1), TokenBucket(10, 10))
+    with ThreadPoolExecutor(2) as executor:
+        bulk = [executor.submit(embeddings.embed_documents, ["chunk"]) for _ in range(2)]
+        time.sleep(0.05)
+        start = time.perf_counter()
+        embeddings.embed_query("question")
+        assert time.perf_counter() - start < 0.1
+        [future.result() for future in bulk]
+
+
+def test_queries_have_their_own_limit():
+    embeddings = RateLimitedEmbeddings(HashingEmbeddings(), TokenBucket(100, 100), TokenBucket(10, 1))
+    start = time.perf_counter()
+    for _ in range(3):
+        embeddings.embed_query("question")
+    assert time.perf_counter() - start >= 0.15
@@ -0,0 +1,29 @@
+import os
+import pytest
+from app.services.index_store import VectorIndexStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return VectorIndexStore(base_dir=str(tmp_path))
+
+
+def test_safe_ids_keep_their_file_name(store):
+    store.link_conversation("3f2b-conversation_1", status="ready")
+    assert os.listdir(store.conversation_dir) == ["3f2b-conversation_1.json"]
+
+
+@pytest.mark.parametrize("first, second", [("a.b", "ab"), ("", "-"), ("../x", "x")])
+def test_distinct_ids_do_not_share_a_file(store, first, second):
+    store.link_conversation(first, status="first")
+    store.link_conversation(second, status="second")
+    assert store.get_conversation_link(first) == {"status": "first"}
+    assert store.get_conversation_link(second) == {"status": "second"}
+
+
+@pytest.mark.parametrize("job_id", ["", "../../escape", "a/b", ".json"])
+def test_unsafe_ids_stay_in_the_directory(store, job_id):
+    store.save_job(job_id, {"status": "done"})
+    assert store.get_job(job_id) == {"status": "done"}
+    [name] = os.listdir(store.job_dir)
+    assert name.startswith("sha256.")
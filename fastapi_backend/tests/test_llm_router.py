@@ -0,0 +1,171 @@
+"""Circuit breaking, failover and hedging of the LLM router, against fake provider adapters"""
+import asyncio
+import time
+
+from app.models.schemas import LLMRequest
+from app.services.llm_gateway import LLMGateway
+from app.services.llm_providers import FakeAdapter
+from app.services.llm_router import CLOSED, HALF_OPEN, OPEN, LLMRouter
+
+FALLBACKS = {"primary-model": ["backup-model"]}
+
+
+def request(model: str = "primary-model") -> LLMRequest:
+    return LLMRequest(model=model, messages=[{"role": "user", "content": "Hello"}])
+
+
+def create_gateway(router: LLMRouter, primary: FakeAdapter, backup: FakeAdapter = None) -> LLMGateway:
+    adapters = [primary] + ([backup] if backup else [])
+    # No middleware, so every request reaches the adapters exactly once
+    return LLMGateway(adapters, [], "primary", router)
+
+
+def primary_adapter(**kwargs) -> FakeAdapter:
+    return FakeAdapter(["primary-model"], tokens=["primary"], name="primary", **kwargs)
+
+
+def backup_adapter(**kwargs) -> FakeAdapter:
+    return FakeAdapter(["backup-model"], tokens=["backup"], name="backup", **kwargs)
+
+
+def test_circuit_opens_after_min_requests_failures_and_half_opens_after_open_seconds():
+    async def scenario():
+        router = LLMRouter({}, min_requests=3, error_rate=0.5, open_seconds=0.1)
+        primary = primary_adapter(fail_every=1)
+        gateway = create_gateway(router, primary)
+        health = router.health(primary, "primary-model")
+
+        for _ in range(2):
+            assert (await gateway.complete(request())).error
+        assert health.state == CLOSED
+
+        assert (await gateway.complete(request())).error
+        assert health.state == OPEN
+
+        # While open, requests are rejected without reaching the provider
+        response = await gateway.complete(request())
+        assert "unavailable" in response.error
+        assert primary.requests == 3
+
+        # After open_seconds one probe is let through while the circuit is half-open
+        await asyncio.sleep(0.15)
+        primary.fail_every, primary.latency = 0, 0.1
+        probe = asyncio.create_task(gateway.complete(request()))
+        await asyncio.sleep(0.02)
+        assert health.state == HALF_OPEN
+        assert "unavailable" in (await gateway.complete(request())).error
+
+        # A successful probe closes the circuit again
+        assert (await probe).error is None
+        assert health.state == CLOSED
+        assert primary.requests == 4
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_opens_the_circuit_again():
+    async def scenario():
+        router = LLMRouter({}, min_requests=2, open_seconds=0.05)
+        primary = primary_adapter(fail_every=1)
+        gateway = create_gateway(router, primary)
+        for _ in range(2):
+            await gateway.complete(request())
+        await asyncio.sleep(0.1)
+
+        assert (await gateway.complete(request())).error
+        assert router.health(primary, "primary-model").state == OPEN
+
+    asyncio.run(scenario())
+
+
+def test_failing_request_is_answered_by_the_fallback_model():
+    async def scenario():
+        router = LLMRouter(FALLBACKS)
+        primary, backup = primary_adapter(fail_every=1), backup_adapter()
+        gateway = create_gateway(router, primary, backup)
+
+        response = await gateway.complete(request())
+
+        assert response.error is None
+        assert response.content == "backup"
+        assert response.model == "backup-model"
+        assert (primary.requests, backup.requests) == (1, 1)
+        assert router.failovers == 1
+
+    asyncio.run(scenario())
+
+
+def test_stream_failing_before_its_first_token_is_answered_by_the_fallback_model():
+    async def scenario():
+        router = LLMRouter(FALLBACKS)
+        gateway = create_gateway(router, primary_adapter(fail_every=1), backup_adapter())
+        return [token async for token in gateway.stream(request())], router.failovers
+
+    assert asyncio.run(scenario()) == (["backup"], 1)
+
+
+def test_hedged_request_returns_the_faster_answer():
+    async def scenario():
+        router = LLMRouter(FALLBACKS, hedge_after="0.05")
+        primary = primary_adapter(slow_every=1, slow_latency=1.0)
+        backup = backup_adapter()
+        gateway = create_gateway(router, primary, backup)
+
+        start = time.perf_counter()
+        response = await gateway.complete(request())
+        elapsed = time.perf_counter() - start
+
+        assert response.content == "backup"
+        assert elapsed < 0.5
+        assert (router.hedged, router.hedge_wins) == (1, 1)
+
+    asyncio.run(scenario())
+
+
+def test_request_answered_before_the_hedge_delay_is_not_hedged():
+    async def scenario():
+        router = LLMRouter(FALLBACKS, hedge_after="0.5")
+        backup = backup_adapter()
+        gateway = create_gateway(router, primary_adapter(), backup)
+
+        response = await gateway.complete(request())
+
+        assert response.content == "primary"
+        assert backup.requests == 0
+        assert router.hedged == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_hedge_loser_is_not_recorded():
+    async def scenario():
+        router = LLMRouter(FALLBACKS, hedge_after="0.05")
+        primary = primary_adapter(slow_every=1, slow_latency=1.0)
+        backup = backup_adapter()
+        gateway = create_gateway(router, primary, backup)
+
+        await gateway.complete(request())
+        # Let the cancelled primary attempt unwind
+        await asyncio.sleep(0.01)
+
+        assert router.cancelled == 1
+        assert len(router.health(primary, "primary-model").samples) == 0
+        assert list(router.health(backup, "backup-model").samples)[0][0] is True
+
+    asyncio.run(scenario())
+
+
+def test_stream_closed_early_is_not_recorded():
+    async def scenario():
+        router = LLMRouter({})
+        primary = FakeAdapter(["primary-model"], name="primary")
+        gateway = create_gateway(router, primary)
+
+        tokens = gateway.stream(request())
+        assert await anext(tokens)
+        await tokens.aclose()
+
+        assert router.cancelled == 1
+        assert len(router.health(primary, "primary-model").samples) == 0
+
+    asyncio.run(scenario())
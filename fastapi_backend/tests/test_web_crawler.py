@@ -0,0 +1,166 @@
+"""Web crawler against the local fake site: HTTP cache revalidation, host checks on redirects and crawl limits"""
+import asyncio
+from urllib.parse import quote
+
+import pytest
+
+from app.logic import web_crawler as web_crawler_module
+from app.logic.web_crawler import BlockedURLError, HTTPCache, WebCrawler, is_public_address
+from benchmarks.fake_site import FakeSite
+
+
+def crawl_site(cache_dir, scenario, pages: int = 30, latency: float = 0.0, **crawler_options):
+    """Run `scenario(site, crawler)` against a fresh fake site and crawler, returning its result"""
+    async def run():
+        site = FakeSite(pages=pages, latency=latency)
+        await site.start()
+        crawler_options.setdefault("allow_private_hosts", True)
+        crawler = WebCrawler(cache=HTTPCache(str(cache_dir)), **crawler_options)
+        try:
+            return await scenario(site, crawler)
+        finally:
+            await crawler.aclose()
+            await site.stop()
+    return asyncio.run(run())
+
+
+def redirect_url(site: FakeSite, target: str) -> str:
+    return f"{site.base_url}/redirect?to={quote(target, safe='')}"
+
+
+@pytest.mark.parametrize("address", [
+    "127.0.0.1", "10.1.2.3", "172.16.0.1", "192.168.1.1", "169.254.169.254", "100.64.0.1",
+    "0.0.0.0", "224.0.0.1", "240.0.0.1", "::1", "fe80::1", "fc00::1", "::ffff:127.0.0.1"
+])
+def test_non_public_addresses_are_refused(address):
+    assert not is_public_address(address)
+
+
+@pytest.mark.parametrize("address", ["93.184.216.34", "8.8.8.8", "2606:4700:4700::1111"])
+def test_public_addresses_are_allowed(address):
+    assert is_public_address(address)
+
+
+def test_unchanged_pages_are_revalidated_and_served_from_the_cache(tmp_path):
+    async def scenario(site, crawler):
+        first = await crawler.crawl(site.base_url + "/", crawl_subpages=True, max_pages=10)
+        requests, sent = site.requests, site.bytes_sent
+        second = await crawler.crawl(site.base_url + "/", crawl_subpages=True, max_pages=10)
+        return first, second, site, requests, sent, crawler
+
+    first, second, site, requests, sent, crawler = crawl_site(tmp_path, scenario)
+
+    assert len(first) == 10
+    assert site.requests - requests == 10
+    assert site.not_modified == crawler.not_modified == 10
+    # Every page of the second crawl came back as a 304 without a body
+    assert site.bytes_sent == sent
+    assert [(page.metadata["source"], page.page_content) for page in second] == \
+           [(page.metadata["source"], page.page_content) for page in first]
+
+
+def test_private_hosts_are_refused_without_opt_in(tmp_path):
+    async def scenario(site, crawler):
+        with pytest.raises(BlockedURLError):
+            await crawler.crawl(site.base_url + "/")
+        return site.requests
+
+    assert crawl_site(tmp_path, scenario, allow_private_hosts=False) == 0
+
+
+def test_non_http_urls_are_refused(tmp_path):
+    async def scenario(site, crawler):
+        with pytest.raises(BlockedURLError):
+            await crawler.crawl("file:///etc/passwd")
+
+    crawl_site(tmp_path, scenario)
+
+
+@pytest.mark.parametrize("target", [
+    "http://127.0.0.2/",
+    "http://10.0.0.1/admin",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/",
+])
+def test_redirects_to_private_hosts_are_refused_on_every_hop(tmp_path, monkeypatch, target):
+    # Treat the fake site's own address as public so that only the redirect targets are refused
+    monkeypatch.setattr(web_crawler_module, "is_public_address", lambda address: address == "127.0.0.1")
+
+    async def scenario(site, crawler):
+        # Two redirects on the fake site, then one to the private target
+        url = redirect_url(site, redirect_url(site, target))
+        with pytest.raises(BlockedURLError):
+            await crawler.crawl(url)
+        return site.redirects, site.requests
+
+    redirects, requests = crawl_site(tmp_path, scenario, allow_private_hosts=False)
+    assert (redirects, requests) == (2, 0)
+
+
+def test_redirects_within_the_limit_are_followed(tmp_path):
+    async def scenario(site, crawler):
+        pages = await crawler.crawl(redirect_url(site, redirect_url(site, site.base_url + "/page/3")))
+        return pages, site.redirects
+
+    pages, redirects = crawl_site(tmp_path, scenario, max_redirects=2)
+    assert [page.metadata["title"] for page in pages] == ["Page 3"]
+    assert redirects == 2
+
+
+def test_too_many_redirects_fail(tmp_path):
+    async def scenario(site, crawler):
+        url = site.base_url + "/page/3"
+        for _ in range(3):
+            url = redirect_url(site, url)
+        with pytest.raises(web_crawler_module.CrawlError):
+            await crawler.crawl(url)
+        return site.redirects, site.requests
+
+    assert crawl_site(tmp_path, scenario, max_redirects=2) == (3, 0)
+
+
+def test_only_the_requested_page_is_fetched_without_crawl_subpages(tmp_path):
+    async def scenario(site, crawler):
+        return await crawler.crawl(site.base_url + "/"), site.requests
+
+    pages, requests = crawl_site(tmp_path, scenario)
+    assert len(pages) == requests == 1
+
+
+def test_depth_limit(tmp_path):
+    async def scenario(site, crawler):
+        return await crawler.crawl(site.base_url + "/", crawl_subpages=True, max_depth=1, max_pages=100)
+
+    pages = crawl_site(tmp_path, scenario)
+    # The root and its four children
+    assert len(pages) == 5
+    assert max(page.metadata["depth"] for page in pages) == 1
+
+
+def test_page_limit(tmp_path):
+    async def scenario(site, crawler):
+        pages = await crawler.crawl(site.base_url + "/", crawl_subpages=True, max_depth=5, max_pages=7)
+        return pages, site.requests
+
+    pages, requests = crawl_site(tmp_path, scenario)
+    assert len(pages) == requests == 7
+
+
+def test_concurrency_limit(tmp_path):
+    async def scenario(site, crawler):
+        await crawler.crawl(site.base_url + "/", crawl_subpages=True, max_depth=3, max_pages=30)
+        return site.max_in_flight
+
+    assert crawl_site(tmp_path, scenario, latency=0.02, concurrency=3) == 3
+
+
+def test_truncated_pages_are_not_cached(tmp_path):
+    async def scenario(site, crawler):
+        first = await crawler.crawl(site.base_url + "/")
+        second = await crawler.crawl(site.base_url + "/")
+        return first, second, site.not_modified
+
+    first, second, not_modified = crawl_site(tmp_path, scenario, max_page_bytes=1000)
+    assert not_modified == 0
+    assert first[0].page_content == second[0].page_content
+    assert list(tmp_path.iterdir()) == []